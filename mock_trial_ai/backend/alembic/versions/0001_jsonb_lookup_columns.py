@@ -0,0 +1,60 @@
+"""Generated columns and indexes for JSONB lookup and join keys
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (table, column, expression) -- STORED generated columns are kept in sync by Postgres,
+# so writers keep inserting plain JSONB and readers filter on indexable columns
+GENERATED_COLUMNS = [
+    ("mock_cases", "patent_number", "data->'details'->>'patent_number'"),
+    # Kept as ISO text (a text-to-date cast is not immutable); ISO dates sort chronologically
+    ("mock_cases", "filing_date", "data->'details'->>'filing_date'"),
+    ("mock_cases", "case_name", "data->>'case_name'"),
+    ("main_cases", "docket_id", "data->>'docket_id'"),
+    ("main_cases", "docket_number", "data->>'docketNumber'"),
+    ("main_cases", "case_name", "data->>'caseName'"),
+    ("docket_cases", "docket_id", "data->>'id'"),
+    ("cluster_cases", "docket_id", "data->>'docket_id'"),
+]
+
+# (index, table, columns, where)
+INDEXES = [
+    # Case lookup by patent number, filing date and case name
+    ("ix_mock_cases_lookup", "mock_cases", ["patent_number", "filing_date", "case_name"], None),
+    # Existing-case list, newest filing first
+    ("ix_mock_cases_filing_date", "mock_cases", ["filing_date"], None),
+    ("ix_main_cases_docket_id", "main_cases", ["docket_id"], None),
+    ("ix_main_cases_docket_number", "main_cases", ["docket_number"], None),
+    ("ix_docket_cases_docket_id", "docket_cases", ["docket_id"], None),
+    ("ix_cluster_cases_docket_id", "cluster_cases", ["docket_id"], None),
+    # Reference-case join to combined opinions
+    ("ix_case_opinions_combined_case_name", "case_opinions", ["case_name"], "type = 'combined-opinion'"),
+]
+
+
+def upgrade():
+    for table, column, expression in GENERATED_COLUMNS:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT GENERATED ALWAYS AS ({expression}) STORED")
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for table, column, _ in reversed(GENERATED_COLUMNS):
+        op.drop_column(table, column)
@@ -0,0 +1,50 @@
+"""Materialized view with the slim reference-case projection
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only the fields the analyzer uses. The case_opinions join only multiplied rows for
+    # these columns, so it is dropped and DISTINCT collapses the remaining duplicates.
+    # content_hash changes whenever any projected field does; ROW()::text keeps NULL and ''
+    # distinct, which concat_ws would not
+    op.execute("""
+        CREATE MATERIALIZED VIEW reference_cases_mv AS
+        SELECT ref.*,
+               md5(ROW(ref.case_name, ref.case_name_full, ref.docket_number,
+                       ref.court_name, ref.filing_date, ref.judge)::text) AS content_hash
+        FROM (
+            SELECT DISTINCT
+                mc.case_name,
+                mc.data ->> 'caseNameFull' AS case_name_full,
+                mc.docket_number,
+                mc.data ->> 'court' AS court_name,
+                mc.data ->> 'dateFiled' AS filing_date,
+                mc.data ->> 'judge' AS judge
+            FROM main_cases mc
+            JOIN docket_cases dc ON mc.docket_id = dc.docket_id
+            JOIN cluster_cases cc ON cc.docket_id = dc.docket_id
+            WHERE mc.case_name IS NOT NULL AND mc.data ->> 'status' IS NOT NULL
+        ) ref
+        WITH DATA
+    """)
+    # REFRESH ... CONCURRENTLY requires a unique index
+    op.create_index("ux_reference_cases_mv_content_hash", "reference_cases_mv", ["content_hash"], unique=True)
+    op.create_index("ix_reference_cases_mv_docket_number", "reference_cases_mv", ["docket_number"])
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS reference_cases_mv")
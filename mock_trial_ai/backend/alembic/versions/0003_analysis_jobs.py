@@ -0,0 +1,57 @@
+"""Analysis job queue
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE analysis_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            case_id INTEGER NOT NULL,
+            patent_number TEXT NOT NULL,
+            filing_date TEXT NOT NULL,
+            case_name TEXT NOT NULL,
+            force_regenerate BOOLEAN NOT NULL DEFAULT FALSE,
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMPTZ,
+            partial_analysis TEXT,
+            result JSONB,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    # Workers scan only claimable rows
+    op.execute("""
+        CREATE INDEX ix_analysis_jobs_claimable ON analysis_jobs (run_after, id)
+        WHERE status IN ('queued', 'running')
+    """)
+    # At most one active job per case; replaces mock_cases.analysis_in_progress as the lock
+    op.execute("""
+        CREATE UNIQUE INDEX ux_analysis_jobs_active_case ON analysis_jobs (case_id)
+        WHERE status IN ('queued', 'running')
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS analysis_jobs")
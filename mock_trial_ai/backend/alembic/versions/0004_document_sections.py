@@ -0,0 +1,39 @@
+"""Pre-extracted expert report sections on case_documents
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled at upload by document_sections.extract_sections; NULL for rows stored before this
+    op.execute("ALTER TABLE case_documents ADD COLUMN sections JSONB")
+    # Backfill with the expressions the analyzer used to run on every analysis
+    op.execute(r"""
+        UPDATE case_documents
+        SET sections = jsonb_build_object(
+            'prepared_by', SUBSTRING(extracted_text FROM 'Prepared By:.*?Date:.*?\n'),
+            'source_code_analysis', SUBSTRING(extracted_text FROM '4\. Source Code Analysis[\s\S]*?(?=5\.)'),
+            'financial_impact', SUBSTRING(extracted_text FROM '5\. Financial Impact Assessment[\s\S]*?(?=6\.)'),
+            'expert_conclusions', SUBSTRING(extracted_text FROM '6\. Expert Conclusions[\s\S]*?(?=7\.)')
+        )
+        WHERE extracted_text IS NOT NULL
+    """)
+    # The analyzer reads the newest document of a case
+    op.execute("CREATE INDEX ix_case_documents_case_created ON case_documents (case_id, created_at DESC)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_case_documents_case_created")
+    op.execute("ALTER TABLE case_documents DROP COLUMN IF EXISTS sections")
@@ -0,0 +1,28 @@
+"""Vector index state on case_documents
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hash of the text and embedding settings last written to Pinecone, and the vector ids
+    # written for it; analyze_case skips documents whose hash still matches
+    op.execute("ALTER TABLE case_documents ADD COLUMN vector_hash TEXT")
+    op.execute("ALTER TABLE case_documents ADD COLUMN vector_ids TEXT[]")
+
+
+def downgrade():
+    op.execute("ALTER TABLE case_documents DROP COLUMN IF EXISTS vector_ids")
+    op.execute("ALTER TABLE case_documents DROP COLUMN IF EXISTS vector_hash")
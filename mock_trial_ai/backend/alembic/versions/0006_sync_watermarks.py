@@ -0,0 +1,56 @@
+"""updated_at watermarks for the MongoDB sync
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows get the migration time, so the first incremental sync copies everything once
+    op.execute("ALTER TABLE mock_cases ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT NOW()")
+    op.execute("ALTER TABLE case_documents ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT NOW()")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Only changes to synced columns move the watermark; analysis_in_progress and the
+    # vector index state are updated on every analysis and are not copied to MongoDB
+    op.execute("""
+        CREATE TRIGGER mock_cases_updated_at BEFORE UPDATE ON mock_cases
+        FOR EACH ROW WHEN (OLD.data IS DISTINCT FROM NEW.data)
+        EXECUTE PROCEDURE set_updated_at()
+    """)
+    op.execute("""
+        CREATE TRIGGER case_documents_updated_at BEFORE UPDATE ON case_documents
+        FOR EACH ROW WHEN ((OLD.case_id, OLD.filename, OLD.extracted_text)
+                           IS DISTINCT FROM (NEW.case_id, NEW.filename, NEW.extracted_text))
+        EXECUTE PROCEDURE set_updated_at()
+    """)
+    # The sync reads rows after its watermark in (updated_at, id) order
+    op.execute("CREATE INDEX ix_mock_cases_updated_at_id ON mock_cases (updated_at, id)")
+    op.execute("CREATE INDEX ix_case_documents_updated_at_id ON case_documents (updated_at, id)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_case_documents_updated_at_id")
+    op.execute("DROP INDEX IF EXISTS ix_mock_cases_updated_at_id")
+    op.execute("DROP TRIGGER IF EXISTS case_documents_updated_at ON case_documents")
+    op.execute("DROP TRIGGER IF EXISTS mock_cases_updated_at ON mock_cases")
+    op.execute("DROP FUNCTION IF EXISTS set_updated_at()")
+    op.execute("ALTER TABLE case_documents DROP COLUMN IF EXISTS updated_at")
+    op.execute("ALTER TABLE mock_cases DROP COLUMN IF EXISTS updated_at")
@@ -0,0 +1,35 @@
+"""Analysis result cache
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # IF NOT EXISTS: earlier builds created this table at runtime on first use
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            prompt_hash CHAR(64) PRIMARY KEY,
+            model TEXT NOT NULL,
+            temperature REAL,
+            analysis TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            last_hit_at TIMESTAMP,
+            hit_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS analysis_cache")
@@ -0,0 +1,96 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+
+class AnalysisResultCache:
+    """Postgres-backed cache of Claude analyses keyed on a hash of the assembled request
+    (table analysis_cache, created by Alembic revision 0007)"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(request: Dict) -> str:
+        """Hash of everything that determines the response: prompt, system, model and sampling settings"""
+        payload = {
+            "model": request["model"],
+            "temperature": request.get("temperature"),
+            "max_tokens": request.get("max_tokens"),
+            "system": request.get("system"),
+            "messages": request["messages"]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, db, key: str) -> Optional[str]:
+        """Return the cached analysis for key, counting the hit, or None"""
+        try:
+            cursor = db.cursor()
+            cursor.execute("""
+                UPDATE analysis_cache
+                SET hit_count = hit_count + 1, last_hit_at = NOW()
+                WHERE prompt_hash = %s
+                RETURNING analysis
+            """, (key,))
+            result = cursor.fetchone()
+            db.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"Error reading analysis cache: {e}")
+            db.rollback()
+            result = None
+        with self._lock:
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return result[0] if result else None
+
+    def put(self, db, key: str, request: Dict, analysis: str):
+        """Store an analysis, replacing any previous entry for the same key"""
+        try:
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO analysis_cache (prompt_hash, model, temperature, analysis)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (prompt_hash) DO UPDATE
+                SET analysis = EXCLUDED.analysis, created_at = NOW()
+            """, (key, request["model"], request.get("temperature"), analysis))
+            db.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"Error writing analysis cache: {e}")
+            db.rollback()
+
+    def stats(self, db=None) -> Dict:
+        """Hit rate for this process, plus stored entry and lifetime hit totals when db is given"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+        if db is not None:
+            try:
+                cursor = db.cursor()
+                cursor.execute("SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM analysis_cache")
+                stats["entries"], stats["lifetime_hits"] = cursor.fetchone()
+                cursor.close()
+            except Exception as e:
+                print(f"Error reading analysis cache stats: {e}")
+                db.rollback()
+        return stats
+
+analysis_cache = AnalysisResultCache()
@@ -0,0 +1,177 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import threading
+import traceback
+import multiprocessing
+from typing import Dict
+
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 2))
+# How often streamed text is published for the UI; defaults to the UI's own poll interval
+JOB_PUBLISH_SECONDS = float(os.getenv('JOB_PUBLISH_SECONDS', os.getenv('ANALYSIS_POLL_SECONDS', 2)))
+
+class LeaseLost(Exception):
+    """Another worker took over the job after our lease expired"""
+
+class JobHeartbeat(threading.Thread):
+    """Renews the job lease while the analysis runs and, more often, publishes the text streamed so far"""
+    def __init__(self, queue, job_id: int, worker_id: str, publish_seconds: float = JOB_PUBLISH_SECONDS):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.publish_seconds = publish_seconds
+        self.parts = []
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        lease_interval = max(1, self.queue.lease_seconds // 3)
+        renew_at = time.monotonic() + lease_interval
+        published = 0
+        while not self.stopped.wait(max(0, min(self.publish_seconds, renew_at - time.monotonic()))):
+            count = len(self.parts)
+            partial = ''.join(self.parts[:count]) if count != published else None
+            try:
+                if time.monotonic() >= renew_at:
+                    owned = self.queue.heartbeat(self.job_id, self.worker_id, partial)
+                    renew_at = time.monotonic() + lease_interval
+                elif partial is not None:
+                    owned = self.queue.publish(self.job_id, self.worker_id, partial)
+                else:
+                    continue
+                if not owned:
+                    self.lost.set()
+                    return
+                published = count
+            except Exception as e:
+                # A missed beat is fine as long as a later one lands before the lease expires
+                print(f"Error updating job {self.job_id}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def _job_result(results: Dict) -> Dict:
+    """JSON-safe subset of generate_trial_scenario's result for the UI"""
+    return {
+        "case_id": results["case_id"],
+        "top_similar_cases": [
+            {"case": case["case"], "similarity_score": float(case["similarity_score"])}
+            for case in results["top_similar_cases"]
+        ],
+        "mock_trial_analysis": results["mock_trial_analysis"],
+        "expert_document": results["expert_document"],
+        "stage_timings": results["stage_timings"],
+        "stream_metrics": results["stream_metrics"],
+        "cache_hit": results["cache_hit"]
+    }
+
+def run_job(analyzer, queue, job: Dict, worker_id: str):
+    """Run one claimed analysis, keeping the lease alive until the result is stored"""
+    heartbeat = JobHeartbeat(queue, job["id"], worker_id)
+    heartbeat.start()
+    try:
+        results = analyzer.generate_trial_scenario(
+            patent_number=job["patent_number"],
+            filing_date=job["filing_date"],
+            case_name=job["case_name"],
+            stream=True,
+            force_regenerate=job["force_regenerate"],
+            # Saved below once the job is ours to complete, so a lost lease cannot save it twice
+            save=False
+        )
+        stream = results.pop("mock_trial_analysis_stream")
+        for text in stream:
+            if heartbeat.lost.is_set():
+                stream.close()
+                raise LeaseLost(f"Job {job['id']} lease lost")
+            heartbeat.parts.append(text)
+    finally:
+        heartbeat.stop()
+    if not queue.complete(job["id"], worker_id, _job_result(results)):
+        raise LeaseLost(f"Job {job['id']} lease lost before its result was stored")
+    results["save"]()
+
+def worker_loop(worker_id: str, poll_seconds: float, stop: threading.Event):
+    """Claim and run jobs until stopped; each worker process has its own analyzer and pool"""
+    from mock_trial_analysis import MockTrialAnalyzer
+    analyzer = MockTrialAnalyzer()
+    queue = analyzer.job_queue()
+    print(f"Worker {worker_id} started")
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker_id)
+        except Exception as e:
+            print(f"Error claiming job: {e}")
+            job = None
+        if not job:
+            stop.wait(poll_seconds)
+            continue
+
+        print(f"Worker {worker_id} running job {job['id']} (attempt {job['attempts']}/{job['max_attempts']}) "
+              f"for {job['case_name']}")
+        start = time.perf_counter()
+        try:
+            run_job(analyzer, queue, job, worker_id)
+            print(f"Worker {worker_id} finished job {job['id']} in {time.perf_counter() - start:.1f}s")
+        except LeaseLost as e:
+            print(f"Worker {worker_id}: {e}; leaving it to the new owner")
+        except Exception as e:
+            print(f"Error running job {job['id']}: {e}")
+            traceback.print_exc()
+            try:
+                queue.fail(job["id"], worker_id, f"{type(e).__name__}: {e}")
+            except Exception as fail_error:
+                # The lease will expire and the job will be retried or failed by the next claim
+                print(f"Error recording failure for job {job['id']}: {fail_error}")
+    print(f"Worker {worker_id} stopped")
+
+def _worker_process(index: int, poll_seconds: float):
+    stop = threading.Event()
+    # Finish the current job on SIGTERM; an interrupted job is reclaimed once its lease expires
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    worker_loop(f"{socket.gethostname()}:{os.getpid()}:{index}", poll_seconds, stop)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued mock trial analyses")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS, help="worker processes")
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_SECONDS,
+                        help="seconds to wait when the queue is empty")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(index, args.poll_interval), name=f"analysis-worker-{index}")
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def shutdown(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for process in processes:
+        process.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+from cost_estimator import CostConfig
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+BATCH_CHECKPOINT = os.getenv('BATCH_CHECKPOINT', 'batch_checkpoint.jsonl')
+# How often a waiting case re-reads its job
+BATCH_POLL_SECONDS = float(os.getenv('BATCH_POLL_SECONDS', 2))
+
+CASE_FIELDS = ("patent_number", "filing_date", "case_name")
+
+def _case_key(case: Dict) -> str:
+    return '|'.join(str(case[field]) for field in CASE_FIELDS)
+
+def load_cases_file(path: str) -> List[Dict]:
+    """Cases from a CSV with a header row or a JSON-lines file, keyed by patent_number, filing_date, case_name"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    missing = [row for row in rows if not all(row.get(field) for field in CASE_FIELDS)]
+    if missing:
+        raise ValueError(f"{len(missing)} rows in {path} lack one of {', '.join(CASE_FIELDS)}")
+    return [{field: row[field] for field in CASE_FIELDS} for row in rows]
+
+# Filters on mock_cases' generated lookup columns, each a condition on one bound parameter
+CASE_FILTERS = {
+    "filed_from": "filing_date >= %s",
+    "filed_to": "filing_date <= %s",
+    "patent_number": "patent_number = %s",
+    "case_name": "case_name ILIKE '%%' || %s || '%%'"
+}
+
+def query_cases(analyzer, filters: Dict = None, limit: int = None) -> List[Dict]:
+    """Cases from mock_cases matching every given CASE_FILTERS value (None values are ignored)"""
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    conditions = [CASE_FILTERS[name] for name in filters]
+    params = list(filters.values()) + ([limit] if limit else [])
+    with analyzer.connection() as db:
+        cursor = db.cursor()
+        cursor.execute(f"""
+            SELECT patent_number, filing_date, case_name
+            FROM mock_cases
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY id
+            {'LIMIT %s' if limit else ''}
+        """, params or None)
+        rows = cursor.fetchall()
+        cursor.close()
+    return [dict(zip(CASE_FIELDS, row)) for row in rows]
+
+class Checkpoint:
+    """Append-only JSON-lines record of finished cases; a rerun skips cases already recorded as ok"""
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = {}
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line of a run that was killed mid-write
+                        continue
+                    if record.get("status") == "ok":
+                        self.completed[record["key"]] = record
+
+    def record(self, record: Dict):
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if record["status"] == "ok":
+                self.completed[record["key"]] = record
+
+def _llm_cost(input_tokens: int, output_tokens: int) -> float:
+    return (input_tokens / 1_000_000) * CostConfig.CLAUDE_INPUT_COST_PER_MILLION + \
+           (output_tokens / 1_000_000) * CostConfig.CLAUDE_OUTPUT_COST_PER_MILLION
+
+class BatchRunner:
+    """Submits cases to the analysis job queue (run by analysis_worker.py) with at most
+    `concurrency` of this batch's jobs in flight, and waits for each result"""
+    def __init__(self, checkpoint: Checkpoint, concurrency: int = BATCH_CONCURRENCY,
+                 force_regenerate: bool = False, poll_seconds: float = BATCH_POLL_SECONDS):
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.force_regenerate = force_regenerate
+        self.poll_seconds = poll_seconds
+        from mock_trial_analysis import MockTrialAnalyzer
+        self.analyzer = MockTrialAnalyzer()
+        self.queue = self.analyzer.job_queue()
+        self.stopping = threading.Event()
+
+    def _wait(self, job_id: int) -> Dict:
+        """Poll a job until it has succeeded or failed for good"""
+        while True:
+            job = self.queue.get(job_id)
+            if job is None:
+                raise ValueError(f"job {job_id} disappeared")
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            time.sleep(self.poll_seconds)
+
+    def analyze_case(self, case: Dict) -> Dict:
+        """Analyze one case through the job queue and return its checkpoint record"""
+        record = {"key": _case_key(case), **case, "started_at": datetime.now().isoformat()}
+        if self.stopping.is_set():
+            return {**record, "status": "skipped"}
+        start = time.perf_counter()
+        case_id = None
+        try:
+            row = self.analyzer.case_repository().mark_in_progress(
+                case["patent_number"], case["filing_date"], case["case_name"])
+            if not row:
+                raise ValueError("case not found")
+            case_id = row["id"]
+            # Same path as the UI: a case with a queued or running job joins that job instead of
+            # starting a second analysis, and the job clears the in-progress flag when it finishes
+            job_id = self.queue.submit(case_id, case["patent_number"], case["filing_date"], case["case_name"],
+                                       force_regenerate=self.force_regenerate)
+            job = self._wait(job_id)
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            results = job["result"]
+            metrics = results.get("stream_metrics") or {}
+            input_tokens = metrics.get("input_tokens", 0)
+            output_tokens = metrics.get("output_tokens", 0)
+            record.update({
+                "status": "ok",
+                "case_id": case_id,
+                "job_id": job_id,
+                "attempts": job["attempts"],
+                "latency_s": time.perf_counter() - start,
+                "time_to_first_token_s": metrics.get("time_to_first_token"),
+                "cache_hit": results["cache_hit"],
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cost_usd": _llm_cost(input_tokens, output_tokens),
+                "stage_timings": results["stage_timings"]
+            })
+        except Exception as e:
+            record.update({"status": "error", "case_id": case_id, "latency_s": time.perf_counter() - start,
+                           "error": f"{type(e).__name__}: {e}"})
+        return record
+
+    def run(self, cases: List[Dict]) -> Tuple[List[Dict], float]:
+        """Analyze every case not already in the checkpoint; returns this run's records and wall time"""
+        pending = [case for case in cases if _case_key(case) not in self.checkpoint.completed]
+        print(f"{len(cases)} cases, {len(cases) - len(pending)} already done, {len(pending)} to run "
+              f"with concurrency {self.concurrency}")
+        records = []
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = [executor.submit(self.analyze_case, case) for case in pending]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                if record["status"] == "skipped":
+                    continue
+                self.checkpoint.record(record)
+                records.append(record)
+                elapsed = time.perf_counter() - start
+                outcome = "cached" if record.get("cache_hit") else record["status"]
+                print(f"[{len(records)}/{len(pending)}] {record['case_name']}: {outcome} in "
+                      f"{record['latency_s']:.1f}s ({len(records) / elapsed * 3600:.0f} cases/hour)")
+        except KeyboardInterrupt:
+            # Cases in flight finish and are checkpointed; the rest run on the next invocation
+            print("Interrupted; finishing cases in flight (Ctrl-C again to abort)")
+            self.stopping.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            for future in futures:
+                if future.done() and not future.cancelled():
+                    record = future.result()
+                    if record["status"] != "skipped" and record not in records:
+                        self.checkpoint.record(record)
+                        records.append(record)
+        finally:
+            executor.shutdown(wait=True)
+        return records, time.perf_counter() - start
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))]
+
+def summarize(records: List[Dict], wall_seconds: float, total_cases: int, resumed: int) -> Dict:
+    """Throughput, latency and cost for the cases analyzed in this run"""
+    succeeded = [record for record in records if record["status"] == "ok"]
+    latencies = [record["latency_s"] for record in succeeded]
+    model_calls = [record for record in succeeded if not record["cache_hit"]]
+    first_tokens = [record["time_to_first_token_s"] for record in model_calls
+                    if record.get("time_to_first_token_s") is not None]
+    cost = sum(record["cost_usd"] for record in succeeded)
+    return {
+        "finished_at": datetime.now().isoformat(),
+        "total_cases": total_cases,
+        "resumed_from_checkpoint": resumed,
+        "attempted": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(records) - len(succeeded),
+        "cache_hits": len(succeeded) - len(model_calls),
+        "wall_seconds": wall_seconds,
+        "throughput_cases_per_hour": len(succeeded) / wall_seconds * 3600 if wall_seconds else 0.0,
+        "latency_s": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "max": max(latencies) if latencies else 0.0,
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0
+        },
+        "time_to_first_token_p50_s": _percentile(first_tokens, 50),
+        "input_tokens": sum(record["input_tokens"] for record in succeeded),
+        "output_tokens": sum(record["output_tokens"] for record in succeeded),
+        "cost_usd": cost,
+        "cost_per_case_usd": cost / len(succeeded) if succeeded else 0.0,
+        # Rate limiting happens in the worker processes; retried jobs are the visible effect here
+        "retried_jobs": sum(1 for record in succeeded if record.get("attempts", 1) > 1),
+        "errors": [{"case_name": record["case_name"], "error": record["error"]}
+                   for record in records if record["status"] == "error"]
+    }
+
+def print_summary(summary: Dict):
+    print("\n=== Batch Analysis Summary ===")
+    print(f"Cases: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['resumed_from_checkpoint']} done in earlier runs ({summary['total_cases']} total)")
+    print(f"Stored analyses reused: {summary['cache_hits']}")
+    print(f"Wall time: {summary['wall_seconds']:.1f}s, throughput {summary['throughput_cases_per_hour']:.1f} cases/hour")
+    latency = summary["latency_s"]
+    print(f"Latency: p50 {latency['p50']:.1f}s, p95 {latency['p95']:.1f}s, max {latency['max']:.1f}s; "
+          f"first token p50 {summary['time_to_first_token_p50_s']:.1f}s")
+    print(f"Tokens: {summary['input_tokens']} input, {summary['output_tokens']} output")
+    print(f"Estimated Claude cost: ${summary['cost_usd']:.2f} (${summary['cost_per_case_usd']:.4f} per case)")
+    print(f"Jobs that needed more than one attempt: {summary['retried_jobs']}")
+    for error in summary["errors"][:10]:
+        print(f"  failed: {error['case_name']}: {error['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run mock trial analyses over many cases through the "
+                                                 "job queue (analysis_worker.py must be running)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--cases", help="CSV or JSON-lines file with patent_number, filing_date, case_name")
+    source.add_argument("--all", action="store_true", help="every case in mock_cases")
+    case_filter = parser.add_argument_group("mock_cases filters (combined with AND)")
+    case_filter.add_argument("--filed-from", help="filing date on or after, YYYY-MM-DD")
+    case_filter.add_argument("--filed-to", help="filing date on or before, YYYY-MM-DD")
+    case_filter.add_argument("--patent-number", help="exact patent number")
+    case_filter.add_argument("--case-name", help="case name contains (case-insensitive)")
+    parser.add_argument("--limit", type=int, help="at most this many cases from mock_cases")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="jobs this batch keeps queued or running at once (analysis_worker.py runs them)")
+    parser.add_argument("--checkpoint", default=BATCH_CHECKPOINT,
+                        help="progress file; rerunning with the same file resumes an interrupted batch")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and analyze every case")
+    parser.add_argument("--force-regenerate", action="store_true",
+                        help="call the model even when an analysis of the identical prompt is stored")
+    parser.add_argument("--summary", help="write the summary as JSON")
+    args = parser.parse_args()
+    filters = {name: getattr(args, name) for name in CASE_FILTERS}
+    has_filters = any(value is not None for value in filters.values())
+    if args.cases and has_filters:
+        parser.error("mock_cases filters cannot be combined with --cases")
+    if not (args.cases or args.all or has_filters):
+        parser.error("give --cases, --all or at least one mock_cases filter")
+
+    runner = BatchRunner(Checkpoint(args.checkpoint, restart=args.restart), args.concurrency, args.force_regenerate)
+    if args.cases:
+        cases = load_cases_file(args.cases)[:args.limit]
+    else:
+        cases = query_cases(runner.analyzer, filters, args.limit)
+    resumed = sum(1 for case in cases if _case_key(case) in runner.checkpoint.completed)
+
+    records, wall_seconds = runner.run(cases)
+    summary = summarize(records, wall_seconds, len(cases), resumed)
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import weakref
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from psycopg2 import errors as pg_errors
+
+CASE_COLUMNS = "id, data, analysis_in_progress"
+# Generated columns over data->'details'->>'patent_number', ->>'filing_date' and data->>'case_name'
+CASE_KEY_FILTER = "patent_number = $1 AND filing_date = $2 AND case_name = $3"
+
+# name -> (parameter types, statement); prepared once per server session
+STATEMENTS = {
+    "case_by_key": ("text, text, text", f"""
+        SELECT {CASE_COLUMNS} FROM mock_cases
+        WHERE {CASE_KEY_FILTER}
+        ORDER BY analysis_in_progress DESC, id
+        LIMIT 1
+    """),
+    "case_by_id": ("integer", f"SELECT {CASE_COLUMNS} FROM mock_cases WHERE id = $1"),
+    "mark_case_in_progress": ("text, text, text", f"""
+        UPDATE mock_cases SET analysis_in_progress = 1
+        WHERE {CASE_KEY_FILTER}
+        RETURNING {CASE_COLUMNS}
+    """)
+}
+
+# Statement names prepared on each connection (one server session each); an entry goes away
+# with its connection, so a connection the pool discards leaves nothing behind
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+def _execute(db, name: str, params: Tuple):
+    """EXECUTE a named statement, preparing it on this session first if needed"""
+    types, statement = STATEMENTS[name]
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor = db.cursor()
+    for attempt in range(2):
+        with _prepared_lock:
+            prepared = name in _prepared.setdefault(db, set())
+        try:
+            if not prepared:
+                cursor.execute(f"PREPARE {name} ({types}) AS {statement}")
+                with _prepared_lock:
+                    _prepared[db].add(name)
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            return cursor
+        except (pg_errors.InvalidSqlStatementName, pg_errors.DuplicatePreparedStatement) as e:
+            # Our bookkeeping disagrees with the server (e.g. DISCARD ALL); resync and retry once
+            db.rollback()
+            with _prepared_lock:
+                if isinstance(e, pg_errors.DuplicatePreparedStatement):
+                    _prepared[db].add(name)
+                else:
+                    _prepared[db].discard(name)
+            if attempt:
+                cursor.close()
+                raise
+
+def _row_to_case(row) -> Optional[Dict]:
+    if not row:
+        return None
+    return {"id": row[0], "data": row[1], "analysis_in_progress": row[2]}
+
+class CaseRepository:
+    """Mock case lookups that fetch id and data in one round-trip through prepared statements.
+    Rows are memoized by key and by id, so create one repository per request."""
+    def __init__(self, pool):
+        self.pool = pool
+        self._by_key = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _use_connection(self, db=None):
+        if db is not None:
+            yield db
+        else:
+            with self.pool.connection() as pooled:
+                yield pooled
+
+    def _remember(self, key: Tuple[str, str, str], case: Optional[Dict]) -> Optional[Dict]:
+        if case is not None:
+            with self._lock:
+                self._by_id[case["id"]] = case
+                self._by_key[key] = case
+        return case
+
+    def find_by_key(self, patent_number: str, filing_date: str, case_name: str, db=None) -> Optional[Dict]:
+        """Case matching the patent number, filing date and case name, preferring one in progress"""
+        key = (patent_number, filing_date, case_name)
+        with self._lock:
+            if key in self._by_key:
+                return self._by_key[key]
+        with self._use_connection(db) as db:
+            cursor = _execute(db, "case_by_key", key)
+            case = _row_to_case(cursor.fetchone())
+            cursor.close()
+        return self._remember(key, case)
+
+    def get_by_id(self, case_id: int, db=None) -> Optional[Dict]:
+        """Case by primary key"""
+        with self._lock:
+            if case_id in self._by_id:
+                return self._by_id[case_id]
+        with self._use_connection(db) as db:
+            cursor = _execute(db, "case_by_id", (case_id,))
+            case = _row_to_case(cursor.fetchone())
+            cursor.close()
+        if case is not None:
+            with self._lock:
+                self._by_id[case_id] = case
+        return case
+
+    def mark_in_progress(self, patent_number: str, filing_date: str, case_name: str, db=None) -> Optional[Dict]:
+        """Flag the case for analysis and return its row from the same UPDATE"""
+        key = (patent_number, filing_date, case_name)
+        with self._use_connection(db) as db:
+            cursor = _execute(db, "mark_case_in_progress", key)
+            case = _row_to_case(cursor.fetchone())
+            db.commit()
+            cursor.close()
+        return self._remember(key, case)
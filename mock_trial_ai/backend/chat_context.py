@@ -0,0 +1,175 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional
+from cost_estimator import SQLQueryAnalyzer
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', 3000))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv('CHAT_SUMMARY_TOKEN_BUDGET', 600))
+# Sections longer than this are split at paragraph breaks so one long section cannot crowd out the rest
+CHAT_SECTION_MAX_TOKENS = int(os.getenv('CHAT_SECTION_MAX_TOKENS', 800))
+
+# Markdown headings, numbered headings ("3. Expert witness ...") and ALL-CAPS labels
+SECTION_HEADING = re.compile(r'^\s*(#{1,6}\s+\S|\d+\.\s+[A-Z]|[A-Z][A-Z0-9 &/\-]{3,}:?\s*$)')
+WORD = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "are", "was", "were", "be",
+    "what", "how", "why", "which", "who", "our", "we", "us", "it", "this", "that", "with", "as",
+    "at", "by", "from", "do", "does", "should", "would", "could", "can", "your", "you", "their"
+}
+
+def _terms(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 2]
+
+class ChatContext:
+    """Follow-up context kept within a token budget: a compact running summary of earlier
+    turns plus the analysis and expert-document sections most relevant to the question"""
+    def __init__(self, analysis: str, expert_document: str = "",
+                 token_budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+                 summary_budget: int = CHAT_SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.counter = SQLQueryAnalyzer()
+        self.sections = self._split(analysis or "", "Analysis") + self._split(expert_document or "", "Expert Document")
+        self.full_context_tokens = self.count_tokens(analysis or "") + self.count_tokens(expert_document or "")
+        self.summary = []
+        self.turns = []
+        self.last_context_tokens = 0
+        self.last_sections_used = 0
+
+        # Inverse document frequency over sections, so rare case-specific terms dominate the match
+        document_frequency = Counter(term for section in self.sections for term in set(section["terms"]))
+        self.idf = {term: math.log(1 + len(self.sections) / count) for term, count in document_frequency.items()}
+
+    def count_tokens(self, text: str) -> int:
+        return self.counter.estimate_token_count(text)
+
+    def _split(self, text: str, source: str) -> List[Dict]:
+        """Break a document into heading-delimited sections, then oversized ones into paragraph runs"""
+        blocks = []
+        current = []
+        for line in text.replace('\r\n', '\n').split('\n'):
+            if SECTION_HEADING.match(line) and any(part.strip() for part in current):
+                blocks.append('\n'.join(current).strip())
+                current = []
+            current.append(line)
+        if any(part.strip() for part in current):
+            blocks.append('\n'.join(current).strip())
+
+        sections = []
+        for block in blocks:
+            pieces = [block]
+            if self.count_tokens(block) > CHAT_SECTION_MAX_TOKENS:
+                pieces, piece = [], []
+                for paragraph in re.split(r'\n\s*\n', block):
+                    if piece and self.count_tokens('\n\n'.join(piece + [paragraph])) > CHAT_SECTION_MAX_TOKENS:
+                        pieces.append('\n\n'.join(piece))
+                        piece = []
+                    piece.append(paragraph)
+                if piece:
+                    pieces.append('\n\n'.join(piece))
+            for piece in pieces:
+                sections.append({
+                    "source": source,
+                    "position": len(sections),
+                    "text": piece,
+                    "terms": _terms(piece),
+                    "tokens": self.count_tokens(piece)
+                })
+        return sections
+
+    def _score(self, section: Dict, query_terms: Counter) -> float:
+        if not section["terms"]:
+            return 0.0
+        counts = Counter(section["terms"])
+        overlap = sum(self.idf.get(term, 0.0) * min(counts[term], 3) * weight for term, weight in query_terms.items())
+        # Mild length normalization so long sections do not win on volume alone
+        return overlap / math.sqrt(len(section["terms"]))
+
+    def _summary_text(self) -> str:
+        """Most recent turns that fit the summary budget, oldest first"""
+        kept = []
+        used = 0
+        for line in reversed(self.summary):
+            tokens = self.count_tokens(line)
+            if used + tokens > self.summary_budget:
+                break
+            kept.append(line)
+            used += tokens
+        return '\n'.join(reversed(kept))
+
+    def build(self, question: str) -> str:
+        """Context block for the next follow-up question"""
+        summary = self._summary_text()
+        remaining = self.token_budget - self.count_tokens(summary)
+
+        # Earlier questions are weighted in so short follow-ups ("and the damages?") stay on topic
+        query_terms = Counter({term: 1.0 for term in _terms(question)})
+        for turn in self.turns[-2:]:
+            for term in _terms(turn["question"]):
+                query_terms[term] = max(query_terms[term], 0.5)
+
+        ranked = sorted(self.sections, key=lambda section: self._score(section, query_terms), reverse=True)
+        selected = []
+        for section in ranked:
+            if section["tokens"] <= remaining:
+                selected.append(section)
+                remaining -= section["tokens"]
+        # Read better in document order, analysis before expert findings
+        selected.sort(key=lambda section: (section["source"] != "Analysis", section["position"]))
+
+        parts = []
+        if summary:
+            parts.append(f"Conversation So Far:\n{summary}")
+        for source in ("Analysis", "Expert Document"):
+            excerpts = [section["text"] for section in selected if section["source"] == source]
+            if excerpts:
+                parts.append(f"Relevant {source} Excerpts:\n" + '\n\n'.join(excerpts))
+        context = '\n\n'.join(parts)
+        self.last_context_tokens = self.count_tokens(context)
+        self.last_sections_used = len(selected)
+        return context
+
+    def record_turn(self, question: str, answer: str, role: str, prompt: str,
+                    input_tokens: Optional[int] = None) -> Dict:
+        """Fold the turn into the running summary and record its token counts.
+        input_tokens is the count reported by the API when available; the estimate is always kept."""
+        first_sentences = ' '.join(re.split(r'(?<=[.!?])\s+', answer.strip())[:2])
+        self.summary.append(f"- {role} asked: {question.strip()}\n  Answer: {first_sentences}")
+
+        estimated = self.count_tokens(prompt)
+        turn = {
+            "question": question,
+            "estimated_input_tokens": estimated,
+            "input_tokens": input_tokens,
+            # The same prompt with the whole analysis and expert document in place of the compact context
+            "full_context_tokens": estimated - self.last_context_tokens + self.full_context_tokens,
+            "sections_used": self.last_sections_used,
+            "sections_total": len(self.sections)
+        }
+        self.turns.append(turn)
+        return turn
+
+    def stats(self) -> Dict:
+        """Token usage across recorded turns compared with sending the full analysis every time"""
+        estimated = sum(turn["estimated_input_tokens"] for turn in self.turns)
+        full = sum(turn["full_context_tokens"] for turn in self.turns)
+        return {
+            "turns": len(self.turns),
+            "input_tokens": sum(turn["input_tokens"] or 0 for turn in self.turns),
+            "estimated_input_tokens": estimated,
+            "full_context_tokens": full,
+            "saved_tokens": full - estimated,
+            "saved_ratio": (full - estimated) / full if full else 0.0
+        }
@@ -0,0 +1,65 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import threading
+
+_env_loaded = set()
+_clients = {}
+_clients_lock = threading.RLock()
+
+def load_env(path: str = 'config.env'):
+    """Read API keys from an env file once, the first time a client needs them"""
+    with _clients_lock:
+        if path not in _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            _env_loaded.add(path)
+
+def _get_client(name: str, factory):
+    """Build a client on first use and share it across the process.
+    SERVICE_MODE=record|replay|stub swaps in service_replay's stand-in (see that module)."""
+    with _clients_lock:
+        if name not in _clients:
+            from service_replay import wrap
+            def build():
+                load_env()
+                return factory()
+            _clients[name] = wrap(name, build)
+        return _clients[name]
+
+def get_openai_client():
+    """OpenAI client; the openai package is imported on first call"""
+    def build():
+        from openai import OpenAI
+        # rate_limiter retries with shared backoff, so the SDK's own retries are off
+        return OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+    return _get_client('openai', build)
+
+def get_claude_client():
+    """Anthropic client; the anthropic package is imported on first call"""
+    def build():
+        import anthropic
+        return anthropic.Client(api_key=os.getenv('CLAUDE_API_KEY'), max_retries=0)
+    return _get_client('claude', build)
+
+def get_pinecone_index(index_name: str):
+    """Pinecone index handle; the pinecone package is imported on first call"""
+    def build():
+        from pinecone import Pinecone
+        return Pinecone(api_key=os.getenv('PINECONE_API_KEY')).Index(index_name)
+    return _get_client(f'pinecone:{index_name}', build)
+
+def get_mongo_client(uri: str = 'mongodb://localhost:27017/'):
+    """MongoDB client; pymongo is imported on first call"""
+    def build():
+        from pymongo import MongoClient
+        return MongoClient(uri)
+    return _get_client(f'mongo:{uri}', build)
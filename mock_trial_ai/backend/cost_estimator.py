@@ -13,9 +13,9 @@ import json
 import time
 from datetime import datetime
 from typing import Dict, List, Optional, Union
-from dataclasses import dataclass
-import psycopg2
+from dataclasses import dataclass, asdict
 from psycopg2.extras import RealDictCursor
+from db_pool import get_pool
 
 @dataclass
 class CostConfig:
@@ -95,25 +95,21 @@ class QueryExecutor:
     """Executes SQL queries and measures performance"""
     def __init__(self, db_config: DatabaseConfig):
         self.db_config = db_config
+        # Same process-wide pool the analyzers use when the settings match
+        self.pool = get_pool(asdict(db_config))
         
     def execute_query(self, query: str) -> tuple[List[Dict], float]:
         """Execute query and return results with execution time"""
         start_time = time.time()
         
-        with psycopg2.connect(
-            host=self.db_config.host,
-            port=self.db_config.port,
-            dbname=self.db_config.dbname,
-            user=self.db_config.user,
-            password=self.db_config.password,
-            cursor_factory=RealDictCursor
-        ) as conn:
-            with conn.cursor() as cur:
+        with self.pool.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("EXPLAIN ANALYZE " + query)
                 execution_plan = cur.fetchall()
                 
                 cur.execute(query)
                 results = cur.fetchall()
+            conn.commit()
                 
         execution_time = time.time() - start_time
         return results, execution_time
@@ -235,10 +231,10 @@ def main():
             cc.data -> 'sub_opinions' AS sub_opinions,  
             cc.data ->> 'arguments' AS arguments
             FROM main_cases mc
-            JOIN docket_cases dc ON mc.data ->> 'docket_id' = dc.data ->> 'id'
-            JOIN cluster_cases cc ON cc.data ->> 'docket_id' = dc.data ->> 'id'
-            LEFT JOIN case_opinions co ON (mc.data ->> 'caseName' = co.case_name AND co.type = 'combined-opinion')
-            WHERE mc.data ->> 'caseName' IS NOT NULL
+            JOIN docket_cases dc ON mc.docket_id = dc.docket_id
+            JOIN cluster_cases cc ON cc.docket_id = dc.docket_id
+            LEFT JOIN case_opinions co ON (mc.case_name = co.case_name AND co.type = 'combined-opinion')
+            WHERE mc.case_name IS NOT NULL
             AND mc.data ->> 'status' IS NOT NULL  
             ORDER BY (mc.data->>'dateFiled')::DATE DESC
             LIMIT 5
@@ -0,0 +1,150 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv('DB_POOL_HEALTHCHECK_AFTER', 30))
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool with blocking checkout, health checks and utilization metrics"""
+    def __init__(self, db_config: Dict, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **db_config)
+        # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to timeout seconds for a free slot"""
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise pg_pool.PoolError(f"No database connection available after {self.timeout}s")
+        waited = time.perf_counter() - start
+
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._last_used.pop(id(conn), None)
+                    self.discarded += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection; open transactions are rolled back by the underlying pool"""
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+            self.in_use -= 1
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def _is_healthy(self, conn) -> bool:
+        """Cheap check for connections that were just used, a round-trip ping for idle ones"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < DB_POOL_HEALTHCHECK_AFTER:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def metrics(self) -> Dict:
+        """Pool size and utilization counters"""
+        with self._lock:
+            open_connections = len(self._pool._used) + len(self._pool._pool)
+            return {
+                "max_size": self.maxconn,
+                "open": open_connections,
+                "in_use": self.in_use,
+                "idle": open_connections - self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "utilization": self.in_use / self.maxconn,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded
+            }
+
+    def closeall(self):
+        self._pool.closeall()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_config: Dict) -> ConnectionPool:
+    """Process-wide pool for a database configuration, shared by every caller"""
+    key = tuple(sorted((name, str(value)) for name, value in db_config.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_config)
+        return _pools[key]
+
+def get_pool_metrics() -> Dict:
+    """Metrics for every pool in the process, keyed by database name"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {dict(key).get('dbname', 'default'): db_pool.metrics() for key, db_pool in pools.items()}
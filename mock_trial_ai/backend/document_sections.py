@@ -0,0 +1,36 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import re
+from typing import Dict, Optional
+
+# Expert report sections the analysis prompt uses, in prompt order. Same patterns the analyzer
+# used to run through SUBSTRING in Postgres (where '.' also matches newlines)
+SECTION_PATTERNS = {
+    "prepared_by": re.compile(r'Prepared By:.*?Date:.*?\n', re.DOTALL),
+    "source_code_analysis": re.compile(r'4\. Source Code Analysis[\s\S]*?(?=5\.)'),
+    "financial_impact": re.compile(r'5\. Financial Impact Assessment[\s\S]*?(?=6\.)'),
+    "expert_conclusions": re.compile(r'6\. Expert Conclusions[\s\S]*?(?=7\.)')
+}
+
+def extract_sections(text: str) -> Dict[str, Optional[str]]:
+    """Split an expert report into the sections above; missing sections are None"""
+    sections = {}
+    for name, pattern in SECTION_PATTERNS.items():
+        match = pattern.search(text or "")
+        sections[name] = match.group(0) if match else None
+    return sections
+
+def expert_findings(sections: Optional[Dict]) -> str:
+    """Sections joined for the prompt. Like the SQL concatenation it replaces, a report missing
+    any section contributes nothing."""
+    if not sections or any(not sections.get(name) for name in SECTION_PATTERNS):
+        return ""
+    return ''.join(sections[name] for name in SECTION_PATTERNS)
@@ -0,0 +1,261 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import threading
+from typing import Iterator, List, Tuple
+
+# 'openai' (ada-002 over the API) or 'legalbert' (local CPU inference, no network or per-token cost)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai')
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+# Batching limits for the embeddings endpoint (ada-002 accepts up to 2048 inputs per request)
+EMBEDDING_BATCH_TOKEN_BUDGET = int(os.getenv('EMBEDDING_BATCH_TOKEN_BUDGET', 100000))
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_MAX_WORKERS = int(os.getenv('EMBEDDING_MAX_WORKERS', 4))
+
+LEGALBERT_MODEL = os.getenv('LEGALBERT_MODEL', 'nlpaueb/legal-bert-base-uncased')
+LEGALBERT_BATCH_SIZE = int(os.getenv('LEGALBERT_BATCH_SIZE', 16))
+LEGALBERT_MAX_LENGTH = int(os.getenv('LEGALBERT_MAX_LENGTH', 512))
+# 0 keeps torch's default (one thread per physical core)
+LEGALBERT_THREADS = int(os.getenv('LEGALBERT_THREADS', 0))
+LEGALBERT_INT8 = os.getenv('LEGALBERT_INT8', '0').lower() in ('1', 'true', 'yes')
+# Long documents are embedded as overlapping windows of LEGALBERT_MAX_LENGTH tokens.
+# Pooling: 'mean' (token-weighted average of the windows), 'max' (element-wise), or
+# 'chunks' (one vector per window, stored separately)
+LEGALBERT_CHUNK_OVERLAP = int(os.getenv('LEGALBERT_CHUNK_OVERLAP', 64))
+LEGALBERT_POOLING = os.getenv('LEGALBERT_POOLING', 'mean')
+POOLING_MODES = ("mean", "max", "chunks")
+
+def estimate_embedding_tokens(text: str) -> int:
+    """Rough token count for batching (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+class TokenizedBatch(list):
+    """A batch of texts that also carries their token ids, so embedding it does not tokenize again"""
+    def __init__(self, texts: List[str], input_ids: List[List[int]]):
+        super().__init__(texts)
+        self.input_ids = input_ids
+
+def length_buckets(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """Indices grouped into batches of similar token length, shortest first, so a padded
+    batch is mostly real tokens instead of padding up to its longest text"""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+class EmbeddingBackend:
+    """Turns texts into vectors. `model` names the vector space: cached embeddings and the
+    reference index are keyed by it, so backends never mix vectors."""
+    model = None
+    # Batches sent concurrently by MockTrialAnalyzer._get_embeddings
+    max_workers = 1
+
+    def pack_batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed any number of texts batch by batch; vectors come back in input order"""
+        vectors = {}
+        for batch in self.pack_batches(list(dict.fromkeys(texts))):
+            vectors.update(zip(batch, self.embed_batch(batch)))
+        return [vectors[text] for text in texts]
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """ada-002 through the OpenAI API, throttled and retried by the shared rate limiter"""
+    model = OPENAI_EMBEDDING_MODEL
+    max_workers = EMBEDDING_MAX_WORKERS
+
+    def pack_batches(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into requests that stay under the token budget and input limit"""
+        batches = []
+        current = []
+        current_tokens = 0
+        for text in texts:
+            tokens = estimate_embedding_tokens(text)
+            if current and (current_tokens + tokens > EMBEDDING_BATCH_TOKEN_BUDGET
+                            or len(current) >= EMBEDDING_BATCH_MAX_INPUTS):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        from clients import get_openai_client
+        from rate_limiter import get_limiter
+        response = get_limiter('openai').call(
+            get_openai_client().embeddings.create,
+            input=texts,
+            model=self.model,
+            tokens=sum(estimate_embedding_tokens(text) for text in texts)
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class LegalBertEmbeddingBackend(EmbeddingBackend):
+    """Mean-pooled LegalBERT on the CPU. Texts are embedded in padded batches with padding masked
+    out of the mean; int8 dynamic quantization of the linear layers is optional."""
+    # torch parallelizes each batch across threads already
+    max_workers = 1
+
+    def __init__(self, model_name: str = LEGALBERT_MODEL, batch_size: int = LEGALBERT_BATCH_SIZE,
+                 num_threads: int = LEGALBERT_THREADS, quantize: bool = LEGALBERT_INT8,
+                 max_length: int = LEGALBERT_MAX_LENGTH, overlap: int = LEGALBERT_CHUNK_OVERLAP,
+                 pooling: str = LEGALBERT_POOLING):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.quantize = quantize
+        self.max_length = max_length
+        self.overlap = overlap
+        self.pooling = pooling
+        # Quantized vectors differ slightly, so they get their own cache and index namespace
+        self.model = f"{model_name}{':int8' if quantize else ''}"
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Load the tokenizer and model on first use; torch and transformers are imported here"""
+        with self._lock:
+            if self._model is None:
+                import torch
+                from transformers import AutoModel, AutoTokenizer
+                if self.num_threads:
+                    torch.set_num_threads(self.num_threads)
+                model = AutoModel.from_pretrained(self.model_name)
+                model.eval()
+                if self.quantize:
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = model
+        return self._model, self._tokenizer
+
+    def _tokenize(self, texts: List[str]) -> List[List[int]]:
+        """Token ids per text, truncated but not padded"""
+        if not texts:
+            return []
+        _, tokenizer = self._load()
+        return tokenizer(texts, max_length=self.max_length, truncation=True)["input_ids"]
+
+    def pack_batches(self, texts: List[str]) -> List[List[str]]:
+        """Batches of texts with similar token lengths, carrying the token ids for embed_batch"""
+        input_ids = self._tokenize(texts)
+        return [TokenizedBatch([texts[i] for i in batch], [input_ids[i] for i in batch])
+                for batch in length_buckets([len(ids) for ids in input_ids], self.batch_size)]
+
+    def _forward(self, input_ids: List[List[int]]) -> List[List[float]]:
+        """Mean-pooled vectors for one batch of token ids, padded to its longest row"""
+        import torch
+        model, tokenizer = self._load()
+        inputs = tokenizer.pad({"input_ids": input_ids}, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return pooled.tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        input_ids = texts.input_ids if isinstance(texts, TokenizedBatch) else self._tokenize(texts)
+        return self._forward(input_ids)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Tokenize once, run length-sorted batches and return vectors in input order"""
+        input_ids = self._tokenize(texts)
+        vectors = [None] * len(texts)
+        for batch in length_buckets([len(ids) for ids in input_ids], self.batch_size):
+            for index, vector in zip(batch, self._forward([input_ids[i] for i in batch])):
+                vectors[index] = vector
+        return vectors
+
+    def _windows(self, texts: List[str]) -> Iterator[Tuple[int, int, int, List[int]]]:
+        """(text index, window index, content tokens, input ids) for overlapping windows.
+        Each text is tokenized once, when the stream reaches it."""
+        _, tokenizer = self._load()
+        content = self.max_length - tokenizer.num_special_tokens_to_add()
+        stride = max(1, content - self.overlap)
+        for text_index, text in enumerate(texts):
+            ids = tokenizer(text, add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+            start = 0
+            window = 0
+            while True:
+                piece = ids[start:start + content]
+                yield text_index, window, len(piece), tokenizer.build_inputs_with_special_tokens(piece)
+                if start + content >= len(ids):
+                    break
+                start += stride
+                window += 1
+
+    def embed_chunks(self, texts: List[str]) -> Iterator[Tuple[int, int, int, List[float]]]:
+        """Stream (text index, window index, content tokens, vector) for every window of every text.
+        Windows are buffered a few batches at a time and length-bucketed, so memory stays flat
+        however long the documents are."""
+        windows = self._windows(texts)
+        while True:
+            buffer = [window for _, window in zip(range(self.batch_size * 8), windows)]
+            if not buffer:
+                return
+            for batch in length_buckets([len(window[3]) for window in buffer], self.batch_size):
+                vectors = self._forward([buffer[i][3] for i in batch])
+                for i, vector in zip(batch, vectors):
+                    yield buffer[i][0], buffer[i][1], buffer[i][2], vector
+
+    def embed_documents(self, texts: List[str], pooling: str = None) -> List:
+        """Embed whole documents rather than their first max_length tokens. With 'mean' or 'max'
+        each document gets one vector; with 'chunks' each gets a list of per-window vectors."""
+        pooling = pooling or self.pooling
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling '{pooling}'; choose from {', '.join(POOLING_MODES)}")
+        pooled = [None] * len(texts)
+        weights = [0] * len(texts)
+        for text_index, window, tokens, vector in self.embed_chunks(texts):
+            # An empty text still yields one [CLS] [SEP] window
+            tokens = max(1, tokens)
+            current = pooled[text_index]
+            if pooling == "chunks":
+                pooled[text_index] = current or []
+                pooled[text_index].append((window, vector))
+            elif current is None:
+                pooled[text_index] = [value * tokens for value in vector] if pooling == "mean" else vector
+            elif pooling == "mean":
+                pooled[text_index] = [a + value * tokens for a, value in zip(current, vector)]
+            else:
+                pooled[text_index] = [max(a, value) for a, value in zip(current, vector)]
+            weights[text_index] += tokens
+
+        if pooling == "chunks":
+            # Windows of one text can finish out of order after length bucketing
+            return [[vector for _, vector in sorted(chunks)] for chunks in pooled]
+        if pooling == "mean":
+            return [[value / weight for value in vector] for vector, weight in zip(pooled, weights)]
+        return pooled
+
+BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "legalbert": LegalBertEmbeddingBackend
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_embedding_backend(name: str = None) -> EmbeddingBackend:
+    """Process-wide backend, chosen by EMBEDDING_BACKEND unless named; a local model loads once"""
+    name = name or EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'; choose from {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
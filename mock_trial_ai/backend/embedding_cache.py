@@ -0,0 +1,159 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH',
+    os.path.join(current_dir, 'cache', 'embeddings.sqlite3')
+)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed by a hash of (model, text) with LRU eviction"""
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection shared by every analyzer in the process, guarded by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self.bytes_used = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address for an embedding"""
+        return hashlib.sha256(model.encode('utf-8') + b'\0' + text.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding or None"""
+        return self.get_many(model, [text]).get(text)
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the texts that are present, keyed by text"""
+        keys = {self.make_key(model, text): text for text in texts}
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            key_list = list(keys)
+            # SQLite caps bound parameters per statement, so look up in chunks
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[keys[key]] = vector.tolist()
+            now = time.time()
+            hit_keys = [(now, self.make_key(model, text)) for text in found]
+            if hit_keys:
+                self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", hit_keys)
+            self.hits += len(found)
+            self.misses += len(set(texts)) - len(found)
+        return found
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        """Store an embedding and evict least recently used entries past max_bytes"""
+        self.put_many(model, {text: embedding})
+
+    def put_many(self, model: str, embeddings: Dict[str, List[float]]):
+        """Store several embeddings in a single transaction"""
+        if not embeddings:
+            return
+        now = time.time()
+        rows = []
+        for text, embedding in embeddings.items():
+            blob = array('f', embedding).tobytes()
+            rows.append((self.make_key(model, text), model, blob, len(blob), now))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    previous = self._conn.execute("SELECT nbytes FROM embeddings WHERE key = ?", (row[0],)).fetchone()
+                    self._conn.execute("""
+                        INSERT OR REPLACE INTO embeddings (key, model, vector, nbytes, last_access)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, row)
+                    self.bytes_used += row[3] - (previous[0] if previous else 0)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if self.bytes_used > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes (caller holds _lock)"""
+        # Other processes share the file, so resync before deciding how much to drop
+        self.bytes_used = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        excess = self.bytes_used - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        freed = 0
+        for key, nbytes in self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_access ASC"):
+            victims.append((key,))
+            freed += nbytes
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self.bytes_used -= freed
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict:
+        """Cache counters: hits, misses, evictions and bytes used"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache shared by all analyzer instances"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
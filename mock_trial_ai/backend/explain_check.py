@@ -0,0 +1,105 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import sys
+import json
+import argparse
+from typing import Dict, List, Tuple
+from case_repository import STATEMENTS
+
+# Relations whose hot-path access must go through an index after the lookup-column migration
+CHECKED_TABLES = {"mock_cases", "main_cases", "docket_cases", "cluster_cases", "case_opinions",
+                  "reference_cases_mv", "case_documents"}
+
+EXISTING_CASES_QUERY = """
+    SELECT patent_number, case_name, filing_date, id, analysis_in_progress
+    FROM mock_cases
+    ORDER BY filing_date DESC
+"""
+
+def _plan_nodes(plan: Dict) -> List[Dict]:
+    """Flatten an EXPLAIN (FORMAT JSON) plan tree"""
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+def _explain(cursor, sql: str, params=None) -> Dict:
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+def _explain_prepared(cursor, name: str, params: Tuple) -> Dict:
+    """EXPLAIN a repository statement exactly as it is prepared in production"""
+    types, statement = STATEMENTS[name]
+    cursor.execute(f"PREPARE explain_{name} ({types}) AS {statement}")
+    try:
+        return _explain(cursor, f"EXECUTE explain_{name} ({', '.join(['%s'] * len(params))})", params)
+    finally:
+        cursor.execute(f"DEALLOCATE explain_{name}")
+
+def check_queries(db, allow_seqscan: bool = False) -> List[Dict]:
+    """Plan every hot query and report how each checked table is scanned.
+    By default sequential scans are disabled so the check asks whether an index can serve
+    the query at all, independent of how small the local tables are."""
+    from mock_trial_analysis import (LATEST_DOCUMENT_QUERY, REFERENCE_CASES_QUERY, REFERENCE_DOCKET_FILTER,
+                                     REFERENCE_DOCKET_NUMBERS)
+    cursor = db.cursor()
+    if not allow_seqscan:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+
+    sample_key = ("0000000", "2024-01-01", "Sample v. Sample")
+    plans = [
+        ("case_by_key", _explain_prepared(cursor, "case_by_key", sample_key)),
+        ("case_by_id", _explain_prepared(cursor, "case_by_id", (0,))),
+        ("mark_case_in_progress", _explain_prepared(cursor, "mark_case_in_progress", sample_key)),
+        ("existing_cases", _explain(cursor, EXISTING_CASES_QUERY)),
+        ("reference_cases", _explain(
+            cursor,
+            REFERENCE_CASES_QUERY.format(docket_filter=REFERENCE_DOCKET_FILTER),
+            (REFERENCE_DOCKET_NUMBERS,)
+        )),
+        ("latest_document", _explain(cursor, LATEST_DOCUMENT_QUERY, (0,)))
+    ]
+    cursor.close()
+    db.rollback()
+
+    report = []
+    for name, plan in plans:
+        scans = [(node.get("Relation Name"), node["Node Type"], node.get("Index Name"))
+                 for node in _plan_nodes(plan) if node.get("Relation Name") in CHECKED_TABLES]
+        report.append({
+            "query": name,
+            "scans": scans,
+            "ok": all(node_type != "Seq Scan" for _, node_type, _ in scans)
+        })
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query still sequentially scans a JSONB table")
+    parser.add_argument("--allow-seqscan", action="store_true",
+                        help="plan with sequential scans enabled to see what the planner picks on current data")
+    args = parser.parse_args()
+
+    from mock_trial_analysis import DB_CONFIG
+    from db_pool import get_pool
+    with get_pool(DB_CONFIG).connection() as db:
+        report = check_queries(db, allow_seqscan=args.allow_seqscan)
+
+    for entry in report:
+        print(f"{'OK  ' if entry['ok'] else 'FAIL'} {entry['query']}")
+        for relation, node_type, index_name in entry["scans"]:
+            print(f"     {relation}: {node_type}{f' using {index_name}' if index_name else ''}")
+    return 0 if all(entry["ok"] for entry in report) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+    LOCK_SH, LOCK_EX, LOCK_NB = fcntl.LOCK_SH, fcntl.LOCK_EX, fcntl.LOCK_NB
+except ImportError:
+    # No advisory locks (Windows): run one writing process per index. Files another process has
+    # memory-mapped cannot be deleted there, which keeps their base in place
+    fcntl = None
+    LOCK_SH = LOCK_EX = LOCK_NB = 0
+
+# On-disk indexes write each build to a gen-<n> directory; CURRENT names the live one and is
+# replaced in one rename, so a reader sees either the old generation or the new one
+CURRENT_FILE = 'CURRENT'
+GENERATION_PREFIX = 'gen-'
+# Held exclusively to change an index (append to its log, switch CURRENT), by writers in any process
+WRITER_LOCK_FILE = 'writer.lock'
+# Held shared by everything that has a generation loaded or is building it; a generation is
+# removed only once its replacement is published and this can be taken exclusively
+READERS_LOCK_FILE = 'readers.lock'
+
+def fsync_write(path: str, text: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+def flock(f, operation: int) -> bool:
+    """Advisory lock on an open file; False when a non-blocking request finds it held"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), operation)
+        return True
+    except BlockingIOError:
+        return False
+
+@contextmanager
+def writer_lock(index_dir: str):
+    """Serialize changes to the index in index_dir across every process using it"""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, WRITER_LOCK_FILE), 'a') as f:
+        flock(f, LOCK_EX)
+        yield
+
+def current_generation(index_dir: str) -> Optional[str]:
+    """Directory of the live generation, or None before the first build"""
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, 'r', encoding='utf-8') as f:
+        return os.path.join(index_dir, f.read().strip())
+
+def new_generation(index_dir: str) -> Tuple[str, object]:
+    """Create the next unpublished generation directory. Returns it and its readers lock, held shared
+    so cleanup leaves the build alone; close the lock once the generation is published or abandoned."""
+    os.makedirs(index_dir, exist_ok=True)
+    # Numbered past every existing directory, including any left by an interrupted build
+    while True:
+        numbers = [int(name[len(GENERATION_PREFIX):]) for name in os.listdir(index_dir)
+                   if name.startswith(GENERATION_PREFIX) and name[len(GENERATION_PREFIX):].isdigit()]
+        generation = os.path.join(index_dir, f"{GENERATION_PREFIX}{max(numbers, default=0) + 1:06d}")
+        try:
+            os.makedirs(generation)
+            break
+        except FileExistsError:
+            continue
+    readers = open(os.path.join(generation, READERS_LOCK_FILE), 'w')
+    flock(readers, LOCK_SH)
+    return generation, readers
+
+def open_generation(generation: str):
+    """Take a shared readers lock on a generation; FileNotFoundError if it has been removed"""
+    readers = open(os.path.join(generation, READERS_LOCK_FILE), 'r')
+    flock(readers, LOCK_SH)
+    return readers
+
+def publish_generation(index_dir: str, generation: str):
+    """Point CURRENT at generation in one rename; call with the writer lock held"""
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    fsync_write(pointer + '.tmp', os.path.basename(generation))
+    os.replace(pointer + '.tmp', pointer)
+
+def remove_unused_generations(index_dir: str):
+    """Delete generations that are neither live nor still loaded or being built by anyone"""
+    current = current_generation(index_dir)
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if not name.startswith(GENERATION_PREFIX) or path == current:
+            continue
+        try:
+            readers = open(os.path.join(path, READERS_LOCK_FILE), 'r')
+        except FileNotFoundError:
+            # Just created by a build that has not taken its lock yet
+            continue
+        with readers:
+            if flock(readers, LOCK_EX | LOCK_NB):
+                shutil.rmtree(path, ignore_errors=True)
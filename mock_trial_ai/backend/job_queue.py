@@ -0,0 +1,208 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import json
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# Failed attempts are retried after JOB_RETRY_DELAY_SECONDS * attempts
+JOB_RETRY_DELAY_SECONDS = int(os.getenv('JOB_RETRY_DELAY_SECONDS', 30))
+
+JOB_COLUMNS = """id, case_id, patent_number, filing_date, case_name, force_regenerate, status,
+                 attempts, max_attempts, partial_analysis, result, error, created_at, started_at, finished_at"""
+ACTIVE_STATUSES = ('queued', 'running')
+
+def _row_to_job(cursor, row) -> Optional[Dict]:
+    if not row:
+        return None
+    return {column.name: value for column, value in zip(cursor.description, row)}
+
+class AnalysisJobQueue:
+    """Postgres-backed analysis queue. Workers claim jobs with FOR UPDATE SKIP LOCKED and hold
+    a lease they must renew; a job whose lease runs out is picked up again by another worker."""
+    def __init__(self, pool, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.pool = pool
+        self.lease_seconds = lease_seconds
+
+    @contextmanager
+    def _use_connection(self, db=None):
+        if db is not None:
+            yield db
+        else:
+            with self.pool.connection() as pooled:
+                yield pooled
+
+    def submit(self, case_id: int, patent_number: str, filing_date: str, case_name: str,
+               force_regenerate: bool = False, db=None) -> int:
+        """Queue an analysis and return its job id; a case with an active job returns that job"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            row = None
+            # The conflicting job can finish between the two statements; each try sees a fresh snapshot
+            while row is None:
+                cursor.execute("""
+                    INSERT INTO analysis_jobs (case_id, patent_number, filing_date, case_name, force_regenerate, max_attempts)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (case_id) WHERE status IN ('queued', 'running') DO NOTHING
+                    RETURNING id
+                """, (case_id, patent_number, filing_date, case_name, force_regenerate, JOB_MAX_ATTEMPTS))
+                row = cursor.fetchone()
+                if not row:
+                    cursor.execute("""
+                        SELECT id FROM analysis_jobs
+                        WHERE case_id = %s AND status IN %s
+                    """, (case_id, ACTIVE_STATUSES))
+                    row = cursor.fetchone()
+            db.commit()
+            cursor.close()
+            return row[0]
+
+    def claim(self, worker_id: str, db=None) -> Optional[Dict]:
+        """Lease the next runnable job: queued and due, or running with an expired lease"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            self._fail_exhausted(cursor)
+            cursor.execute(f"""
+                UPDATE analysis_jobs
+                SET status = 'running',
+                    attempts = attempts + 1,
+                    lease_owner = %s,
+                    lease_expires_at = NOW() + make_interval(secs => %s),
+                    started_at = NOW(),
+                    updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM analysis_jobs
+                    WHERE (status = 'queued' AND run_after <= NOW())
+                       OR (status = 'running' AND lease_expires_at < NOW() AND attempts < max_attempts)
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING {JOB_COLUMNS}
+            """, (worker_id, self.lease_seconds))
+            job = _row_to_job(cursor, cursor.fetchone())
+            db.commit()
+            cursor.close()
+            return job
+
+    def _fail_exhausted(self, cursor):
+        """Fail jobs whose worker died on their final attempt, and release their cases"""
+        cursor.execute("""
+            WITH exhausted AS (
+                UPDATE analysis_jobs
+                SET status = 'failed', error = COALESCE(error, 'Lease expired on final attempt'),
+                    lease_owner = NULL, finished_at = NOW(), updated_at = NOW()
+                WHERE id IN (
+                    SELECT id FROM analysis_jobs
+                    WHERE status = 'running' AND lease_expires_at < NOW() AND attempts >= max_attempts
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING case_id
+            )
+            UPDATE mock_cases SET analysis_in_progress = 0
+            WHERE id IN (SELECT case_id FROM exhausted)
+        """)
+
+    def heartbeat(self, job_id: int, worker_id: str, partial_analysis: Optional[str] = None, db=None) -> bool:
+        """Extend the lease (and publish partial output); False means another worker owns the job now"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                UPDATE analysis_jobs
+                SET lease_expires_at = NOW() + make_interval(secs => %s),
+                    partial_analysis = COALESCE(%s, partial_analysis),
+                    updated_at = NOW()
+                WHERE id = %s AND lease_owner = %s AND status = 'running'
+            """, (self.lease_seconds, partial_analysis, job_id, worker_id))
+            owned = cursor.rowcount == 1
+            db.commit()
+            cursor.close()
+            return owned
+
+    def publish(self, job_id: int, worker_id: str, partial_analysis: str, db=None) -> bool:
+        """Publish partial output without touching the lease; False means another worker owns the job now"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                UPDATE analysis_jobs
+                SET partial_analysis = %s, updated_at = NOW()
+                WHERE id = %s AND lease_owner = %s AND status = 'running'
+            """, (partial_analysis, job_id, worker_id))
+            owned = cursor.rowcount == 1
+            db.commit()
+            cursor.close()
+            return owned
+
+    def complete(self, job_id: int, worker_id: str, result: Dict, db=None) -> bool:
+        """Store the result and release the case; False means the lease was lost and nothing was stored"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                WITH done AS (
+                    UPDATE analysis_jobs
+                    SET status = 'succeeded', result = %s, partial_analysis = NULL, error = NULL,
+                        lease_owner = NULL, lease_expires_at = NULL, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = %s AND lease_owner = %s AND status = 'running'
+                    RETURNING case_id
+                ), released AS (
+                    UPDATE mock_cases SET analysis_in_progress = 0
+                    WHERE id IN (SELECT case_id FROM done)
+                )
+                SELECT EXISTS (SELECT 1 FROM done)
+            """, (json.dumps(result, default=str), job_id, worker_id))
+            stored = cursor.fetchone()[0]
+            db.commit()
+            cursor.close()
+            return stored
+
+    def fail(self, job_id: int, worker_id: str, error: str, db=None):
+        """Requeue with backoff while attempts remain, otherwise fail the job and release the case"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                WITH failed AS (
+                    UPDATE analysis_jobs
+                    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                        run_after = NOW() + make_interval(secs => %s * attempts),
+                        error = %s, partial_analysis = NULL,
+                        lease_owner = NULL, lease_expires_at = NULL,
+                        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE NOW() END,
+                        updated_at = NOW()
+                    WHERE id = %s AND lease_owner = %s AND status = 'running'
+                    RETURNING case_id, status
+                )
+                UPDATE mock_cases SET analysis_in_progress = 0
+                WHERE id IN (SELECT case_id FROM failed WHERE status = 'failed')
+            """, (JOB_RETRY_DELAY_SECONDS, error[:2000], job_id, worker_id))
+            db.commit()
+            cursor.close()
+
+    def get(self, job_id: int, db=None) -> Optional[Dict]:
+        """Current state of a job, including partial output while it runs"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM analysis_jobs WHERE id = %s", (job_id,))
+            job = _row_to_job(cursor, cursor.fetchone())
+            db.commit()
+            cursor.close()
+            return job
+
+    def stats(self, db=None) -> Dict:
+        """Job counts by status"""
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status")
+            counts = dict(cursor.fetchall())
+            db.commit()
+            cursor.close()
+            return counts
@@ -9,22 +9,29 @@ This file is part of Mock Trial AI, dual-licensed under:
 See LICENSE and COMMERCIAL_LICENSE for details.
 """
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-import anthropic
-import psycopg2
 import json
 import re
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import Dict, List
+from typing import Callable, Dict, Iterator, List, Optional
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from db_pool import get_pool
+from case_repository import CaseRepository
+from job_queue import AnalysisJobQueue
+from document_sections import expert_findings, extract_sections
+from embedding_cache import get_embedding_cache
+from embedding_backends import estimate_embedding_tokens, get_embedding_backend
+from analysis_cache import analysis_cache
+from clients import get_claude_client
+from rate_limiter import get_limiter
+from chat_context import ChatContext
 
 # Add this at the top after imports --------------ADDED 1/17/24
 current_dir = os.path.dirname(os.path.abspath(__file__))
 config_path = os.path.join(current_dir, 'config.env')
 
-load_dotenv('config.env')
+# config.env (API keys) is read by clients.py when the first API client is built
 
 DB_CONFIG = {
     "dbname": "mock_trial_db",
@@ -34,209 +41,306 @@ DB_CONFIG = {
     "port": "5432"
 }
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
 
-client = OpenAI(api_key=OPENAI_API_KEY)  
-claude = anthropic.Client(api_key=CLAUDE_API_KEY)
+# Precedent dockets compared against every mock case
+REFERENCE_DOCKET_NUMBERS = [
+    '05 C 5620',
+    '2009-1344',
+    'Civil 02CV2060-B(CAB), 03CV0699-B (CAB) and 03CV1108-B (CAB)'
+]
+
+# Slim reference-case projection, precomputed by the reference_cases_mv materialized view;
+# {docket_filter} narrows it to specific dockets
+REFERENCE_CASES_QUERY = """
+    SELECT case_name, case_name_full, docket_number, court_name, filing_date, judge, content_hash
+    FROM reference_cases_mv
+    {docket_filter}
+"""
+REFERENCE_DOCKET_FILTER = "WHERE docket_number = ANY(%s::text[])"
+
+# Newest document of a case; its text is only fetched for documents stored before sections
+# were extracted at upload
+LATEST_DOCUMENT_QUERY = """
+    SELECT sections, CASE WHEN sections IS NULL THEN extracted_text END
+    FROM case_documents
+    WHERE case_id = %s
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+def estimate_request_tokens(request: Dict) -> int:
+    """Tokens a Claude request may use, charged to the rate limiter before the call"""
+    prompt = (request.get("system") or "") + "".join(message["content"] for message in request["messages"])
+    return estimate_embedding_tokens(prompt) + request.get("max_tokens", 0)
 
 class MockTrialAnalyzer:
     def __init__(self):
-        self.db = psycopg2.connect(**DB_CONFIG)
-        self.claude = anthropic.Client(api_key=CLAUDE_API_KEY) # ADDED ON 1/17/24
+        # Connections come from a pool shared by every analyzer in the process
+        self.pool = get_pool(DB_CONFIG)
+        self.embedding_cache = get_embedding_cache()
+        # OpenAI or local LegalBERT, per EMBEDDING_BACKEND
+        self.embedding_backend = get_embedding_backend()
+        self.last_stage_timings = {}
+
+    @property
+    def claude(self):
+        """Shared Anthropic client, created on first use"""
+        return get_claude_client() # ADDED ON 1/17/24
 
     # NEWLY ADDED ON 012325 TO GET LATEST DOC
-    def get_latest_document(self, case_id: int) -> str:
-        """Optional method to get latest document"""
+    def get_latest_document(self, case_id: int, db=None) -> str:
+        """Expert findings from the case's newest document, split into sections at upload"""
         try:
-            cursor = self.db.cursor()
-            cursor.execute("""
-                WITH doc AS (
-                    SELECT extracted_text
-                    FROM case_documents 
-                    WHERE case_id = %s 
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                )
-                SELECT 
-                    SUBSTRING(extracted_text FROM 'Prepared By:.*?Date:.*?\n') ||
-                    SUBSTRING(extracted_text FROM '4\. Source Code Analysis[\s\S]*?(?=5\.)') ||
-                    SUBSTRING(extracted_text FROM '5\. Financial Impact Assessment[\s\S]*?(?=6\.)') ||
-                    SUBSTRING(extracted_text FROM '6\. Expert Conclusions[\s\S]*?(?=7\.)')
-                FROM doc
-            """, (case_id,))
-            result = cursor.fetchone()
-            return result[0] if result else ""
+            with self._use_connection(db) as db:
+                cursor = db.cursor()
+                cursor.execute(LATEST_DOCUMENT_QUERY, (case_id,))
+                result = cursor.fetchone()
+                cursor.close()
+            if not result:
+                return ""
+            sections, extracted_text = result
+            if sections is None:
+                sections = extract_sections(extracted_text)
+            return expert_findings(sections)
         except Exception as e:
             print(f"Error getting document: {e}")
             return ""
         
-    def _get_case_details(self, patent_number: str, filing_date: str, case_name: str) -> Dict:
+    def case_repository(self) -> CaseRepository:
+        """Per-request case lookups backed by the shared pool"""
+        return CaseRepository(self.pool)
+
+    def job_queue(self) -> AnalysisJobQueue:
+        """Background analysis jobs, run by analysis_worker.py"""
+        return AnalysisJobQueue(self.pool)
+
+    def _get_case_details(self, patent_number: str, filing_date: str, case_name: str, db=None,
+                          cases: Optional[CaseRepository] = None) -> Dict:
         """Retrieve case details from database"""
-        cursor = self.db.cursor()
-        cursor.execute("""
-            SELECT data FROM mock_cases 
-            WHERE data->'details'->>'patent_number' = %s 
-            AND data->'details'->>'filing_date' = %s 
-            AND data->>'case_name' = %s
-            AND analysis_in_progress = 1
-        """, (patent_number, filing_date, case_name))
-        result = cursor.fetchone()
-        cursor.close()
-        if not result:
-            raise ValueError(f"No case found for Patent: {patent_number}, Case: {case_name}")
-        return result[0]
+        return self._get_active_case(patent_number, filing_date, case_name, db, cases)["data"]
     
-    def _get_case_id(self, patent_number: str, filing_date: str, case_name: str) -> int:
+    def _get_case_id(self, patent_number: str, filing_date: str, case_name: str, db=None,
+                     cases: Optional[CaseRepository] = None) -> int:
         """Get case ID for Current Case (ex TechInnovate)"""
-        cursor = self.db.cursor()
-        cursor.execute("""            
-            SELECT id FROM mock_cases 
-            WHERE data->'details'->>'patent_number' = %s 
-            AND data->'details'->>'filing_date' = %s 
-            AND data->>'case_name' = %s 
-            AND analysis_in_progress = 1
-        """, (patent_number, filing_date, case_name)) 
-        result = cursor.fetchone()
-        cursor.close()
-        if not result:
-            raise ValueError("Case ID not found")
-        return result[0]
-
-    def _get_reference_cases(self) -> List[Dict]:
-        """Retrieve related patent cases"""
-        cursor = self.db.cursor()
-        cursor.execute("""
-            SELECT     
-            mc.data ->> 'caseName' AS case_name,
-            mc.data ->> 'caseNameFull' AS case_name_full,
-            mc.data ->> 'docketNumber' AS docket_number,
-            mc.data ->> 'court' AS court_name,
-            mc.data ->> 'suitNature' AS nature_suit,
-            mc.data ->> 'dateFiled' AS filing_date,
-            mc.data ->> 'judge' AS judge,
-            mc.data ->> 'status' AS case_status,
-            mc.data ->> 'procedural_history' AS procedural_history,
-            mc.data ->> 'attorney' AS attorney,
-            mc.data -> 'citation' AS citation,  -- JSON array of citations
-            mc.data -> 'opinions' AS opinions,  -- JSON array of opinions
-            mc.data ->> 'posture' AS posture,
-    
-            -- Docket Cases (dc) Table
-            dc.data ->> 'case_name' AS docket_case_name,
-            dc.data ->> 'court' AS docket_court,
-            dc.data ->> 'docket_number' AS docket_case_number,
-    
-            -- Case Opinions (co) Table - Replacing docket_entries with detailed opinion data
-            COALESCE(cc.data ->> 'summary', co.snippet) AS case_summary,  
-            co.citation_ids AS opinion_citations,
-            co.type AS opinion_type,
-            co.author_id AS opinion_author_id,
-            co.per_curiam AS opinion_per_curiam,
-    
-            -- Cluster Cases (cc) Table
-            cc.data -> 'citations' AS citations,  -- JSON array of citation details
-            cc.data ->> 'case_name_full' AS cluster_case_name_full,
-            cc.data ->> 'judges' AS judges,
-            cc.data ->> 'syllabus' AS syllabus,
-            COALESCE(cc.data ->> 'disposition', co.type) AS case_disposition,  
-            cc.data ->> 'precedential_status' AS precedential_status,
-            cc.data -> 'sub_opinions' AS sub_opinions,  -- JSON array of sub-opinions
-            cc.data ->> 'arguments' AS arguments
-            FROM main_cases mc
-            JOIN docket_cases dc ON mc.data ->> 'docket_id' = dc.data ->> 'id'
-            JOIN cluster_cases cc ON cc.data ->> 'docket_id' = dc.data ->> 'id'
-            LEFT JOIN case_opinions co ON (mc.data ->> 'caseName' = co.case_name AND   co.type = 'combined-opinion')  -- Join only combined-opinions
-            WHERE mc.data ->> 'caseName' IS NOT NULL AND mc.data ->> 'status' IS NOT NULL  -- Only include cases with valid status            
-            AND mc.data ->> 'docketNumber' IN ('05 C 5620', '2009-1344', 'Civil 02CV2060-B(CAB), 03CV0699-B (CAB) and 03CV1108-B (CAB)')            
-        """)
-        results = cursor.fetchall()
-        cursor.close()        
-        return [{"case_text": row[0], 
-         "source": row[1], 
-         "court": row[2],
-         "court_name": row[3],
-         "filing_date": row[5],
-         "judge": row[6]
-        } for row in results]
+        return self._get_active_case(patent_number, filing_date, case_name, db, cases)["id"]
+
+    def _get_active_case(self, patent_number: str, filing_date: str, case_name: str, db=None,
+                         cases: Optional[CaseRepository] = None) -> Dict:
+        """Case id and data in one lookup; the case must be flagged for analysis"""
+        cases = cases or self.case_repository()
+        case = cases.find_by_key(patent_number, filing_date, case_name, db=db)
+        if not case or not case["analysis_in_progress"]:
+            raise ValueError(f"No case found for Patent: {patent_number}, Case: {case_name}")
+        return case
+
+    def _get_reference_cases(self, docket_numbers: Optional[List[str]] = REFERENCE_DOCKET_NUMBERS, db=None) -> List[Dict]:
+        """Retrieve related patent cases (pass docket_numbers=None for the whole corpus)"""
+        docket_filter = ""
+        params = None
+        if docket_numbers is not None:
+            docket_filter = REFERENCE_DOCKET_FILTER
+            params = (list(docket_numbers),)
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute(REFERENCE_CASES_QUERY.format(docket_filter=docket_filter), params)
+            results = cursor.fetchall()
+            cursor.close()        
+            return [{"case_text": row[0], 
+             "source": row[1], 
+             "court": row[2],
+             "court_name": row[3],
+             "filing_date": row[4],
+             "judge": row[5],
+             "content_hash": row[6]
+            } for row in results]
     
-    def _get_initial_question(self, case_name: str) -> str:
+    def _get_initial_question(self, case_name: str, db=None) -> str:
         """Get initial analysis question"""
-        cursor = self.db.cursor()
-        cursor.execute("""
-            SELECT question_text 
-            FROM analysis_questions 
-            WHERE question_type = 'initial'
-            ORDER BY created_at DESC
-            LIMIT 1
-        """)
-        result = cursor.fetchone()
-        cursor.close()
-        if not result:
-            raise ValueError("Initial question not found")
-        return result[0].format(case_name=case_name)
+        with self._use_connection(db) as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT question_text 
+                FROM analysis_questions 
+                WHERE question_type = 'initial'
+                ORDER BY created_at DESC
+                LIMIT 1
+            """)
+            result = cursor.fetchone()
+            cursor.close()
+            if not result:
+                raise ValueError("Initial question not found")
+            return result[0].format(case_name=case_name)
 
     def _get_embedding(self, text: str) -> List[float]:
-        """Get embeddings using OpenAI with retry logic"""
-        for attempt in range(3):
-            try:
-                response = client.embeddings.create(
-                    input=[text], 
-                    model="text-embedding-ada-002"
-                )
-                return response.data[0].embedding
-            except Exception as e:
-                print(f"Error during embedding request (attempt {attempt + 1}): {e}")
-                if attempt < 2:
-                    time.sleep(2 ** attempt)
-                    continue
-                raise
+        """Embed one text with the configured backend, served from the shared cache when possible"""
+        model = self.embedding_backend.model
+        cached = self.embedding_cache.get(model, text)
+        if cached is not None:
+            return cached
+        embedding = self._embed_batch([text])[0]
+        self.embedding_cache.put(model, text, embedding)
+        return embedding
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts with the configured backend"""
+        try:
+            return self.embedding_backend.embed_batch(texts)
+        except Exception as e:
+            print(f"Error during embedding request of {len(texts)} texts: {e}")
+            raise
+
+    def _get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed many texts at once: cached texts are reused, the rest are sent in concurrent batches.
+        Texts whose batch still fails after retries come back as None."""
+        model = self.embedding_backend.model
+        embeddings = self.embedding_cache.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in embeddings))
+        batches = self.embedding_backend.pack_batches(missing)
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.embedding_backend.max_workers, len(batches))) as pool:
+                futures = {pool.submit(self._embed_batch, batch): batch for batch in batches}
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    try:
+                        fresh = dict(zip(batch, future.result()))
+                    except Exception as e:
+                        print(f"Skipping {len(batch)} texts due to embedding error: {e}")
+                        continue
+                    self.embedding_cache.put_many(model, fresh)
+                    embeddings.update(fresh)
+
+        return [embeddings.get(text) for text in texts]
 
     def _rank_cases(self, dummy_case: str, reference_cases: List[Dict], top_k: int = 5) -> List[Dict]:
-        """Rank cases by similarity using OpenAI embeddings"""
+        """Rank cases by similarity using the configured embedding backend"""
+        return self._rank_cases_batch([dummy_case], reference_cases, top_k)[0]
+
+    def _rank_cases_batch(self, dummy_cases: List[str], reference_cases: List[Dict], top_k: int = 5) -> List[List[Dict]]:
+        """Rank several query cases against the same references with one matrix product"""
+        # numpy and the index are only needed once ranking starts, not at import time
+        import numpy as np
+        from reference_index import get_reference_index
+        from similarity import normalize_rows, top_k_similar_batch
         try:
-            dummy_embedding = self._get_embedding(dummy_case)
-            reference_embeddings = []
-            
-            for case in reference_cases:
-                try:
-                    embedding = self._get_embedding(case["case_text"])
-                    reference_embeddings.append({
-                        "case": case,
-                        "embedding": embedding
-                    })
-                except Exception as e:
-                    print(f"Skipping case due to embedding error: {e}")
-                    continue
-
-            similarities = [
-                {
-                    "case": case["case"],
-                    "similarity_score": cosine_similarity([dummy_embedding], [case["embedding"]])[0][0]
-                }
-                for case in reference_embeddings
+            # Reference cases already in the offline index are read from its memory-mapped
+            # matrix; only the query cases and any new references need embedding requests
+            index = get_reference_index()
+            if index is not None and index.model == self.embedding_backend.model:
+                rows, missing = index.lookup(reference_cases)
+            else:
+                rows, missing = [None] * len(reference_cases), list(range(len(reference_cases)))
+
+            # The query cases ride along in the same batched request as the references
+            embeddings = self._get_embeddings(list(dummy_cases) + [reference_cases[i]["case_text"] for i in missing])
+            query_embeddings = embeddings[:len(dummy_cases)]
+            if any(embedding is None for embedding in query_embeddings):
+                raise ValueError("Could not embed the mock case")
+            fresh = dict(zip(missing, embeddings[len(dummy_cases):]))
+
+            indexed = [position for position, row in enumerate(rows) if row is not None]
+            embedded = [position for position in missing if fresh.get(position) is not None]
+            candidates = indexed + embedded
+            if not candidates:
+                return [[] for _ in dummy_cases]
+
+            blocks = []
+            if indexed:
+                blocks.append(np.asarray(index.matrix[[rows[position] for position in indexed]], dtype=np.float32))
+            if embedded:
+                blocks.append(normalize_rows([fresh[position] for position in embedded]))
+            matrix = np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+
+            top_indices, top_scores = top_k_similar_batch(query_embeddings, matrix, top_k)
+            return [
+                [
+                    {
+                        "case": reference_cases[candidates[i]],
+                        "similarity_score": float(score)
+                    }
+                    for i, score in zip(indices, scores)
+                ]
+                for indices, scores in zip(top_indices, top_scores)
             ]
-
-            return sorted(similarities, key=lambda x: x["similarity_score"], reverse=True)[:top_k]
         except Exception as e:
             print(f"Error in ranking cases: {e}")
-            return []
+            return [[] for _ in dummy_cases]
         
-    def generate_trial_scenario(self, patent_number: str, filing_date: str, case_name: str) -> Dict:
-        """Generate complete mock trial analysis"""
+    def connection(self):
+        """Borrow a connection from the shared pool: `with analyzer.connection() as db:`"""
+        return self.pool.connection()
+
+    @contextmanager
+    def _use_connection(self, db=None):
+        """Use the caller's connection if one was passed, otherwise borrow one from the pool"""
+        if db is not None:
+            yield db
+        else:
+            with self.connection() as pooled:
+                yield pooled
+
+    def _run_stage(self, timings: Dict, name: str, func, *args, needs_db: bool = True, **kwargs):
+        """Run one pipeline stage and record its wall time in timings[name]"""
+        start = time.perf_counter()
+        try:
+            if needs_db:
+                with self.connection() as db:
+                    return func(*args, db=db, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    def generate_trial_scenario(self, patent_number: str, filing_date: str, case_name: str,
+                                stream: bool = False, force_regenerate: bool = False,
+                                cases: Optional[CaseRepository] = None, save: bool = True) -> Dict:
+        """Generate complete mock trial analysis.
+        With stream=True the Claude response is returned as a text iterator under
+        'mock_trial_analysis_stream' and is saved once it has been fully consumed.
+        A previous analysis of the identical prompt is reused unless force_regenerate is set.
+        Pass the request's CaseRepository to reuse a case row the caller already fetched.
+        With save=False the trial_analysis row is not written; result['save']() writes it once the
+        caller knows the result is kept (the job worker calls it after completing the job)."""
         try:            
-            mock_case = self._get_case_details(patent_number, filing_date, case_name)            
-            case_id = self._get_case_id(patent_number, filing_date, case_name)
-            question = self._get_initial_question(mock_case['case_name'])
-            reference_cases = self._get_reference_cases()
+            stage_timings = {}
+            cases = cases or self.case_repository()
+            pipeline_start = time.perf_counter()
+
+            # Independent lookups run in parallel, each on its own connection; ranking waits
+            # for the case and reference rows, the document waits only for the case row
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                case_future = pool.submit(self._run_stage, stage_timings, "case_lookup",
+                                          self._get_active_case, patent_number, filing_date, case_name,
+                                          needs_db=False, cases=cases)
+                # case_name is one of the lookup keys, so it equals mock_case['case_name']
+                question_future = pool.submit(self._run_stage, stage_timings, "initial_question",
+                                              self._get_initial_question, case_name)
+                reference_future = pool.submit(self._run_stage, stage_timings, "reference_cases",
+                                               self._get_reference_cases)
+                rank_future = pool.submit(
+                    lambda: self._run_stage(stage_timings, "rank_cases", self._rank_cases,
+                                            json.dumps(case_future.result()["data"], indent=2),
+                                            reference_future.result(), top_k=5, needs_db=False)
+                )
+                # ADDED ON 1/24/24 TO PULL DOC_SECTION FROM LATEST DOCUMENT
+                document_future = pool.submit(
+                    lambda: self._run_stage(stage_timings, "latest_document",
+                                            self.get_latest_document, case_future.result()["id"])
+                )
+
+                mock_case = case_future.result()["data"]
+                case_id = case_future.result()["id"]
+                question = question_future.result()
+                top_cases = rank_future.result()
+                doc_content = document_future.result()
+
+            stage_timings["pre_llm_total"] = time.perf_counter() - pipeline_start
             
             dummy_case_text = json.dumps(mock_case, indent=2)
-            top_cases = self._rank_cases(dummy_case_text, reference_cases, top_k=5)
-            
-            similar_cases_context = json.dumps([case['case'] for case in top_cases], indent=2)
+            similar_cases_context = json.dumps([
+                {field: value for field, value in case['case'].items() if field != 'content_hash'}
+                for case in top_cases
+            ], indent=2)
 
-            # ADDED ON 1/24/24 TO PULL DOC_SECTION FROM LATEST DOCUMENT
-            doc_content = self.get_latest_document(case_id)
             print("DEBUG - doc_content:", doc_content)
             # ADDED ON 1/24/24
             doc_section = ""                
@@ -300,29 +404,105 @@ class MockTrialAnalyzer:
 
             # ADDED TO TEST CLAUDE INSTEAD OF OPENAI TO SAVE COST            
             # system="You are an expert patent attorney. Your primary task is to directly reference and incorporate the expert's technical findings in your analysis. Each section of your analysis must explicitly cite specific details from the expert document.",
-            response = claude.messages.create(
+            request = dict(
                 model="claude-3-opus-20240229",
                 max_tokens=4000,
                 temperature=0.5,               
                 system="You are an expert patent attorney. Your primary task is to directly reference and incorporate the expert's technical findings in your analysis. Each section of your analysis must explicitly cite specific details from the expert document." if doc_content else "You are an expert patent attorney providing preliminary analysis without expert evidence.",
                 messages=[{"role": "user", "content": prompt}]
             )
-
-            analysis = response.content[0].text         
-                        
-            print("DEBUG - Before save_analysis:")
-            print(f"case_id: {case_id}")
-            print(f"entry_type: analysis")
-            analysis_id = self._save_analysis(case_id, question, analysis, 'analysis')
-            return {
+            result = {
+                "case_id": case_id,
                 "top_similar_cases": top_cases,
-                "mock_trial_analysis": analysis,
-                "expert_document": doc_section #added specific to documents in case **************************
+                "mock_trial_analysis": None,
+                "expert_document": doc_section, #added specific to documents in case **************************
+                "stage_timings": stage_timings
             }
+
+            # Identical prompts (same case, document and similar cases) reuse the stored analysis
+            cache_key = analysis_cache.make_key(request)
+            cached = None
+            if not force_regenerate:
+                with self.connection() as db:
+                    cached = analysis_cache.get(db, cache_key)
+            result["cache_hit"] = cached is not None
+            if cached is not None:
+                stage_timings["llm"] = 0.0
+                result["stream_metrics"] = {}
+                self._finish_trial_scenario(result, question, cached, save)
+                if stream:
+                    result["mock_trial_analysis_stream"] = iter([cached])
+                return result
+
+            llm_start = time.perf_counter()
+
+            if stream:
+                # Text is yielded as it arrives; the analysis is saved once the stream completes
+                def finish(analysis: str, metrics: Dict):
+                    stage_timings["llm"] = time.perf_counter() - llm_start
+                    stage_timings["llm_first_token"] = metrics["time_to_first_token"]
+                    result["stream_metrics"] = metrics
+                    with self.connection() as db:
+                        analysis_cache.put(db, cache_key, request, analysis)
+                    self._finish_trial_scenario(result, question, analysis, save)
+
+                result["mock_trial_analysis_stream"] = self.stream_claude(on_complete=finish, **request)
+                return result
+
+            limiter = get_limiter('anthropic')
+            estimated_tokens = estimate_request_tokens(request)
+            response = limiter.call(self.claude.messages.create, tokens=estimated_tokens, **request)
+            limiter.adjust(response.usage.input_tokens + response.usage.output_tokens - estimated_tokens)
+            stage_timings["llm"] = time.perf_counter() - llm_start
+            result["stream_metrics"] = {"total": stage_timings["llm"], "input_tokens": response.usage.input_tokens,
+                                        "output_tokens": response.usage.output_tokens}
+            with self.connection() as db:
+                analysis_cache.put(db, cache_key, request, response.content[0].text)
+            self._finish_trial_scenario(result, question, response.content[0].text, save)
+            return result
         except Exception as e:
             print(f"Error generating trial scenario: {e}")
             raise
 
+    def _finish_trial_scenario(self, result: Dict, question: str, analysis: str, save: bool = True):
+        """Record the completed analysis on the result and persist it, or leave result['save'] to do so"""
+        result["mock_trial_analysis"] = analysis
+        self.last_stage_timings = result["stage_timings"]
+        if not save:
+            result["save"] = lambda: self._save_analysis(result["case_id"], question, analysis, 'analysis')
+            return
+
+        print("DEBUG - Before save_analysis:")
+        print(f"case_id: {result['case_id']}")
+        print(f"entry_type: analysis")
+        self._save_analysis(result["case_id"], question, analysis, 'analysis')
+
+    def stream_claude(self, on_complete: Optional[Callable[[str, Dict], None]] = None, **request) -> Iterator[str]:
+        """Yield Claude response text as it arrives. At the end on_complete receives the full text and
+        this call's metrics (time to first token, total time, input and output tokens)."""
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        limiter = get_limiter('anthropic')
+        estimated_tokens = estimate_request_tokens(request)
+        # Retries cover opening the stream; the limiter slot is held until it is fully read
+        with limiter.stream(lambda: self.claude.messages.stream(**request), tokens=estimated_tokens) as stream:
+            for text in stream.text_stream:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(text)
+                yield text
+            usage = stream.get_final_message().usage
+        limiter.adjust(usage.input_tokens + usage.output_tokens - estimated_tokens)
+        metrics = {
+            "time_to_first_token": first_token if first_token is not None else time.perf_counter() - start,
+            "total": time.perf_counter() - start,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens
+        }
+        if on_complete:
+            on_complete(''.join(parts), metrics)
+
     def _save_analysis(self, case_id: int, question: str, analysis: str, entry_type: str):
         """Save Q&A interaction to database and return the analysis id(primary key)"""
         try:
@@ -330,30 +510,33 @@ class MockTrialAnalyzer:
             print(f"case_id: {case_id}")
             print(f"question: {question[:100]}") 
             print(f"analysis type: {entry_type}")
-            cursor = self.db.cursor()
-            cursor.execute("""
-                INSERT INTO trial_analysis 
-                (case_id, analysis_type, question, analysis, created_at, entry_type) 
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id""",  # Added RETURNING id to get the new record's id
-                (case_id, 'followup', question, analysis, datetime.now(), entry_type)
-        )
-            analysis_id = cursor.fetchone()[0] 
-            self.db.commit()
-            cursor.close()
-            return analysis_id 
+            with self.connection() as db:
+                cursor = db.cursor()
+                cursor.execute("""
+                    INSERT INTO trial_analysis 
+                    (case_id, analysis_type, question, analysis, created_at, entry_type) 
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    RETURNING id""",  # Added RETURNING id to get the new record's id
+                    (case_id, 'followup', question, analysis, datetime.now(), entry_type)
+            )
+                analysis_id = cursor.fetchone()[0] 
+                db.commit()
+                cursor.close()
+                return analysis_id
         except Exception as e:
             print(f"Error saving analysis: {e}")
             raise
 
-def run_mock_trial_analysis(patent_number: str, filing_date: str, case_name: str):
+def run_mock_trial_analysis(patent_number: str, filing_date: str, case_name: str, force_regenerate: bool = False):
     try:
         analyzer = MockTrialAnalyzer()
         
         result = analyzer.generate_trial_scenario(
             patent_number=patent_number,
             filing_date=filing_date,
-            case_name=case_name
+            case_name=case_name,
+            stream=True,
+            force_regenerate=force_regenerate
         )         
         
         print("\nMost Similar Patent Cases:")
@@ -368,7 +551,9 @@ def run_mock_trial_analysis(patent_number: str, filing_date: str, case_name: str
             print(f"Similarity Score: {case['similarity_score']:.2f}")
             
         print("\nMock Trial Analysis:")
-        print(result["mock_trial_analysis"])        
+        for text in result["mock_trial_analysis_stream"]:
+            print(text, end="", flush=True)
+        print()
         print("\n=== Follow-up Questions ===")
         print("Available Perspectives (prefix your question with):")
         print("- JUDGE: For judicial perspective")
@@ -378,9 +563,12 @@ def run_mock_trial_analysis(patent_number: str, filing_date: str, case_name: str
         print("\nExample: 'JUDGE: What are your thoughts on the preliminary injunction?'")
         print("Enter your questions (type 'exit' to quit)")
 
+        # Follow-ups carry a running summary and the relevant sections, not the whole analysis
+        chat_context = ChatContext(result["mock_trial_analysis"], result["expert_document"])
         while True:
             question = input("\nQuestion: ")
             if question.lower() == 'exit':
+                print(f"Chat context token usage: {chat_context.stats()}")
                 break
             
             role = "ATTORNEY"  
@@ -402,23 +590,34 @@ def run_mock_trial_analysis(patent_number: str, filing_date: str, case_name: str
             - If EXPERT: Provide expert testimony on technical/damages aspects
             - If SUGGESTIONS: Identify unexplored legal areas or strategic opportunities
 
-            Previous Analysis: {result["mock_trial_analysis"]}
+            {chat_context.build(question)}
             """            
-            response = claude.messages.create(
+
+            def complete(answer: str, metrics: Dict):
+                analyzer._save_analysis(result['case_id'], question.strip(), answer, 'chat')
+                chat_context.record_turn(question, answer, role, follow_up_prompt, metrics["input_tokens"])
+
+            print(f"\n{role} Response:")
+            for text in analyzer.stream_claude(
+                on_complete=complete,
                 model="claude-3-opus-20240229",
                 max_tokens=4000,
                 temperature=0.5,
                 system=f"You are an expert {role.lower()} analyzing this mock trial case.",
                 messages=[{"role": "user", "content": follow_up_prompt}]
-            )
-            
-            print(f"\n{role} Response:")
-            print(response.content[0].text)            
-                       
-            analyzer._save_analysis(result['case_id'], question.strip(), response.content[0].text)
+            ):
+                print(text, end="", flush=True)
+            print()
 
     except Exception as e:
         print(f"Error running analysis: {str(e)}")
 
 if __name__ == "__main__":
-    run_mock_trial_analysis()
+    import argparse
+    parser = argparse.ArgumentParser(description="Analyze one case interactively (see batch_analysis.py for many)")
+    parser.add_argument("patent_number")
+    parser.add_argument("filing_date")
+    parser.add_argument("case_name")
+    parser.add_argument("--force-regenerate", action="store_true")
+    args = parser.parse_args()
+    run_mock_trial_analysis(args.patent_number, args.filing_date, args.case_name, args.force_regenerate)
@@ -8,21 +8,24 @@ This file is part of Mock Trial AI, dual-licensed under:
 
 See LICENSE and COMMERCIAL_LICENSE for details.
 """
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from transformers import AutoModel, AutoModelForMaskedLM, AutoTokenizer
-import torch
 import os
-import pinecone
-from pinecone import Pinecone
-import psycopg2
+import time
+from functools import cached_property
+from db_pool import get_pool
+from clients import get_mongo_client, get_pinecone_index, load_env
+from embedding_backends import get_embedding_backend, length_buckets, LEGALBERT_BATCH_SIZE, LEGALBERT_MAX_LENGTH
+from vector_writer import VectorWriteBuffer, call_index, content_hash, vector_ids
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Tuple
 
-load_dotenv(r'C:\[your_path_here]\mock_trial_app\config.env')
-
-CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
-PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
+# torch, transformers, pinecone and pymongo are imported on first use, so constructing
+# the analyzer (or importing this module) does not load models or open connections
+CONFIG_PATH = r'C:\[your_path_here]\mock_trial_app\config.env'
+# 'pinecone', or 'local' for the in-process index in vector_index.py (air-gapped deployments)
+VECTOR_STORE = os.getenv('VECTOR_STORE', 'pinecone')
+# Rows per server-side cursor fetch and per MongoDB bulk_write in sync_to_mongodb
+MONGO_SYNC_BATCH_SIZE = int(os.getenv('MONGO_SYNC_BATCH_SIZE', 1000))
+MONGO_SYNC_LAG_SECONDS = int(os.getenv('MONGO_SYNC_LAG_SECONDS', 30))
 
 DB_CONFIG = {
     "dbname": "mock_trial_db",
@@ -34,111 +37,173 @@ DB_CONFIG = {
 
 class MockTrialAnalyzer:
     def __init__(self):        
-        self.db = psycopg2.connect(**DB_CONFIG)    
-        
-        self.mongo_client = MongoClient('mongodb://localhost:27017/')
-        self.mongo_db = self.mongo_client['mock_trial_analytics']    
-        
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.pinecone_index = pc.Index("[your_index_name_here")    
-       
+        self.pool = get_pool(DB_CONFIG)
         self.model_path = r'C:\[your_path_here]\mock_trial_app\legalbertmt'
-        self.masked_model = AutoModelForMaskedLM.from_pretrained(self.model_path)
-        self.embedding_model = AutoModel.from_pretrained('nlpaueb/legal-bert-base-uncased')
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+
+    @cached_property
+    def mongo_client(self):
+        return get_mongo_client('mongodb://localhost:27017/')
+
+    @cached_property
+    def mongo_db(self):
+        return self.mongo_client['mock_trial_analytics']
+
+    @cached_property
+    def pinecone_index(self):
+        if VECTOR_STORE == 'local':
+            from vector_index import get_local_index
+            return get_local_index()
+        load_env(CONFIG_PATH)
+        return get_pinecone_index("[your_index_name_here")
+
+    @cached_property
+    def masked_model(self):
+        from transformers import AutoModelForMaskedLM
+        return AutoModelForMaskedLM.from_pretrained(self.model_path)
+
+    @cached_property
+    def tokenizer(self):
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(self.model_path)
     
     def test_model(self, text: str):
         """Test LegalBERT model with masked token prediction - make recursive agent - second file"""
-        inputs = self.tokenizer(text, return_tensors="pt")
-        token_ids = inputs["input_ids"][0]
-        rand_idx = torch.randint(1, len(token_ids)-1, (1,))
-        original_token = token_ids[rand_idx]
-        token_ids[rand_idx] = self.tokenizer.mask_token_id
-        attention_mask = torch.ones_like(token_ids)
-    
-        with torch.no_grad():
-            outputs = self.masked_model(input_ids=token_ids.unsqueeze(0), 
-                                     attention_mask=attention_mask.unsqueeze(0))
-            predictions = outputs.logits
-    
-        predicted_token_id = torch.argmax(predictions[0, rand_idx]).item()
-    
-        return {
-            "masked_text": self.tokenizer.decode(token_ids),
-            "original_text": self.tokenizer.decode(original_token),
-            "predicted_text": self.tokenizer.decode(predicted_token_id)
-        }
+        return self.test_model_batch([text])[0]
+
+    def test_model_batch(self, texts: List[str]) -> List[Dict]:
+        """Masked token prediction for many texts: one random token per text is masked and the
+        texts run in length-sorted padded batches. Results come back in input order."""
+        import torch
+        tokenizer = self.tokenizer
+        input_ids = tokenizer(texts, max_length=LEGALBERT_MAX_LENGTH, truncation=True)["input_ids"] if texts else []
+        results = [None] * len(texts)
+
+        for batch in length_buckets([len(ids) for ids in input_ids], LEGALBERT_BATCH_SIZE):
+            inputs = tokenizer.pad({"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt")
+            token_ids = inputs["input_ids"]
+            # One position per row between [CLS] and [SEP]; texts too short to mask keep position 0
+            positions = [int(torch.randint(1, len(input_ids[i]) - 1, (1,))) if len(input_ids[i]) > 2 else 0
+                         for i in batch]
+            rows = torch.arange(len(batch))
+            original_tokens = token_ids[rows, positions].tolist()
+            token_ids[rows, positions] = tokenizer.mask_token_id
+
+            with torch.inference_mode():
+                predictions = self.masked_model(input_ids=token_ids,
+                                                attention_mask=inputs["attention_mask"]).logits[rows, positions]
+            predicted_tokens = predictions.argmax(dim=-1).tolist()
+
+            for row, index in enumerate(batch):
+                length = len(input_ids[index])
+                results[index] = {
+                    "masked_text": tokenizer.decode(token_ids[row, :length]),
+                    "original_text": tokenizer.decode(original_tokens[row]),
+                    "predicted_text": tokenizer.decode(predicted_tokens[row])
+                }
+        return results
     
     def get_embedding(self, text: str) -> list:
         """Generate embedding for text using LegalBERT"""
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[list]:
+        """One LegalBERT embedding per text, pooled over the whole text rather than its first
+        512 tokens (LEGALBERT_POOLING; per-chunk storage is averaged here), in input order"""
+        # Shared with ranking when EMBEDDING_BACKEND=legalbert, so the model loads once
+        backend = get_embedding_backend('legalbert')
         try:
-            inputs = self.tokenizer(text, return_tensors="pt", 
-                                  max_length=512, truncation=True, padding=True)
-            with torch.no_grad():
-                outputs = self.embedding_model(**inputs)
-                # this should work as AutoModel - last_hidden_state
-                embedding = outputs.last_hidden_state.mean(dim=1)
-            return embedding[0].tolist()
+            return backend.embed_documents(texts, 'mean' if backend.pooling == 'chunks' else None)
         except Exception as e:
             print(f"Embedding error: {e}")
-            return []
+            return [[] for _ in texts]
 
-    def sync_to_mongodb(self):
-        """Sync PostgreSQL data to MongoDB"""
-        try:            
-            cursor = self.db.cursor()
-            cursor.execute("""
-                SELECT id, data 
-                FROM mock_cases
-            """)
-            cases = cursor.fetchall()
-            
-            cursor.execute("""
-                SELECT id, case_id, filename, extracted_text 
-                FROM case_documents
-            """)
-            documents = cursor.fetchall()
-            
-            cases_collection = self.mongo_db.cases
-            docs_collection = self.mongo_db.documents
-
-            for case_id, data in cases:
-                cases_collection.update_one(
-                    {'postgresql_id': case_id},
-                    {
-                        '$set': {
-                            'data': data,
-                            'last_updated': datetime.now()
-                        }
-                    },
-                    upsert=True
-                )
-
-            for doc_id, case_id, filename, text in documents:
-                docs_collection.update_one(
-                    {'postgresql_id': doc_id},
-                    {
-                        '$set': {
-                            'case_id': case_id,
-                            'filename': filename,
-                            'text': text,
-                            'last_updated': datetime.now()
-                        }
-                    },
-                    upsert=True
-                )
-
-            return True
+    def get_document_vectors(self, texts: List[str]) -> List[List[list]]:
+        """Vectors to store per document: one pooled vector, or one per window with 'chunks' pooling"""
+        backend = get_embedding_backend('legalbert')
+        if backend.pooling != 'chunks':
+            return [[embedding] for embedding in self.get_embeddings(texts)]
+        try:
+            return backend.embed_documents(texts)
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return [[[]] for _ in texts]
+
+    def _sync_table(self, table: str, columns: str, collection, to_document, batch_size: int, full: bool) -> Dict:
+        """Copy rows changed since the table's watermark into a MongoDB collection.
+        Rows stream through a named (server-side) cursor and are written as unordered bulk upserts;
+        the watermark advances after each batch, so an interrupted sync resumes where it stopped."""
+        from pymongo import UpdateOne
+        sync_state = self.mongo_db.sync_state
+        mark = None if full else sync_state.find_one({'_id': table})
+        # Rows written by transactions still in flight can carry an earlier updated_at than
+        # rows already visible, so the newest MONGO_SYNC_LAG_SECONDS wait for the next run
+        conditions = ["updated_at <= NOW() - %s * INTERVAL '1 second'"]
+        params = [MONGO_SYNC_LAG_SECONDS]
+        if mark:
+            conditions.append("(updated_at, id) > (%s, %s)")
+            params += [datetime.fromisoformat(mark['updated_at']), mark['id']]
+        collection.create_index('postgresql_id', unique=True)
+
+        rows = 0
+        start = time.perf_counter()
+        with self.pool.connection() as db:
+            cursor = db.cursor(name=f"sync_{table}")
+            cursor.itersize = batch_size
+            cursor.execute(f"""
+                SELECT {columns}, updated_at
+                FROM {table}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY updated_at, id
+            """, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                synced_at = datetime.now()
+                collection.bulk_write([
+                    UpdateOne({'postgresql_id': row[0]},
+                              {'$set': {**to_document(row), 'last_updated': synced_at}},
+                              upsert=True)
+                    for row in batch
+                ], ordered=False)
+                # Kept as a string: MongoDB dates only hold milliseconds
+                sync_state.update_one({'_id': table},
+                                      {'$set': {'updated_at': batch[-1][-1].isoformat(), 'id': batch[-1][0]}},
+                                      upsert=True)
+                rows += len(batch)
+            cursor.close()
+            db.commit()
+
+        seconds = time.perf_counter() - start
+        stats = {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
+        print(f"Synced {rows} rows from {table} in {seconds:.1f}s ({stats['rows_per_second']:.0f} rows/sec)")
+        return stats
+
+    def sync_to_mongodb(self, full: bool = False, batch_size: int = MONGO_SYNC_BATCH_SIZE) -> Dict:
+        """Sync PostgreSQL rows changed since the last run to MongoDB (full=True copies everything).
+        Returns per-table row counts and rows/sec, or {} if the sync failed."""
+        try:
+            return {
+                "mock_cases": self._sync_table(
+                    "mock_cases", "id, data", self.mongo_db.cases,
+                    lambda row: {'data': row[1]},
+                    batch_size, full),
+                "case_documents": self._sync_table(
+                    "case_documents", "id, case_id, filename, extracted_text", self.mongo_db.documents,
+                    lambda row: {'case_id': row[1], 'filename': row[2], 'text': row[3]},
+                    batch_size, full)
+            }
         except Exception as e:
             print(f"Sync error: {e}")
-            return False
+            return {}
         
     def get_combined_similarity(self, case_id: int, test_text: str):
         """Get similarity using LegalBERT embeddings"""
         try:            
             test_embedding = self.get_embedding(test_text)        
             
-            results = self.pinecone_index.query(
+            results = call_index(
+                self.pinecone_index, 'query',
                 vector=test_embedding,
                 top_k=5,
                 include_metadata=True
@@ -149,36 +214,70 @@ class MockTrialAnalyzer:
             print(f"Similarity search error: {e}")
             return None
 
+    def store_document_vectors(self, case_id: int, documents: List[Tuple]) -> Dict:
+        """Embed and upsert documents (id, text, vector_hash, vector_ids) whose text or embedding
+        settings changed since they were last written; unchanged documents are skipped"""
+        backend = get_embedding_backend('legalbert')
+        chunked = backend.pooling == 'chunks'
+        settings = (backend.model, backend.pooling, backend.max_length, backend.overlap)
+        changed = []
+        for document_id, text, stored_hash, stored_ids in documents:
+            digest = content_hash(text or "", *settings)
+            if digest != stored_hash:
+                changed.append((document_id, digest, stored_ids or []))
+        stats = {"documents": len(documents), "skipped": len(documents) - len(changed), "vectors_written": 0}
+        if not changed:
+            return stats
+
+        texts = {document_id: text or "" for document_id, text, _, _ in documents}
+        document_vectors = self.get_document_vectors([texts[document_id] for document_id, _, _ in changed])
+        written = []
+        with VectorWriteBuffer(self.pinecone_index) as buffer:
+            for (document_id, digest, stored_ids), vectors in zip(changed, document_vectors):
+                if not all(vectors):
+                    # Embedding failed; leave the stored state so the next run retries
+                    continue
+                ids = vector_ids(document_id, digest, len(vectors), chunked)
+                for chunk, (vector_id, values) in enumerate(zip(ids, vectors)):
+                    metadata = {'case_id': case_id, 'document_id': document_id}
+                    if chunked:
+                        metadata['chunk'] = chunk
+                    buffer.add({'id': vector_id, 'values': values, 'metadata': metadata})
+                stale = [vector_id for vector_id in stored_ids if vector_id not in ids]
+                if stale:
+                    buffer.delete(stale)
+                written.append((digest, ids, document_id))
+        stats["vectors_written"] = buffer.written
+
+        # Recorded only after every batch was accepted, so a failed run is simply repeated
+        with self.pool.connection() as db:
+            cursor = db.cursor()
+            cursor.executemany("UPDATE case_documents SET vector_hash = %s, vector_ids = %s WHERE id = %s", written)
+            db.commit()
+            cursor.close()
+        return stats
+
     def analyze_case(self, case_id: int) -> Dict:
         """Enhanced case analysis with LegalBERT"""
         try:
-            cursor = self.db.cursor()
-            cursor.execute("SELECT data FROM mock_cases WHERE id = %s", (case_id,))
-            case_data = cursor.fetchone()
+            with self.pool.connection() as db:
+                cursor = db.cursor()
+                cursor.execute("SELECT data FROM mock_cases WHERE id = %s", (case_id,))
+                case_data = cursor.fetchone()
     
-            if not case_data:
-                return {}
+                if not case_data:
+                    return {}
         
-            cursor.execute("""
-                SELECT extracted_text 
-                FROM case_documents 
-                WHERE case_id = %s
-            """, (case_id,))
-            documents = cursor.fetchall()
+                cursor.execute("""
+                    SELECT id, extracted_text, vector_hash, vector_ids
+                    FROM case_documents 
+                    WHERE case_id = %s
+                    ORDER BY id
+                """, (case_id,))
+                documents = cursor.fetchall()
     
-            analysis_results = []
-            for doc in documents:
-                text = doc[0]
-                embedding = self.get_embedding(text)
-                bert_analysis = self.test_model(text)            
-                
-                self.pinecone_index.upsert([{
-                    'id': f"case_{case_id}_doc_{len(analysis_results)}",
-                    'values': embedding,
-                    'metadata': {'case_id': case_id}
-                }])
-            
-                analysis_results.append(bert_analysis)    
+            vector_stats = self.store_document_vectors(case_id, documents)
+            analysis_results = self.test_model_batch([doc[1] or "" for doc in documents])
             
             analytics_collection = self.mongo_db.analytics
             analytics_result = analytics_collection.insert_one({
@@ -191,10 +290,10 @@ class MockTrialAnalyzer:
             return {
                 'case_id': case_id,
                 'analysis_id': str(analytics_result.inserted_id),
-                'bert_analysis': analysis_results
+                'bert_analysis': analysis_results,
+                'vectors': vector_stats
             }
     
         except Exception as e:
             print(f"Analysis error: {e}")
-            self.db.rollback()
             return {}
@@ -0,0 +1,255 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Per-provider defaults; override with e.g. ANTHROPIC_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE.
+# A limit of 0 disables that bucket. Limits apply per process, so give each analysis worker its share.
+PROVIDER_DEFAULTS = {
+    "anthropic": {"requests_per_minute": 50, "tokens_per_minute": 80000, "max_concurrency": 4},
+    "openai": {"requests_per_minute": 3000, "tokens_per_minute": 1000000, "max_concurrency": 8},
+    "pinecone": {"requests_per_minute": 600, "tokens_per_minute": 0, "max_concurrency": 8}
+}
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', 5))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv('RATE_LIMIT_BACKOFF_BASE', 1.0))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv('RATE_LIMIT_BACKOFF_MAX', 60.0))
+
+# 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectionError", "Timeout", "ReadTimeout"}
+
+class TokenBucket:
+    """Continuously refilling bucket; a negative level is debt that later callers wait out"""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, rate_scale: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * rate_scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float, rate_scale: float = 1.0) -> float:
+        """Seconds until amount is available at the (possibly reduced) refill rate"""
+        self._refill(now, rate_scale)
+        # Requests larger than the whole bucket are let through once it is full
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / (self.rate * rate_scale))
+
+    def take(self, amount: float, now: float, rate_scale: float = 1.0):
+        self._refill(now, rate_scale)
+        self.level -= amount
+
+def _header(error: Exception, name: str) -> Optional[str]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+    try:
+        return headers.get(name)
+    except AttributeError:
+        return None
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from retry-after-ms or retry-after (seconds or HTTP date)"""
+    value = _header(error, 'retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = _header(error, 'retry-after')
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an OpenAI, Anthropic or Pinecone API error"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+class RateLimiter:
+    """Client-side limits for one provider: request and token buckets, a concurrency cap and
+    retries that honor retry-after hints. A 429 pauses every caller and halves the refill rate,
+    which then recovers gradually, so bursts slow down instead of failing."""
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 4, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._rate_scale = 1.0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _wait_for_capacity(self, tokens: float):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if self.requests:
+                    delay = max(delay, self.requests.wait_time(1, now, self._rate_scale))
+                if self.tokens and tokens:
+                    delay = max(delay, self.tokens.wait_time(tokens, now, self._rate_scale))
+                if delay <= 0:
+                    if self.requests:
+                        self.requests.take(1, now, self._rate_scale)
+                    if self.tokens and tokens:
+                        self.tokens.take(tokens, now, self._rate_scale)
+                    self.calls += 1
+                    return
+                self.waited_seconds += delay
+            time.sleep(delay)
+
+    @contextmanager
+    def slot(self, tokens: float = 0):
+        """Hold one of the concurrent slots once both buckets allow the request"""
+        start = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self.waited_seconds += time.monotonic() - start
+        try:
+            self._wait_for_capacity(tokens)
+            yield
+        finally:
+            self._slots.release()
+
+    def adjust(self, tokens: float):
+        """Charge (or refund) the difference between estimated and reported token usage"""
+        if self.tokens and tokens:
+            with self._lock:
+                self.tokens.take(tokens, time.monotonic(), self._rate_scale)
+
+    def _on_success(self):
+        with self._lock:
+            self._rate_scale = min(1.0, self._rate_scale * 1.05)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None when the error should propagate"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        hinted = retry_after(error)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        delay = hinted if hinted is not None else \
+            random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+            if status_code(error) == 429:
+                self.throttled += 1
+                self._rate_scale = max(0.1, self._rate_scale / 2)
+                if hinted is not None:
+                    self._paused_until = max(self._paused_until, time.monotonic() + hinted)
+        return delay
+
+    def call(self, func, *args, tokens: float = 0, **kwargs):
+        """func(*args, **kwargs) within the limits, retrying transient failures; tokens are refunded
+        for attempts that fail"""
+        attempt = 0
+        while True:
+            try:
+                with self.slot(tokens):
+                    result = func(*args, **kwargs)
+                self._on_success()
+                return result
+            except Exception as e:
+                # A failed attempt returned no completion, so each logical call is charged once
+                self.adjust(-tokens)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    @contextmanager
+    def stream(self, open_stream, tokens: float = 0):
+        """Enter the stream manager open_stream() returns, retrying until the stream opens.
+        The slot is held while the caller reads; failures after the first event are not retried or refunded."""
+        attempt = 0
+        while True:
+            with self.slot(tokens):
+                manager = open_stream()
+                try:
+                    stream = manager.__enter__()
+                except Exception as e:
+                    self.adjust(-tokens)
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    try:
+                        yield stream
+                    except BaseException:
+                        if not manager.__exit__(*sys.exc_info()):
+                            raise
+                    else:
+                        manager.__exit__(None, None, None)
+                    self._on_success()
+                    return
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "waited_seconds": self.waited_seconds,
+                "rate_scale": self._rate_scale
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str) -> RateLimiter:
+    """Process-wide limiter for a provider, configured from PROVIDER_DEFAULTS and the environment"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            settings = dict(PROVIDER_DEFAULTS.get(provider, {}))
+            for setting in ("requests_per_minute", "tokens_per_minute", "max_concurrency"):
+                value = os.getenv(f"{provider.upper()}_{setting.upper()}")
+                if value is not None:
+                    settings[setting] = float(value) if setting != "max_concurrency" else int(value)
+            _limiters[provider] = RateLimiter(provider, **settings)
+        return _limiters[provider]
+
+def get_limiter_stats() -> Dict:
+    """Counters for every limiter created in this process"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
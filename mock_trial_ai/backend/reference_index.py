@@ -0,0 +1,253 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from similarity import normalize_rows
+from index_generations import (current_generation, new_generation, open_generation, publish_generation,
+                               remove_unused_generations, writer_lock)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+REFERENCE_INDEX_DIR = os.getenv('REFERENCE_INDEX_DIR', os.path.join(current_dir, 'reference_index'))
+# Both files live in one generation directory (see index_generations.py), so a load never pairs
+# one build's matrix with another's sidecar. Indexes written before that keep them at the top level
+EMBEDDINGS_FILE = 'embeddings.npy'
+METADATA_FILE = 'metadata.json'
+# Rows are keyed by reference_cases_mv.content_hash; indexes keyed otherwise are rebuilt on append
+KEY_SCHEME = 'content_hash'
+
+def reference_case_key(case: Dict) -> str:
+    """Stable ID for a reference case: the view's content hash, else a hash of its projected fields"""
+    if case.get("content_hash"):
+        return case["content_hash"]
+    return hashlib.sha1(json.dumps(case, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def refresh_reference_view(db):
+    """Recompute reference_cases_mv after a corpus load without blocking readers"""
+    cursor = db.cursor()
+    cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY reference_cases_mv")
+    db.commit()
+    cursor.close()
+
+class ReferenceIndex:
+    """Reference-case embeddings stored as a unit-normalized float32 .npy matrix plus a JSON
+    sidecar. The matrix is memory-mapped, so only the rows a query touches are paged in."""
+    def __init__(self, matrix: np.ndarray, metadata: Dict, readers=None):
+        self.matrix = matrix
+        # Shared lock on the loaded generation, released when the index is dropped
+        self._readers = readers
+        self.model = metadata["model"]
+        self.key_scheme = metadata.get("key_scheme", "sha1")
+        self.cases = [entry["case"] for entry in metadata["cases"]]
+        self.keys = [entry["key"] for entry in metadata["cases"]]
+        self.row_by_key = {key: row for row, key in enumerate(self.keys)}
+
+    @classmethod
+    def load(cls, index_dir: str = REFERENCE_INDEX_DIR) -> Optional['ReferenceIndex']:
+        """Memory-map the live generation from disk, or return None if the index has not been built"""
+        while True:
+            generation = current_generation(index_dir)
+            try:
+                return cls._load_files(generation or index_dir, generation is not None)
+            except FileNotFoundError:
+                # Replaced and removed while it was being opened
+                if generation is None or current_generation(index_dir) == generation:
+                    raise
+
+    @classmethod
+    def _load_files(cls, directory: str, is_generation: bool) -> Optional['ReferenceIndex']:
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+        if not is_generation and not (os.path.exists(metadata_path) and os.path.exists(embeddings_path)):
+            return None
+        readers = open_generation(directory) if is_generation else None
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            matrix = np.load(embeddings_path, mmap_mode='r')
+        except BaseException:
+            if readers:
+                readers.close()
+            raise
+        if matrix.shape[0] != len(metadata["cases"]):
+            raise ValueError(f"Reference index is inconsistent: {matrix.shape[0]} rows, {len(metadata['cases'])} entries")
+        if not metadata.get("normalized"):
+            print("Reference index predates row normalization; normalizing in memory (run rebuild to fix)")
+            matrix = normalize_rows(matrix)
+        return cls(matrix, metadata, readers)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, cases: List[Dict]) -> Tuple[List[int], List[int]]:
+        """Split cases into index rows that are already embedded and positions that are not.
+        Returns (rows, missing) where rows[i] is None for every position listed in missing."""
+        rows = []
+        missing = []
+        for position, case in enumerate(cases):
+            row = self.row_by_key.get(reference_case_key(case))
+            rows.append(row)
+            if row is None:
+                missing.append(position)
+        return rows, missing
+
+    @staticmethod
+    def write(index_dir: str, model: str, keys: List[str], cases: List[Dict], vectors: np.ndarray):
+        """Write a new generation with the (row-normalized) matrix and its sidecar and publish both at once"""
+        generation, readers = new_generation(index_dir)
+        with readers:
+            out = np.lib.format.open_memmap(os.path.join(generation, EMBEDDINGS_FILE), mode='w+',
+                                            dtype=np.float32, shape=vectors.shape)
+            out[:] = normalize_rows(vectors) if len(vectors) else vectors
+            out.flush()
+            del out
+            with open(os.path.join(generation, METADATA_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "model": model,
+                    "normalized": True,
+                    "key_scheme": KEY_SCHEME,
+                    "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                    "updated_at": datetime.now().isoformat(),
+                    "cases": [{"key": key, "case": case} for key, case in zip(keys, cases)]
+                }, f, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            with writer_lock(index_dir):
+                publish_generation(index_dir, generation)
+        remove_unused_generations(index_dir)
+        # Top-level files from before generations are no longer read once CURRENT exists
+        for name in (EMBEDDINGS_FILE, METADATA_FILE):
+            try:
+                os.remove(os.path.join(index_dir, name))
+            except OSError:
+                pass
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+def _index_version_on_disk(index_dir: str):
+    """The live generation, or for an index written before generations its sidecar's mtime"""
+    generation = current_generation(index_dir)
+    if generation:
+        return generation
+    try:
+        return os.path.getmtime(os.path.join(index_dir, METADATA_FILE))
+    except OSError:
+        return None
+
+def get_reference_index(index_dir: str = REFERENCE_INDEX_DIR) -> Optional[ReferenceIndex]:
+    """Shared, lazily loaded index; reloaded when a new generation is published"""
+    global _index, _index_version
+    with _index_lock:
+        version = _index_version_on_disk(index_dir)
+        if version is None:
+            _index, _index_version = None, None
+            return None
+        if _index is None or version != _index_version:
+            try:
+                _index = ReferenceIndex.load(index_dir)
+                _index_version = version
+            except Exception as e:
+                print(f"Error loading reference index: {e}")
+                _index, _index_version = None, None
+        return _index
+
+def _embed_cases(analyzer, cases: List[Dict]) -> Tuple[List[str], List[Dict], List[List[float]]]:
+    """Embed cases through the analyzer's batched, cached path, dropping any that fail"""
+    embeddings = analyzer._get_embeddings([case["case_text"] for case in cases])
+    keys, kept, vectors = [], [], []
+    for case, embedding in zip(cases, embeddings):
+        if embedding is None:
+            print(f"Skipping case due to embedding error: {case['case_text']}")
+            continue
+        keys.append(reference_case_key(case))
+        kept.append(case)
+        vectors.append(embedding)
+    return keys, kept, vectors
+
+def _unique_cases(cases: List[Dict]) -> List[Dict]:
+    """Drop rows the corpus returns more than once (only possible for pre-view rows)"""
+    return list({reference_case_key(case): case for case in cases}.values())
+
+def rebuild_index(analyzer, index_dir: str = REFERENCE_INDEX_DIR) -> Dict:
+    """Embed the whole reference corpus and replace the index"""
+    model = analyzer.embedding_backend.model
+    cases = _unique_cases(analyzer._get_reference_cases(docket_numbers=None))
+    keys, cases, vectors = _embed_cases(analyzer, cases)
+    if not vectors:
+        raise ValueError("No reference cases could be embedded")
+    ReferenceIndex.write(index_dir, model, keys, cases, np.asarray(vectors, dtype=np.float32))
+    return {"rows": len(keys), "added": len(keys)}
+
+def append_index(analyzer, index_dir: str = REFERENCE_INDEX_DIR) -> Dict:
+    """Embed only corpus rows that are not in the index yet and append them"""
+    model = analyzer.embedding_backend.model
+    index = ReferenceIndex.load(index_dir)
+    if index is None:
+        return rebuild_index(analyzer, index_dir)
+    if index.model != model:
+        raise ValueError(f"Index was built with {index.model}, current model is {model}; run rebuild")
+    if index.key_scheme != KEY_SCHEME:
+        print(f"Reference index is keyed by {index.key_scheme}, rebuilding with {KEY_SCHEME} keys")
+        return rebuild_index(analyzer, index_dir)
+
+    cases = [case for case in _unique_cases(analyzer._get_reference_cases(docket_numbers=None))
+             if reference_case_key(case) not in index.row_by_key]
+    if not cases:
+        return {"rows": len(index), "added": 0}
+
+    keys, cases, vectors = _embed_cases(analyzer, cases)
+    if not vectors:
+        return {"rows": len(index), "added": 0}
+    combined = np.concatenate([np.asarray(index.matrix), np.asarray(vectors, dtype=np.float32)])
+    ReferenceIndex.write(index_dir, model, index.keys + keys, index.cases + cases, combined)
+    return {"rows": len(index) + len(keys), "added": len(keys)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline reference-case embedding index")
+    parser.add_argument("command", choices=["refresh", "append", "rebuild", "info"],
+                        help="refresh the reference view and append new rows (run after corpus loads), "
+                             "append new corpus rows, rebuild from scratch, or show index details")
+    parser.add_argument("--index-dir", default=REFERENCE_INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        index = ReferenceIndex.load(args.index_dir)
+        if index is None:
+            print(f"No reference index at {args.index_dir}")
+            return 1
+        print(f"Model: {index.model}")
+        print(f"Rows: {len(index)}")
+        print(f"Matrix: {index.matrix.shape} {index.matrix.dtype}")
+        return 0
+
+    from mock_trial_analysis import MockTrialAnalyzer
+    analyzer = MockTrialAnalyzer()
+    if args.command == "refresh":
+        start = time.perf_counter()
+        with analyzer.connection() as db:
+            refresh_reference_view(db)
+        print(f"Refreshed reference_cases_mv in {time.perf_counter() - start:.1f}s")
+    result = rebuild_index(analyzer, args.index_dir) if args.command == "rebuild" else append_index(analyzer, args.index_dir)
+    print(f"Reference index at {args.index_dir}: {result['rows']} rows ({result['added']} embedded)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
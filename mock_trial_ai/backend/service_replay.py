@@ -0,0 +1,424 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from typing import Callable, Dict, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# live: real services. record: real services, saving every request/response pair with its latency.
+# replay: serve saved pairs offline. stub: synthetic responses, no recordings or network needed.
+SERVICE_MODE = os.getenv('SERVICE_MODE', 'live')
+SERVICE_RECORDINGS_DIR = os.getenv('SERVICE_RECORDINGS_DIR', os.path.join(current_dir, 'recordings'))
+# 'recorded' replays each response after its recorded latency, 'none' returns immediately,
+# a number is a fixed latency in seconds
+SERVICE_LATENCY = os.getenv('SERVICE_LATENCY', 'recorded')
+SERVICE_LATENCY_SCALE = float(os.getenv('SERVICE_LATENCY_SCALE', 1.0))
+# Fraction of random variation added to every injected latency
+SERVICE_LATENCY_JITTER = float(os.getenv('SERVICE_LATENCY_JITTER', 0.0))
+# In replay mode, requests with no recording raise ('error') or get a synthetic response ('stub')
+SERVICE_REPLAY_MISSING = os.getenv('SERVICE_REPLAY_MISSING', 'error')
+
+MODES = ("live", "record", "replay", "stub")
+# Latency for synthetic responses and for recordings that lack one, in seconds
+STUB_LATENCY = {"embeddings": 0.3, "messages": 20.0, "first_token": 1.5, "query": 0.08, "upsert": 0.1}
+STUB_EMBEDDING_DIMENSIONS = {"text-embedding-ada-002": 1536}
+STUB_ANALYSIS_WORDS = 600
+
+class ReplayMiss(KeyError):
+    """No recording for a request in replay mode"""
+
+class Replayed(dict):
+    """Saved response with attribute access, standing in for the SDK's response objects"""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        return _replayed(super().__getitem__(key))
+
+    def model_dump(self) -> Dict:
+        return dict(self)
+
+    def to_dict(self) -> Dict:
+        return dict(self)
+
+def _replayed(value):
+    if isinstance(value, dict) and not isinstance(value, Replayed):
+        return Replayed(value)
+    if isinstance(value, list):
+        return [_replayed(item) for item in value]
+    return value
+
+def _plain(value):
+    """SDK response objects (pydantic models, Pinecone responses, numpy arrays) as JSON-ready data"""
+    for method in ("model_dump", "to_dict", "tolist"):
+        if hasattr(value, method) and not isinstance(value, (dict, list, str)):
+            return _plain(getattr(value, method)())
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def _canonical(value):
+    """Request data with floats rounded, so recorded and replayed vectors produce the same key"""
+    value = _plain(value)
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    return value
+
+def request_key(provider: str, operation: str, request: Dict) -> str:
+    payload = json.dumps({"provider": provider, "operation": operation, "request": _canonical(request)},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _latency(recorded: Optional[float], default: float) -> float:
+    """Seconds to wait before returning a replayed or synthetic response"""
+    if SERVICE_LATENCY == 'none':
+        return 0.0
+    if SERVICE_LATENCY == 'recorded':
+        base = recorded if recorded is not None else default
+    else:
+        base = float(SERVICE_LATENCY)
+    if SERVICE_LATENCY_JITTER:
+        base *= 1 + random.uniform(-SERVICE_LATENCY_JITTER, SERVICE_LATENCY_JITTER)
+    return max(0.0, base * SERVICE_LATENCY_SCALE)
+
+def _seeded(text: str) -> random.Random:
+    return random.Random(int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16], 16))
+
+class RecordingStore:
+    """One JSON file per request under <root>/<provider>/<operation>/<key>.json"""
+    def __init__(self, root: str = SERVICE_RECORDINGS_DIR):
+        self.root = root
+        self.saved = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, provider: str, operation: str, key: str) -> str:
+        return os.path.join(self.root, provider, operation, f"{key}.json")
+
+    def load(self, provider: str, operation: str, key: str) -> Optional[Dict]:
+        path = self._path(provider, operation, key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return record
+
+    def save(self, provider: str, operation: str, key: str, record: Dict):
+        path = self._path(provider, operation, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a concurrent replay never reads half a file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.saved += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"saved": self.saved, "hits": self.hits, "misses": self.misses}
+
+class StandIn:
+    """Common record/replay/stub handling for one provider"""
+    def __init__(self, provider: str, mode: str, store: RecordingStore, real=None):
+        self.provider = provider
+        self.mode = mode
+        self.store = store
+        self.real = real
+
+    def _lookup(self, operation: str, key: str, stub: Callable[[], Dict]) -> Dict:
+        """Saved record for key, or a synthetic one in stub mode (and for misses if allowed)"""
+        record = self.store.load(self.provider, operation, key) if self.mode == 'replay' else None
+        if record is None:
+            if self.mode == 'replay' and SERVICE_REPLAY_MISSING != 'stub':
+                raise ReplayMiss(f"No {self.provider} {operation} recording for request {key[:12]} "
+                                 f"in {self.store.root}; record it with SERVICE_MODE=record")
+            record = stub()
+        return record
+
+    def _call(self, operation: str, request: Dict, live: Callable, stub: Callable[[], Dict]):
+        key = request_key(self.provider, operation, request)
+        if self.mode == 'record':
+            start = time.perf_counter()
+            response = live()
+            self.store.save(self.provider, operation, key, {
+                "request": _canonical(request),
+                "response": _plain(response),
+                "latency_s": time.perf_counter() - start
+            })
+            return response
+        record = self._lookup(operation, key, lambda: {"response": stub(), "latency_s": None})
+        time.sleep(_latency(record.get("latency_s"), STUB_LATENCY[operation]))
+        return Replayed(record["response"])
+
+class _Embeddings:
+    def __init__(self, stand_in: 'OpenAIStandIn'):
+        self.stand_in = stand_in
+
+    def create(self, input, model: str, **kwargs):
+        return self.stand_in.create_embeddings(input, model, **kwargs)
+
+class OpenAIStandIn(StandIn):
+    """client.embeddings.create, recorded per text so replay works however texts are batched"""
+    def __init__(self, mode: str, store: RecordingStore, real=None):
+        super().__init__('openai', mode, store, real)
+        self.embeddings = _Embeddings(self)
+
+    def create_embeddings(self, input, model: str, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        keys = [request_key(self.provider, 'embeddings', {"model": model, "input": text}) for text in texts]
+        if self.mode == 'record':
+            start = time.perf_counter()
+            response = self.real.embeddings.create(input=input, model=model, **kwargs)
+            latency = time.perf_counter() - start
+            for item in response.data:
+                self.store.save(self.provider, 'embeddings', keys[item.index], {
+                    "request": {"model": model, "input": texts[item.index]},
+                    "embedding": _plain(item.embedding),
+                    "latency_s": latency,
+                    "batch_size": len(texts)
+                })
+            return response
+
+        def stub_embedding(text: str) -> Dict:
+            rng = _seeded(f"{model}:{text}")
+            dimensions = STUB_EMBEDDING_DIMENSIONS.get(model, 768)
+            return {"embedding": [rng.gauss(0, 1) for _ in range(dimensions)], "latency_s": None}
+
+        records = [self._lookup('embeddings', key, lambda text=text: stub_embedding(text))
+                   for key, text in zip(keys, texts)]
+        # The batch took as long as the slowest request its texts were recorded in
+        recorded = [record["latency_s"] for record in records if record.get("latency_s") is not None]
+        time.sleep(_latency(max(recorded) if recorded else None, STUB_LATENCY["embeddings"]))
+        return Replayed({
+            "object": "list",
+            "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": record["embedding"]}
+                     for i, record in enumerate(records)],
+            "usage": {"prompt_tokens": sum(len(text) // 4 + 1 for text in texts)}
+        })
+
+def _stub_message(request: Dict) -> Dict:
+    """Deterministic Claude-shaped reply sized like a real analysis"""
+    prompt = json.dumps(_canonical(request), sort_keys=True)
+    rng = _seeded(prompt)
+    vocabulary = ["the", "court", "patent", "claim", "infringement", "expert", "evidence", "damages",
+                  "source", "code", "analysis", "defendant", "plaintiff", "jury", "motion", "prior", "art"]
+    words = [rng.choice(vocabulary) for _ in range(min(STUB_ANALYSIS_WORDS, request.get("max_tokens", 4000)))]
+    text = "STUB RESPONSE. " + ' '.join(words)
+    return {
+        "id": f"msg_stub_{rng.randrange(10 ** 12)}",
+        "type": "message",
+        "role": "assistant",
+        "model": request.get("model"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": len(prompt) // 4 + 1, "output_tokens": len(words) * 4 // 3}
+    }
+
+class _RecordingStream:
+    """Wraps a live message stream and saves its chunks with their arrival times"""
+    def __init__(self, manager, save: Callable[[Dict], None]):
+        self.manager = manager
+        self.save = save
+        self.chunks = []
+        self.final_message = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.stream = self.manager.__enter__()
+        return self
+
+    @property
+    def text_stream(self):
+        for text in self.stream.text_stream:
+            self.chunks.append([time.perf_counter() - self.start, text])
+            yield text
+
+    def get_final_message(self):
+        self.final_message = self.stream.get_final_message()
+        return self.final_message
+
+    def __exit__(self, *exc_info):
+        suppressed = self.manager.__exit__(*exc_info)
+        if exc_info[0] is None:
+            self.save({
+                "chunks": self.chunks,
+                "final_message": _plain(self.final_message or self.stream.get_final_message()),
+                "latency_s": time.perf_counter() - self.start
+            })
+        return suppressed
+
+class _ReplayStream:
+    """Replays saved chunks with their recorded spacing (scaled by the latency settings)"""
+    def __init__(self, record: Dict):
+        self.record = record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        chunks = self.record["chunks"]
+        recorded_total = self.record.get("latency_s")
+        total = _latency(recorded_total, STUB_LATENCY["messages"])
+        scale = total / recorded_total if recorded_total else 0.0
+        start = time.perf_counter()
+        for offset, text in chunks:
+            delay = offset * scale - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            yield text
+
+    def get_final_message(self):
+        return Replayed(self.record["final_message"])
+
+class _Messages:
+    def __init__(self, stand_in: 'AnthropicStandIn'):
+        self.stand_in = stand_in
+
+    def create(self, **request):
+        return self.stand_in._call('messages', request, lambda: self.stand_in.real.messages.create(**request),
+                                   lambda: _stub_message(request))
+
+    def stream(self, **request):
+        return self.stand_in.stream_messages(request)
+
+class AnthropicStandIn(StandIn):
+    """client.messages.create and client.messages.stream"""
+    def __init__(self, mode: str, store: RecordingStore, real=None):
+        super().__init__('anthropic', mode, store, real)
+        self.messages = _Messages(self)
+
+    def stream_messages(self, request: Dict):
+        key = request_key(self.provider, 'messages', request)
+        if self.mode == 'record':
+            def save(streamed: Dict):
+                self.store.save(self.provider, 'messages', key, {"request": _canonical(request), **streamed})
+            return _RecordingStream(self.real.messages.stream(**request), save)
+
+        def stub() -> Dict:
+            message = _stub_message(request)
+            words = message["content"][0]["text"].split(' ')
+            chunk_texts = [' '.join(words[i:i + 5]) + ' ' for i in range(0, len(words), 5)]
+            first, total = STUB_LATENCY["first_token"], STUB_LATENCY["messages"]
+            step = (total - first) / max(1, len(chunk_texts) - 1)
+            return {"chunks": [[first + i * step, text] for i, text in enumerate(chunk_texts)],
+                    "final_message": message, "latency_s": total}
+
+        record = self._lookup('messages', key, stub)
+        if "chunks" not in record:
+            # Recorded with messages.create: replay the whole text as one chunk
+            response = record["response"]
+            record = {"chunks": [[record.get("latency_s") or 0.0, response["content"][0]["text"]]],
+                      "final_message": response, "latency_s": record.get("latency_s")}
+        return _ReplayStream(record)
+
+class PineconeStandIn(StandIn):
+    """index.query, index.upsert and index.delete"""
+    def __init__(self, mode: str, store: RecordingStore, index_name: str, real=None):
+        super().__init__(f"pinecone/{index_name}", mode, store, real)
+
+    def query(self, *args, **kwargs):
+        return self._call('query', {"args": args, **kwargs}, lambda: self.real.query(*args, **kwargs),
+                          lambda: {"matches": [], "namespace": kwargs.get("namespace", "")})
+
+    def upsert(self, *args, **kwargs):
+        vectors = args[0] if args else kwargs.get("vectors", [])
+        return self._call('upsert', {"args": args, **kwargs}, lambda: self.real.upsert(*args, **kwargs),
+                          lambda: {"upserted_count": len(vectors)})
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', {"args": args, **kwargs}, lambda: self.real.delete(*args, **kwargs),
+                          lambda: {})
+
+STAND_INS = {
+    "openai": OpenAIStandIn,
+    "claude": AnthropicStandIn
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> RecordingStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordingStore()
+        return _store
+
+def wrap(name: str, build: Callable, mode: str = None):
+    """Client for name ('openai', 'claude' or 'pinecone:<index>') in the configured SERVICE_MODE.
+    build() creates the real client; replay and stub modes never call it."""
+    mode = mode or SERVICE_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown SERVICE_MODE '{mode}'; choose from {', '.join(MODES)}")
+    # Local services (MongoDB) are always live
+    if mode == 'live' or not (name in STAND_INS or name.startswith('pinecone:')):
+        return build()
+    real = build() if mode == 'record' else None
+    if name.startswith('pinecone:'):
+        return PineconeStandIn(mode, get_store(), name.split(':', 1)[1], real)
+    return STAND_INS[name](mode, get_store(), real)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect recorded service responses")
+    parser.add_argument("--dir", default=SERVICE_RECORDINGS_DIR)
+    args = parser.parse_args()
+    if not os.path.isdir(args.dir):
+        print(f"No recordings in {args.dir}")
+        return 1
+    for provider in sorted(os.listdir(args.dir)):
+        provider_dir = os.path.join(args.dir, provider)
+        for root, _, files in os.walk(provider_dir):
+            records = [name for name in files if name.endswith('.json')]
+            if not records:
+                continue
+            latencies = []
+            for name in records:
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    latency = json.load(f).get("latency_s")
+                if latency is not None:
+                    latencies.append(latency)
+            operation = os.path.relpath(root, args.dir)
+            mean = sum(latencies) / len(latencies) if latencies else 0.0
+            print(f"{operation}: {len(records)} recordings, mean latency {mean:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
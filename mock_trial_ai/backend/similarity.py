@@ -0,0 +1,46 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+from typing import Tuple
+import numpy as np
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Scale each row to unit length so a dot product is the cosine similarity"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def top_k_similar(query, matrix: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and cosine scores of the top_k rows of a normalized matrix, best first"""
+    indices, scores = top_k_similar_batch(query, matrix, top_k)
+    return indices[0], scores[0]
+
+def top_k_similar_batch(queries, matrix: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank every query against a normalized matrix with one matrix product.
+    Returns (indices, scores), each shaped (len(queries), min(top_k, rows))."""
+    queries = normalize_rows(queries)
+    count = matrix.shape[0]
+    k = min(top_k, count)
+    if k <= 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    scores = queries @ np.asarray(matrix, dtype=np.float32).T
+    if k < count:
+        # argpartition finds the top k in linear time; only those k get sorted
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(count), (scores.shape[0], count))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
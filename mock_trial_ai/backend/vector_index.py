@@ -0,0 +1,524 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from similarity import normalize_rows
+from service_replay import Replayed
+from index_generations import (current_generation, fsync_write, new_generation, open_generation,
+                               publish_generation, remove_unused_generations, writer_lock)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+LOCAL_INDEX_DIR = os.getenv('LOCAL_INDEX_DIR', os.path.join(current_dir, 'vector_index'))
+# IVF lists; 0 picks about sqrt(rows). Indexes under IVF_MIN_ROWS use one list (exact search)
+IVF_NLIST = int(os.getenv('IVF_NLIST', 0))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', 8))
+IVF_MIN_ROWS = int(os.getenv('IVF_MIN_ROWS', 1024))
+# Pending upserts/deletes that start a background merge into the IVF base; 0 leaves it to the compact command
+LOCAL_INDEX_COMPACT_ROWS = int(os.getenv('LOCAL_INDEX_COMPACT_ROWS', 1000))
+
+# Files in each generation directory (see index_generations.py); writes made before the first
+# build are logged at the top of the index directory
+VECTORS_FILE = 'vectors.npy'
+CENTROIDS_FILE = 'centroids.npy'
+INDEX_FILE = 'index.json'
+LOG_FILE = 'log.jsonl'
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+# Pinecone metadata filter operators; list-valued fields match if any element does
+FILTER_OPERATORS = {
+    '$eq': lambda values, operand: any(value == operand for value in values),
+    '$ne': lambda values, operand: all(value != operand for value in values),
+    '$in': lambda values, operand: any(value in operand for value in values),
+    '$nin': lambda values, operand: all(value not in operand for value in values),
+    '$gt': lambda values, operand: any(value is not None and value > operand for value in values),
+    '$gte': lambda values, operand: any(value is not None and value >= operand for value in values),
+    '$lt': lambda values, operand: any(value is not None and value < operand for value in values),
+    '$lte': lambda values, operand: any(value is not None and value <= operand for value in values),
+    '$exists': lambda values, operand: (values != [None]) == operand
+}
+
+def matches_filter(metadata: Dict, metadata_filter: Dict) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one vector's metadata"""
+    for key, condition in metadata_filter.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+        else:
+            values = _as_list(metadata.get(key))
+            conditions = condition if isinstance(condition, dict) else {'$eq': condition}
+            for operator, operand in conditions.items():
+                if operator not in FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator {operator}")
+                if not FILTER_OPERATORS[operator](values, operand):
+                    return False
+    return True
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """Nearest centroid per row, in blocks so the score matrix stays small"""
+    return np.concatenate([np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+                           for start in range(0, len(vectors), block)]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means over normalized rows; returns (centroids, list of every row).
+    Trained on a sample of at most 256 rows per list, then every row is assigned."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), 256 * nlist), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        # Lists that lost every member restart from a random sample row
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        centroids = normalize_rows(sums)
+    return centroids, _assign(vectors, centroids)
+
+class LocalVectorIndex:
+    """In-process stand-in for a Pinecone index (upsert, query, fetch, delete) using cosine similarity.
+    The base is an IVF index: normalized float32 rows sorted by inverted list in a memory-mapped .npy,
+    with list centroids and a JSON sidecar of ids and metadata. A query scans only the IVF_NPROBE lists
+    nearest to it. Writes are appended to a log and held in memory until compact() merges them into
+    a retrained base, so a restart replays the log and nothing is lost. The base files and the log
+    live together in one generation directory, and a compaction publishes a new generation by
+    replacing the CURRENT pointer, so a reader sees either the old generation or the new one.
+    Writers take the index directory's writer lock and catch up with CURRENT and the log first,
+    so several processes can write to one index; each sees the others' writes from its next write."""
+    # No remote quota to respect, so callers skip the Pinecone rate limiter
+    rate_limited = False
+
+    def __init__(self, index_dir: str = LOCAL_INDEX_DIR, nprobe: int = IVF_NPROBE,
+                 compact_rows: int = LOCAL_INDEX_COMPACT_ROWS):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self.compact_rows = compact_rows
+        self._lock = threading.RLock()
+        # Held for a whole compaction; the index lock only for its snapshot and swap
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._readers = None
+        self._load()
+
+    def _load(self):
+        """Load the live generation, retrying if it is replaced and removed while being opened"""
+        while True:
+            generation = current_generation(self.index_dir)
+            try:
+                self._load_generation(generation)
+                return
+            except FileNotFoundError:
+                if current_generation(self.index_dir) == generation:
+                    raise
+
+    def _load_generation(self, generation: Optional[str]):
+        """Memory-map a generation's base, hold its readers lock and replay its pending writes from the log"""
+        matrix = np.zeros((0, 0), dtype=np.float32)
+        centroids = np.zeros((0, 0), dtype=np.float32)
+        sidecar = {"offsets": [0, 0], "ids": [], "metadata": []}
+        readers = None
+        if generation:
+            readers = open_generation(generation)
+            try:
+                with open(os.path.join(generation, INDEX_FILE), 'r', encoding='utf-8') as f:
+                    sidecar = json.load(f)
+                matrix = np.load(os.path.join(generation, VECTORS_FILE), mmap_mode='r')
+                centroids = np.load(os.path.join(generation, CENTROIDS_FILE))
+            except BaseException:
+                readers.close()
+                raise
+            if matrix.shape[0] != len(sidecar["ids"]):
+                readers.close()
+                raise ValueError(f"Vector index is inconsistent: {matrix.shape[0]} rows, {len(sidecar['ids'])} ids")
+        if self._readers:
+            self._readers.close()
+        self._readers = readers
+        self.generation = generation
+        self.matrix = matrix
+        self.centroids = centroids
+        self.offsets = sidecar["offsets"]
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.row_by_id = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.deleted = set()
+        self.deleted_mask = np.zeros(len(self.ids), dtype=bool)
+        self.pending = {}
+        self._pending_matrix = None
+
+        # Before the first build, writes are logged at the top of the index directory
+        self.log_path = os.path.join(generation or self.index_dir, LOG_FILE)
+        self.log_position = 0
+        self._replay_log()
+
+    def _replay_log(self):
+        """Apply log entries written since the last read, by this index or another one"""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(self.log_position)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self.log_position += len(line)
+                if line.strip():
+                    self._apply(json.loads(line))
+
+    def _sync(self):
+        """Catch up with writes and compactions by other indexes; call with the writer lock held"""
+        if current_generation(self.index_dir) != self.generation:
+            self._load()
+        else:
+            self._replay_log()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        if self.matrix.shape[0]:
+            return self.matrix.shape[1]
+        for vector, _ in self.pending.values():
+            return len(vector)
+        return None
+
+    def _apply(self, entry: Dict):
+        """Apply one logged write to the in-memory state"""
+        if entry["op"] == "delete_all":
+            self.deleted = set(range(len(self.ids)))
+            self.deleted_mask[:] = True
+            self.pending = {}
+        elif entry["op"] == "delete":
+            for vector_id in entry["ids"]:
+                self.pending.pop(vector_id, None)
+                if vector_id in self.row_by_id:
+                    self.deleted.add(self.row_by_id[vector_id])
+                    self.deleted_mask[self.row_by_id[vector_id]] = True
+        else:
+            if entry["id"] in self.row_by_id:
+                self.deleted.add(self.row_by_id[entry["id"]])
+                self.deleted_mask[self.row_by_id[entry["id"]]] = True
+            self.pending[entry["id"]] = (normalize_rows(entry["values"])[0], entry.get("metadata") or {})
+        self._pending_matrix = None
+
+    def _write(self, entries: List[Dict]):
+        """Log writes durably, then apply them; a long log starts a compaction in the background"""
+        with writer_lock(self.index_dir):
+            self._sync()
+            with open(self.log_path, 'ab') as f:
+                for entry in entries:
+                    f.write((json.dumps(entry) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+                self.log_position = f.tell()
+        for entry in entries:
+            self._apply(entry)
+        if self.compact_rows and len(self.pending) + len(self.deleted) >= self.compact_rows \
+                and not (self._compactor and self._compactor.is_alive()):
+            self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting vector index at {self.index_dir}: {e}")
+
+    @staticmethod
+    def _vector_entry(vector) -> Dict:
+        """Accept Pinecone's dict and (id, values[, metadata]) tuple forms"""
+        if isinstance(vector, dict):
+            values = vector["values"]
+            vector_id, metadata = vector["id"], vector.get("metadata")
+        else:
+            vector_id, values = vector[0], vector[1]
+            metadata = vector[2] if len(vector) > 2 else None
+        return {"op": "upsert", "id": str(vector_id), "values": [float(value) for value in values],
+                "metadata": metadata or {}}
+
+    def upsert(self, vectors=None, namespace: str = "", **kwargs) -> Replayed:
+        entries = [self._vector_entry(vector) for vector in vectors or []]
+        with self._lock:
+            dimension = self.dimension
+            for entry in entries:
+                if dimension is not None and len(entry["values"]) != dimension:
+                    raise ValueError(f"Vector {entry['id']} has dimension {len(entry['values'])}, index has {dimension}")
+                dimension = len(entry["values"])
+            self._write(entries)
+        return Replayed({"upserted_count": len(entries)})
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, filter: Dict = None,
+               namespace: str = "", **kwargs) -> Replayed:
+        with self._lock:
+            if delete_all:
+                self._write([{"op": "delete_all"}])
+            else:
+                ids = list(ids or [])
+                if filter:
+                    ids += [vector_id for vector_id, _, metadata in self._live() if matches_filter(metadata, filter)]
+                if ids:
+                    self._write([{"op": "delete", "ids": ids}])
+        return Replayed({})
+
+    def _live(self):
+        """(id, row or pending key, metadata) for every live vector"""
+        for row, vector_id in enumerate(self.ids):
+            if row not in self.deleted:
+                yield vector_id, row, self.metadata[row]
+        for vector_id, (_, metadata) in self.pending.items():
+            yield vector_id, vector_id, metadata
+
+    def _vector(self, vector_id: str) -> Optional[np.ndarray]:
+        if vector_id in self.pending:
+            return self.pending[vector_id][0]
+        row = self.row_by_id.get(vector_id)
+        return None if row is None or row in self.deleted else np.asarray(self.matrix[row])
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> Replayed:
+        vectors = {}
+        with self._lock:
+            for vector_id in ids:
+                vector = self._vector(vector_id)
+                if vector is not None:
+                    metadata = self.pending[vector_id][1] if vector_id in self.pending \
+                        else self.metadata[self.row_by_id[vector_id]]
+                    vectors[vector_id] = {"id": vector_id, "values": vector.tolist(), "metadata": metadata}
+        return Replayed({"vectors": vectors, "namespace": namespace})
+
+    def _pending_arrays(self) -> Tuple[List[str], np.ndarray]:
+        if self._pending_matrix is None:
+            ids = list(self.pending)
+            matrix = np.stack([self.pending[vector_id][0] for vector_id in ids]) if ids \
+                else np.zeros((0, self.dimension or 0), dtype=np.float32)
+            self._pending_matrix = (ids, matrix)
+        return self._pending_matrix
+
+    def _search(self, query: np.ndarray, top_k: int, metadata_filter: Optional[Dict],
+                nprobe: int) -> List[Tuple[float, str, Dict, np.ndarray]]:
+        """Candidates from the probed lists and pending writes, best first"""
+        found = []
+        nlist = len(self.offsets) - 1
+        if self.matrix.shape[0]:
+            lists = range(nlist)
+            if nprobe < nlist:
+                lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            # Lists are contiguous row ranges, so the probed rows are scored in one product
+            rows = np.concatenate([np.arange(self.offsets[number], self.offsets[number + 1]) for number in lists])
+            if len(rows) == self.matrix.shape[0]:
+                rows = np.arange(len(rows))
+                block = np.asarray(self.matrix)
+            else:
+                # Ascending rows keep reads from the memory map sequential
+                rows = np.sort(rows)
+                block = self.matrix[rows]
+            scores = block @ query
+            valid = ~self.deleted_mask[rows]
+            if metadata_filter:
+                valid &= np.array([matches_filter(self.metadata[row], metadata_filter) for row in rows], dtype=bool)
+            scores = np.where(valid, scores, -np.inf)
+            k = min(top_k, len(rows))
+            if k:
+                for position in np.argpartition(-scores, k - 1)[:k]:
+                    if valid[position]:
+                        row = int(rows[position])
+                        found.append((float(scores[position]), self.ids[row], self.metadata[row], block[position]))
+
+        pending_ids, pending_matrix = self._pending_arrays()
+        if pending_ids:
+            scores = pending_matrix @ query
+            for position in np.argsort(-scores)[:None if metadata_filter else top_k]:
+                vector_id = pending_ids[position]
+                metadata = self.pending[vector_id][1]
+                if metadata_filter and not matches_filter(metadata, metadata_filter):
+                    continue
+                found.append((float(scores[position]), vector_id, metadata, pending_matrix[position]))
+        found.sort(key=lambda match: -match[0])
+        return found[:top_k]
+
+    def query(self, vector=None, id: str = None, top_k: int = 10, include_values: bool = False,
+              include_metadata: bool = False, filter: Dict = None, namespace: str = "",
+              nprobe: int = None, **kwargs) -> Replayed:
+        """Pinecone-compatible query by vector or by stored id"""
+        with self._lock:
+            if vector is None:
+                vector = self._vector(id) if id is not None else None
+                if vector is None:
+                    return Replayed({"matches": [], "namespace": namespace})
+            if self.dimension is None:
+                return Replayed({"matches": [], "namespace": namespace})
+            query = normalize_rows(vector)[0]
+            nprobe = nprobe or self.nprobe
+            found = self._search(query, top_k, filter, nprobe)
+            nlist = len(self.offsets) - 1
+            if filter and len(found) < top_k and nprobe < nlist:
+                # A selective filter can empty the probed lists; fall back to scanning all of them
+                found = self._search(query, top_k, filter, nlist)
+
+        matches = []
+        for score, vector_id, metadata, values in found:
+            match = {"id": vector_id, "score": score}
+            if include_metadata:
+                match["metadata"] = metadata
+            if include_values:
+                match["values"] = np.asarray(values).tolist()
+            matches.append(match)
+        return Replayed({"matches": matches, "namespace": namespace})
+
+    def describe_index_stats(self, **kwargs) -> Replayed:
+        with self._lock:
+            count = len(self.ids) - len(self.deleted) + len(self.pending)
+            return Replayed({
+                "dimension": self.dimension or 0,
+                "total_vector_count": count,
+                "namespaces": {"": {"vector_count": count}},
+                "lists": len(self.offsets) - 1,
+                "pending_writes": len(self.pending) + len(self.deleted)
+            })
+
+    @staticmethod
+    def _write_generation(index_dir: str, ids: List[str], vectors: np.ndarray, metadata: List[Dict],
+                          nlist: int = IVF_NLIST, seed: int = 0):
+        """Train the IVF lists and write them to a new, unpublished generation directory.
+        Returns the directory and its readers lock, held shared so cleanup leaves the build alone;
+        the caller closes it once the generation is published (or abandoned)."""
+        os.makedirs(index_dir, exist_ok=True)
+        vectors = normalize_rows(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32)
+        if len(vectors) < IVF_MIN_ROWS and not nlist:
+            nlist = 1
+        nlist = max(1, min(nlist or int(round(len(vectors) ** 0.5)), len(vectors) or 1))
+        if len(vectors) and nlist > 1:
+            centroids, assignments = train_ivf(vectors, nlist, seed=seed)
+        else:
+            centroids = normalize_rows(vectors.mean(axis=0)) if len(vectors) else np.zeros((1, 0), dtype=np.float32)
+            assignments = np.zeros(len(vectors), dtype=np.int64)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).tolist()
+
+        generation, readers = new_generation(index_dir)
+        out = np.lib.format.open_memmap(os.path.join(generation, VECTORS_FILE), mode='w+',
+                                        dtype=np.float32, shape=vectors.shape)
+        out[:] = vectors[order]
+        out.flush()
+        del out
+        with open(os.path.join(generation, CENTROIDS_FILE), 'wb') as f:
+            np.save(f, centroids.astype(np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        fsync_write(os.path.join(generation, INDEX_FILE), json.dumps({
+            "dim": int(vectors.shape[1]) if len(vectors) else 0,
+            "metric": "cosine",
+            "nlist": nlist,
+            "offsets": offsets,
+            "ids": [ids[row] for row in order],
+            "metadata": [metadata[row] for row in order],
+            "updated_at": datetime.now().isoformat()
+        }, default=str))
+        return generation, readers
+
+    @staticmethod
+    def _publish(index_dir: str, generation: str):
+        """Point CURRENT at generation in one rename; call with the writer lock held.
+        Writers re-read CURRENT under that lock, so none appends to the replaced log afterwards."""
+        publish_generation(index_dir, generation)
+        if os.path.exists(os.path.join(index_dir, LOG_FILE)):
+            os.remove(os.path.join(index_dir, LOG_FILE))
+
+    @staticmethod
+    def build(index_dir: str, ids: List[str], vectors: np.ndarray, metadata: List[Dict], nlist: int = IVF_NLIST,
+              seed: int = 0):
+        """Write a new generation holding exactly these vectors, with an empty log, and publish it"""
+        generation, readers = LocalVectorIndex._write_generation(index_dir, ids, vectors, metadata, nlist, seed)
+        with readers:
+            fsync_write(os.path.join(generation, LOG_FILE), '')
+            with writer_lock(index_dir):
+                LocalVectorIndex._publish(index_dir, generation)
+        remove_unused_generations(index_dir)
+
+    def compact(self, nlist: int = IVF_NLIST):
+        """Merge pending writes into a retrained base. The lists are trained without holding the index
+        lock; writes made meanwhile are carried over to the new generation's log when it is published."""
+        with self._compact_lock:
+            with self._lock, writer_lock(self.index_dir):
+                self._sync()
+                live = list(self._live())
+                ids = [vector_id for vector_id, _, _ in live]
+                metadata = [entry_metadata for _, _, entry_metadata in live]
+                vectors = np.stack([self._vector(vector_id) for vector_id in ids]) if ids \
+                    else np.zeros((0, 0), dtype=np.float32)
+                base_generation, log_path, log_offset = self.generation, self.log_path, self.log_position
+            generation, readers = self._write_generation(self.index_dir, ids, vectors, metadata, nlist)
+            with readers:
+                with self._lock, writer_lock(self.index_dir):
+                    if current_generation(self.index_dir) != base_generation:
+                        # Another index compacted meanwhile; its generation already holds these writes
+                        shutil.rmtree(generation, ignore_errors=True)
+                        self._sync()
+                        return
+                    tail = b''
+                    if os.path.exists(log_path):
+                        with open(log_path, 'rb') as f:
+                            f.seek(log_offset)
+                            tail = f.read()
+                    fsync_write(os.path.join(generation, LOG_FILE), tail.decode('utf-8'))
+                    self._publish(self.index_dir, generation)
+                    self._load()
+        remove_unused_generations(self.index_dir)
+
+    def close(self):
+        """Wait for a running compaction, release the memory-mapped base and remove generations only this
+        index still held; the index is unusable after"""
+        with self._compact_lock, self._lock:
+            self.matrix = None
+            if self._readers:
+                self._readers.close()
+                self._readers = None
+        if os.path.isdir(self.index_dir):
+            remove_unused_generations(self.index_dir)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_local_index(index_dir: str = LOCAL_INDEX_DIR) -> LocalVectorIndex:
+    """Process-wide index per directory, loaded on first use"""
+    with _indexes_lock:
+        if index_dir not in _indexes:
+            _indexes[index_dir] = LocalVectorIndex(index_dir)
+        return _indexes[index_dir]
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or compact the local vector index")
+    parser.add_argument("command", choices=["info", "compact"])
+    parser.add_argument("--index-dir", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF lists for compact (0: about sqrt(rows))")
+    args = parser.parse_args()
+
+    index = LocalVectorIndex(args.index_dir)
+    if args.command == "compact":
+        index.compact(args.nlist)
+    stats = index.describe_index_stats()
+    print(f"Vector index at {args.index_dir} ({os.path.basename(current_generation(args.index_dir) or 'no base')})")
+    print(f"Vectors: {stats['total_vector_count']} ({stats['dimension']} dimensions)")
+    print(f"IVF lists: {stats['lists']}, probed per query: {index.nprobe}")
+    print(f"Pending writes: {stats['pending_writes']}")
+    index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
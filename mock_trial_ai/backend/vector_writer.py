@@ -0,0 +1,112 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from rate_limiter import get_limiter
+
+# Pinecone accepts up to 1000 vectors or 2 MB per upsert; 100 per request is its recommendation
+PINECONE_UPSERT_BATCH = int(os.getenv('PINECONE_UPSERT_BATCH', 100))
+PINECONE_UPSERT_MAX_BYTES = int(os.getenv('PINECONE_UPSERT_MAX_BYTES', 2 * 1024 * 1024))
+PINECONE_UPSERT_WORKERS = int(os.getenv('PINECONE_UPSERT_WORKERS', 4))
+
+def content_hash(text: str, *settings) -> str:
+    """Hash of a document and the embedding settings that shaped its vectors"""
+    digest = hashlib.sha256(text.encode('utf-8'))
+    for setting in settings:
+        digest.update(b'\0' + str(setting).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def vector_ids(document_id: int, digest: str, count: int, chunked: bool) -> List[str]:
+    """Stable ids: the same document content always maps to the same vector ids"""
+    base = f"doc_{document_id}_{digest}"
+    return [f"{base}_chunk_{chunk}" for chunk in range(count)] if chunked else [base]
+
+def call_index(index, method: str, *args, **kwargs):
+    """index.<method>(...), through the Pinecone rate limiter unless the index is in-process"""
+    func = getattr(index, method)
+    if not getattr(index, 'rate_limited', True):
+        return func(*args, **kwargs)
+    return get_limiter('pinecone').call(func, *args, **kwargs)
+
+def _request_bytes(vector: Dict) -> int:
+    """Approximate size of one vector in an upsert request body"""
+    return len(vector['id']) + len(json.dumps(vector.get('metadata', {}))) + 12 * len(vector['values'])
+
+class VectorWriteBuffer:
+    """Collects vectors and upserts them in batches bounded by count and request size.
+    Full batches are sent concurrently (through the Pinecone rate limiter) while more are added;
+    flush() sends the rest and waits, raising the first failure."""
+    def __init__(self, index, batch_size: int = PINECONE_UPSERT_BATCH,
+                 max_bytes: int = PINECONE_UPSERT_MAX_BYTES, max_workers: int = PINECONE_UPSERT_WORKERS):
+        self.index = index
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.pending = []
+        self.pending_bytes = 0
+        self.futures = []
+        self.written = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _upsert(self, batch: List[Dict]):
+        call_index(self.index, 'upsert', vectors=batch)
+        with self._lock:
+            self.written += len(batch)
+
+    def _send(self):
+        if self.pending:
+            self.futures.append(self._executor.submit(self._upsert, self.pending))
+            self.pending = []
+            self.pending_bytes = 0
+
+    def add(self, vector: Dict):
+        size = _request_bytes(vector)
+        if self.pending and (len(self.pending) >= self.batch_size or self.pending_bytes + size > self.max_bytes):
+            self._send()
+        self.pending.append(vector)
+        self.pending_bytes += size
+
+    def delete(self, ids: List[str]):
+        """Remove vectors written for an earlier version of a document"""
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            self.futures.append(self._executor.submit(call_index, self.index, 'delete', ids=batch))
+
+    def flush(self) -> int:
+        """Send what is buffered and wait for every request; returns vectors written so far"""
+        self._send()
+        futures, self.futures = self.futures, []
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return self.written
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if exc[0] is None:
+                self.flush()
+        finally:
+            self.close()
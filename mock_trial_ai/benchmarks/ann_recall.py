@@ -0,0 +1,111 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(current_dir), 'backend')
+sys.path.append(backend_dir)
+from similarity import normalize_rows, top_k_similar
+from vector_index import LocalVectorIndex
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Stand-in for document embeddings: points scattered around topic centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    return (centres[rng.integers(0, clusters, count)] + 0.5 * rng.normal(size=(count, dim))).astype(np.float32)
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))] if ordered else 0.0
+
+def measure(search, queries: np.ndarray, exact: List[set], top_k: int) -> Dict:
+    """Recall@k against brute force, and per-query latency"""
+    latencies = []
+    recall = 0.0
+    for query, truth in zip(queries, exact):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        recall += len(truth & set(found)) / max(1, len(truth))
+    return {
+        "recall": recall / len(queries),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "queries_per_s": len(latencies) / sum(latencies) if sum(latencies) else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the local IVF vector index against brute force")
+    parser.add_argument("--vectors", help=".npy matrix of real embeddings (default: synthetic clustered vectors)")
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0: about sqrt(rows))")
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[1, 4, 8, 16, 32])
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = clustered_vectors(args.count, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus rows, like a new document close to stored ones
+    queries = vectors[rng.choice(len(vectors), args.queries)]
+    queries = queries + 0.1 * queries.std() * rng.normal(size=queries.shape).astype(np.float32)
+    ids = [str(row) for row in range(len(vectors))]
+
+    normalized = normalize_rows(vectors)
+    exact = [{ids[row] for row in top_k_similar(query, normalized, args.top_k)[0]} for query in queries]
+
+    results = []
+    brute = measure(lambda query: [ids[row] for row in top_k_similar(query, normalized, args.top_k)[0]],
+                    queries, exact, args.top_k)
+    results.append({"method": "brute_force", "nprobe": None, **brute})
+    print(f"{'brute force':14s} recall {brute['recall']:.3f}  p50 {brute['p50_ms']:7.2f} ms  p95 {brute['p95_ms']:7.2f} ms")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        LocalVectorIndex.build(index_dir, ids, vectors, [{} for _ in ids], args.nlist)
+        build_seconds = time.perf_counter() - start
+        index = LocalVectorIndex(index_dir)
+        nlist = index.describe_index_stats()["lists"]
+        print(f"Built {nlist} IVF lists over {len(ids)} vectors in {build_seconds:.1f}s")
+        for nprobe in args.nprobe:
+            result = measure(lambda query, index=index, nprobe=nprobe:
+                             [match["id"] for match in
+                              index.query(vector=query, top_k=args.top_k, nprobe=nprobe)["matches"]],
+                             queries, exact, args.top_k)
+            results.append({"method": "ivf", "nlist": nlist, "nprobe": nprobe, **result})
+            print(f"{'ivf nprobe ' + str(nprobe):14s} recall {result['recall']:.3f}  p50 {result['p50_ms']:7.2f} ms  "
+                  f"p95 {result['p95_ms']:7.2f} ms")
+        index.close()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"measured_at": datetime.now().isoformat(), "python": sys.version.split()[0],
+                       "rows": len(ids), "dim": int(vectors.shape[1]), "top_k": args.top_k,
+                       "build_seconds": build_seconds, "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+from typing import Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.join(os.path.dirname(current_dir), 'backend')
+sys.path.append(backend_dir)
+from embedding_backends import LegalBertEmbeddingBackend, OpenAIEmbeddingBackend
+
+# Stand-in corpus when --texts is not given: reference-case style records of varied length
+SAMPLE_SENTENCES = [
+    "The plaintiff alleges infringement of claims 1 through 14 of the patent-in-suit.",
+    "Defendant moved for summary judgment of non-infringement under the doctrine of equivalents.",
+    "The court construed the term 'data processing module' according to its plain and ordinary meaning.",
+    "Expert testimony established that the accused source code shared substantial structural similarity.",
+    "The jury awarded reasonable royalty damages based on a hypothetical negotiation at the time of first infringement.",
+    "Prior art references were found not to anticipate the asserted claims.",
+    "The preliminary injunction was denied for failure to show irreparable harm.",
+    "Willfulness was supported by evidence that the defendant knew of the patent before the suit."
+]
+
+def sample_texts(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(SAMPLE_SENTENCES) for _ in range(rng.randint(2, 24))) for _ in range(count)]
+
+def load_texts(path: str, count: int) -> List[str]:
+    """One text per line, or JSON lines with a case_text field"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    texts = [json.loads(line)["case_text"] if line.startswith('{') else line for line in lines]
+    return texts[:count]
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
+
+def measure(backend, texts: List[str], warmup: int) -> Dict:
+    """texts/sec for one configuration, after a warmup batch that loads the model"""
+    start = time.perf_counter()
+    backend.embed_batch(texts[:max(1, warmup)])
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = backend.embed(texts)
+    seconds = time.perf_counter() - start
+    return {
+        "texts": len(texts),
+        "seconds": seconds,
+        "texts_per_second": len(texts) / seconds if seconds else 0.0,
+        "warmup_seconds": load_seconds,
+        "dimensions": len(vectors[0]) if vectors else 0,
+        "vectors": vectors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput (texts/sec) per backend and configuration")
+    parser.add_argument("--backends", nargs="+", choices=["legalbert", "openai"], default=["legalbert"],
+                        help="openai makes billed API calls")
+    parser.add_argument("--texts", help="file with one text per line (or JSON lines with case_text)")
+    parser.add_argument("--count", type=int, default=256)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 16, 32])
+    parser.add_argument("--threads", nargs="+", type=int, default=[0],
+                        help="torch intra-op threads to try; 0 keeps the default")
+    parser.add_argument("--int8", choices=["off", "on", "both"], default="both",
+                        help="int8 dynamic quantization of the LegalBERT linear layers")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts, args.count) if args.texts else sample_texts(args.count)
+    results = []
+
+    if "legalbert" in args.backends:
+        import torch
+        default_threads = torch.get_num_threads()
+        quantize_options = {"off": [False], "on": [True], "both": [False, True]}[args.int8]
+        for threads in args.threads:
+            for quantize in quantize_options:
+                # One backend per model variant; batch size only changes how texts are grouped
+                backend = LegalBertEmbeddingBackend(num_threads=threads or default_threads, quantize=quantize)
+                for batch_size in args.batch_sizes:
+                    backend.batch_size = batch_size
+                    result = measure(backend, texts, args.warmup)
+                    results.append({"backend": backend.model, "batch_size": batch_size,
+                                     "threads": threads or default_threads, "int8": quantize, **result})
+                    print(f"{backend.model:40s} batch {batch_size:3d} threads {threads or default_threads:2d}: "
+                          f"{result['texts_per_second']:8.1f} texts/sec")
+
+    if "openai" in args.backends:
+        backend = OpenAIEmbeddingBackend()
+        result = measure(backend, texts, args.warmup)
+        results.append({"backend": backend.model, "batch_size": None, "threads": None, "int8": False, **result})
+        print(f"{backend.model:40s} {result['texts_per_second']:8.1f} texts/sec")
+
+    # How far int8 vectors drift from fp32 for the same texts
+    for result in results:
+        if result["int8"]:
+            reference = next((other for other in results if not other["int8"] and other["backend"] != result["backend"]
+                              and other["backend"].startswith(result["backend"].split(':')[0])), None)
+            if reference:
+                similarities = [_cosine(a, b) for a, b in zip(result["vectors"], reference["vectors"])]
+                result["cosine_vs_fp32"] = sum(similarities) / len(similarities)
+    for result in results:
+        result.pop("vectors")
+    if any("cosine_vs_fp32" in result for result in results):
+        print(f"int8 vs fp32 mean cosine similarity: "
+              f"{min(result['cosine_vs_fp32'] for result in results if 'cosine_vs_fp32' in result):.4f} (worst)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"measured_at": datetime.now().isoformat(), "python": sys.version.split()[0],
+                       "count": len(texts), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(current_dir)
+
+# name -> (script, directory put on sys.path the way its launcher does)
+TARGETS = {
+    "frontend": (os.path.join(project_dir, 'frontend', 'app.py'), os.path.join(project_dir, 'frontend')),
+    "cli": (os.path.join(project_dir, 'backend', 'mock_trial_analysis.py'), os.path.join(project_dir, 'backend'))
+}
+
+# Runs in a fresh interpreter: executes the script's module body (imports, module-level
+# clients) without its __main__ block
+PROBE = """
+import json, runpy, sys, time
+sys.path.insert(0, {path_dir!r})
+start = time.perf_counter()
+runpy.run_path({script!r}, run_name='import_time_probe')
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": len(sys.modules)}}))
+"""
+
+def _run_probe(script: str, path_dir: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+              ['-c', PROBE.format(script=script, path_dir=path_dir)]
+    return subprocess.run(command, capture_output=True, text=True, cwd=path_dir)
+
+def _slowest_imports(importtime_log: str, count: int = 10) -> List[Dict]:
+    """Top-level imports by cumulative time, parsed from -X importtime output"""
+    imports = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:]
+        # Nested imports are indented under the module that triggered them
+        if name.startswith(' '):
+            continue
+        imports.append({"module": name, "cumulative_ms": int(fields[1]) / 1000})
+    return sorted(imports, key=lambda entry: entry["cumulative_ms"], reverse=True)[:count]
+
+def measure(name: str, repeat: int) -> Dict:
+    """Cold-start a target repeat times, each in a new interpreter"""
+    script, path_dir = TARGETS[name]
+    runs = []
+    modules = None
+    for _ in range(repeat):
+        completed = _run_probe(script, path_dir)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "probe failed"}
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs.append(probe["seconds"])
+        modules = probe["modules"]
+    return {
+        "median_s": statistics.median(runs),
+        "min_s": min(runs),
+        "max_s": max(runs),
+        "runs": runs,
+        "modules": modules,
+        "slowest_imports": _slowest_imports(_run_probe(script, path_dir, importtime=True).stderr)
+    }
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=project_dir).stdout.strip()
+    except OSError:
+        return ""
+
+def print_report(report: Dict, baseline: Dict = None):
+    for name, result in report["results"].items():
+        if "error" in result:
+            print(f"{name}: could not import ({result['error']})")
+            continue
+        line = f"{name}: median {result['median_s'] * 1000:.0f} ms (min {result['min_s'] * 1000:.0f}, " \
+               f"max {result['max_s'] * 1000:.0f}), {result['modules']} modules"
+        before = (baseline or {}).get("results", {}).get(name, {})
+        if "median_s" in before:
+            change = result["median_s"] - before["median_s"]
+            line += f" | baseline {before['median_s'] * 1000:.0f} ms ({baseline.get('git_rev') or 'baseline'}), " \
+                    f"{change * 1000:+.0f} ms ({change / before['median_s']:+.0%})"
+        print(line)
+        for entry in result["slowest_imports"][:5]:
+            print(f"    {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the Streamlit app and the CLI")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON (e.g. before.json on the old revision)")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "git_rev": _git_revision(),
+        "python": sys.version.split()[0],
+        "measured_at": datetime.now().isoformat(),
+        "repeat": args.repeat,
+        "results": {name: measure(name, args.repeat) for name in args.targets}
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
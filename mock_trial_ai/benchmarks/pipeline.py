@@ -0,0 +1,347 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(current_dir)
+backend_dir = os.path.join(project_dir, 'backend')
+sys.path.append(backend_dir)
+
+STAGES = ["latest_document", "rank_cases", "generate_trial_scenario", "chat_followup",
+          "cost_estimator", "analyze_case"]
+
+COST_QUERY = """
+    SELECT data FROM mock_cases
+    WHERE data->>'case_name' ILIKE '%TechInnovate%DataCorp%'
+"""
+FOLLOW_UP_QUESTIONS = [
+    "JUDGE: What are your thoughts on the preliminary injunction?",
+    "OPPOSING: How would you attack the damages estimate?",
+    "EXPERT: How strong is the source code similarity evidence?",
+    "SUGGESTIONS: Which legal areas have we not explored?"
+]
+
+class SkipStage(Exception):
+    """A stage whose dependencies are not available here"""
+
+def _rss_bytes() -> int:
+    """Current resident set size"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        # Lifetime peak where /proc is unavailable (kilobytes on Linux, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class RssSampler(threading.Thread):
+    """Tracks peak RSS while a stage runs"""
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.start_rss = _rss_bytes()
+        self.peak = self.start_rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def stop(self) -> Dict:
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, _rss_bytes())
+        return {"peak_rss_mb": self.peak / 2 ** 20, "rss_growth_mb": (self.peak - self.start_rss) / 2 ** 20}
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))]
+
+def run_stage(func: Callable[[int], object], iterations: int, warmup: int, concurrency: int) -> Dict:
+    """Call func(i) iterations times across concurrency threads after warmup calls"""
+    for i in range(warmup):
+        func(i)
+
+    def timed(i: int):
+        start = time.perf_counter()
+        try:
+            func(i)
+            return time.perf_counter() - start, None
+        except SkipStage:
+            # Missing dependencies skip the stage, even when there was no warmup call to find them
+            raise
+        except Exception as e:
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(timed, range(iterations)))
+    finally:
+        wall = time.perf_counter() - start
+        memory = sampler.stop()
+
+    latencies = [seconds for seconds, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+        "throughput_per_s": len(latencies) / wall if wall else 0.0,
+        "wall_seconds": wall,
+        **memory
+    }
+
+class Pipeline:
+    """Stage callables over the seeded benchmark database"""
+    def __init__(self, db_config: Dict, legalbert_path: str = None):
+        import mock_trial_analysis
+        import mocktrialanalyzer
+        # Point every analyzer at the benchmark database before any pool is created
+        mock_trial_analysis.DB_CONFIG.update(db_config)
+        mocktrialanalyzer.DB_CONFIG.update(db_config)
+        self.db_config = db_config
+        self.legalbert_path = legalbert_path
+        from mock_trial_analysis import MockTrialAnalyzer
+        # One analyzer shared by every thread, as in the Streamlit app
+        self.analyzer = analyzer = MockTrialAnalyzer()
+        with analyzer.connection() as db:
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT mc.id, mc.patent_number, mc.filing_date, mc.case_name, mc.data
+                FROM mock_cases mc
+                WHERE EXISTS (SELECT 1 FROM case_documents cd WHERE cd.case_id = mc.id)
+                ORDER BY mc.id
+            """)
+            self.cases = [dict(zip(("id", "patent_number", "filing_date", "case_name", "data"), row))
+                          for row in cursor.fetchall()]
+            cursor.close()
+        if not self.cases:
+            raise SystemExit("Benchmark database has no mock cases with documents; run seed_db.py (or --seed)")
+        self.references = analyzer._get_reference_cases(docket_numbers=None)
+        self.chat = None
+        self._chat_lock = threading.Lock()
+
+    def _case(self, i: int) -> Dict:
+        return self.cases[i % len(self.cases)]
+
+    def latest_document(self, i: int):
+        if not self.analyzer.get_latest_document(self._case(i)["id"]):
+            raise ValueError("no expert findings")
+
+    def rank_cases(self, i: int):
+        # Whole reference corpus, not just the three precedent dockets, so ranking has real work
+        if not self.analyzer._rank_cases(json.dumps(self._case(i)["data"], indent=2), self.references):
+            raise ValueError("ranking returned no cases")
+
+    def generate_trial_scenario(self, i: int) -> Dict:
+        case = self._case(i)
+        analyzer = self.analyzer
+        cases = analyzer.case_repository()
+        cases.mark_in_progress(case["patent_number"], case["filing_date"], case["case_name"])
+        # force_regenerate so every iteration goes through the (stubbed) model, not the analysis cache
+        results = analyzer.generate_trial_scenario(
+            patent_number=case["patent_number"],
+            filing_date=case["filing_date"],
+            case_name=case["case_name"],
+            stream=True,
+            force_regenerate=True,
+            cases=cases
+        )
+        for _ in results.pop("mock_trial_analysis_stream"):
+            pass
+        return results
+
+    def prepare_chat_followup(self):
+        """The analysis every follow-up turn asks about; run once, before the stage is timed"""
+        from chat_context import ChatContext
+        with self._chat_lock:
+            if self.chat is None:
+                results = self.generate_trial_scenario(0)
+                self.chat = (results, ChatContext(results["mock_trial_analysis"], results["expert_document"]))
+        return self.chat
+
+    def chat_followup(self, i: int):
+        """One follow-up turn as the CLI runs it: compact context, streamed answer, saved turn"""
+        results, chat_context = self.chat or self.prepare_chat_followup()
+        analyzer = self.analyzer
+        role, question = FOLLOW_UP_QUESTIONS[i % len(FOLLOW_UP_QUESTIONS)].split(":", 1)
+        prompt = f"""
+            Based on the previous mock trial analysis of {self._case(0)['case_name']}:
+
+            {role} PERSPECTIVE:
+            Question: {question.strip()}
+
+            {chat_context.build(question)}
+            """
+
+        def complete(answer: str, metrics: Dict):
+            analyzer._save_analysis(results['case_id'], question.strip(), answer, 'chat')
+            chat_context.record_turn(question, answer, role, prompt, metrics["input_tokens"])
+
+        for _ in analyzer.stream_claude(
+            on_complete=complete,
+            model="claude-3-opus-20240229",
+            max_tokens=4000,
+            temperature=0.5,
+            system=f"You are an expert {role.lower()} analyzing this mock trial case.",
+            messages=[{"role": "user", "content": prompt}]
+        ):
+            pass
+
+    def cost_estimator(self, i: int):
+        from cost_estimator import DatabaseConfig, ImprovedMockTrialCostEstimator
+        if not hasattr(self, '_estimator'):
+            config = DatabaseConfig(host=self.db_config["host"], port=int(self.db_config["port"]),
+                                    dbname=self.db_config["dbname"], user=self.db_config["user"],
+                                    password=self.db_config["password"])
+            self._estimator = ImprovedMockTrialCostEstimator(config)
+        self._estimator.estimate_query_costs(COST_QUERY)
+
+    def analyze_case(self, i: int):
+        """LegalBERT document analysis; needs torch, the fine-tuned model and MongoDB"""
+        if not hasattr(self, '_bert_analyzer'):
+            for package in ('torch', 'transformers'):
+                if importlib.util.find_spec(package) is None:
+                    raise SkipStage(f"{package} is not installed")
+            from mocktrialanalyzer import MockTrialAnalyzer as LegalBertAnalyzer
+            analyzer = LegalBertAnalyzer()
+            if self.legalbert_path:
+                analyzer.model_path = self.legalbert_path
+            if not os.path.isdir(analyzer.model_path):
+                raise SkipStage(f"fine-tuned model not found at {analyzer.model_path} (use --legalbert-path)")
+            self._bert_analyzer = analyzer
+        if not self._bert_analyzer.analyze_case(self._case(i)["id"]):
+            raise ValueError("analyze_case returned no result")
+
+    def release_cases(self):
+        with self.analyzer.connection() as db:
+            cursor = db.cursor()
+            cursor.execute("UPDATE mock_cases SET analysis_in_progress = 0")
+            db.commit()
+            cursor.close()
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=project_dir).stdout.strip()
+    except OSError:
+        return ""
+
+def print_report(report: Dict, baseline: Dict = None):
+    print(f"{'stage':26s} {'p50 ms':>9s} {'p95 ms':>9s} {'ops/s':>8s} {'peak MB':>8s} {'errors':>6s}")
+    for name, result in report["stages"].items():
+        if "skipped" in result:
+            print(f"{name:26s} skipped: {result['skipped']}")
+            continue
+        line = f"{name:26s} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['throughput_per_s']:8.2f} " \
+               f"{result['peak_rss_mb']:8.1f} {result['errors']:6d}"
+        before = (baseline or {}).get("stages", {}).get(name, {})
+        if before.get("p50_ms"):
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"]
+            line += f"  p50 {change:+.0%} vs {baseline.get('git_rev') or 'baseline'}"
+        print(line)
+        if result["first_error"]:
+            print(f"    first error: {result['first_error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against the seeded database "
+                                                 "with stubbed LLM, embedding and Pinecone services")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--service-mode", choices=["stub", "replay"], default="stub",
+                        help="replay serves responses recorded with SERVICE_MODE=record")
+    parser.add_argument("--latency", default="none",
+                        help="service latency: none, recorded, or fixed seconds per call")
+    parser.add_argument("--seed", action="store_true", help="recreate and seed the benchmark database first")
+    parser.add_argument("--legalbert-path", help="fine-tuned LegalBERT directory for analyze_case")
+    parser.add_argument("--output", help="write results as JSON (e.g. one file per commit)")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Service and cache settings are read when the backend modules are imported, so set them first.
+    # Client-side rate limits are lifted: the stubs have no quota and the limiter would dominate timings.
+    os.environ['SERVICE_MODE'] = args.service_mode
+    os.environ['SERVICE_LATENCY'] = args.latency
+    for provider in ("ANTHROPIC", "OPENAI", "PINECONE"):
+        os.environ.setdefault(f"{provider}_REQUESTS_PER_MINUTE", "0")
+        os.environ.setdefault(f"{provider}_TOKENS_PER_MINUTE", "0")
+        os.environ.setdefault(f"{provider}_MAX_CONCURRENCY", "64")
+    scratch = tempfile.mkdtemp(prefix='mock_trial_bench_')
+    # Fresh embedding cache and no offline reference index, so every run starts from the same state
+    os.environ.setdefault('EMBEDDING_CACHE_PATH', os.path.join(scratch, 'embeddings.sqlite3'))
+    os.environ.setdefault('REFERENCE_INDEX_DIR', os.path.join(scratch, 'reference_index'))
+
+    from seed_db import BENCH_DB_CONFIG, seed
+    if args.seed:
+        print(f"Seeded {BENCH_DB_CONFIG['dbname']}: {seed(BENCH_DB_CONFIG)}")
+
+    pipeline = Pipeline(dict(BENCH_DB_CONFIG), args.legalbert_path)
+    report = {
+        "git_rev": _git_revision(),
+        "python": sys.version.split()[0],
+        "measured_at": datetime.now().isoformat(),
+        "config": {"iterations": args.iterations, "warmup": args.warmup, "concurrency": args.concurrency,
+                   "service_mode": args.service_mode, "latency": args.latency,
+                   "mock_cases": len(pipeline.cases), "reference_cases": len(pipeline.references)},
+        "stages": {}
+    }
+    try:
+        for name in args.stages:
+            print(f"Running {name}...")
+            try:
+                # Per-stage setup (prepare_<stage>) is kept out of the timings
+                prepare = getattr(pipeline, f"prepare_{name}", None)
+                if prepare:
+                    prepare()
+                report["stages"][name] = run_stage(getattr(pipeline, name), args.iterations, args.warmup,
+                                                   args.concurrency)
+            except SkipStage as e:
+                report["stages"][name] = {"skipped": str(e)}
+    finally:
+        pipeline.release_cases()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Mock Trial AI Application (LawCourtIQ)
+Copyright (c) 2025 Frank Garcia
+
+This file is part of Mock Trial AI, dual-licensed under:
+- GNU Affero General Public License v3.0 (AGPL-3.0)
+- Commercial License (contact for terms)
+
+See LICENSE and COMMERCIAL_LICENSE for details.
+"""
+import os
+import re
+import sys
+import json
+import random
+import argparse
+from datetime import datetime
+from typing import Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(current_dir)
+backend_dir = os.path.join(project_dir, 'backend')
+sys.path.append(backend_dir)
+import psycopg2
+from document_sections import extract_sections
+
+MOCK_DOCS_DIR = os.path.join(project_dir, 'mock_docs')
+SAMPLE_FILES = {
+    "main_cases": os.path.join(backend_dir, 'main_cases', 'main_cases.json'),
+    "docket_cases": os.path.join(backend_dir, 'docket_cases', 'docket_cases.json'),
+    "cluster_cases": os.path.join(backend_dir, 'cluster_cases', 'cluster_cases.json')
+}
+
+# Benchmark database; never the application database
+BENCH_DB_CONFIG = {
+    "dbname": os.getenv('BENCH_DB_NAME', 'mock_trial_bench'),
+    "user": os.getenv('BENCH_DB_USER', 'postgres'),
+    "password": os.getenv('BENCH_DB_PASSWORD', ''),
+    "host": os.getenv('BENCH_DB_HOST', 'localhost'),
+    "port": os.getenv('BENCH_DB_PORT', '5432')
+}
+
+# Tables as they exist before the alembic migrations, which are applied on top
+BASE_SCHEMA = """
+    CREATE TABLE mock_cases (
+        id SERIAL PRIMARY KEY,
+        data JSONB NOT NULL,
+        analysis_in_progress INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE main_cases (id SERIAL PRIMARY KEY, data JSONB NOT NULL);
+    CREATE TABLE docket_cases (id SERIAL PRIMARY KEY, data JSONB NOT NULL);
+    CREATE TABLE cluster_cases (id SERIAL PRIMARY KEY, data JSONB NOT NULL);
+    CREATE TABLE case_opinions (
+        id SERIAL PRIMARY KEY,
+        case_name TEXT,
+        type TEXT,
+        snippet TEXT,
+        citation_ids TEXT[],
+        author_id INTEGER,
+        per_curiam BOOLEAN
+    );
+    CREATE TABLE case_documents (
+        id SERIAL PRIMARY KEY,
+        case_id INTEGER REFERENCES mock_cases(id),
+        filename TEXT,
+        file_content BYTEA,
+        file_type TEXT,
+        extracted_text TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    CREATE TABLE trial_analysis (
+        id SERIAL PRIMARY KEY,
+        case_id INTEGER,
+        analysis_type TEXT,
+        question TEXT,
+        analysis TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        entry_type TEXT
+    );
+    CREATE TABLE analysis_questions (
+        id SERIAL PRIMARY KEY,
+        question_text TEXT NOT NULL,
+        question_type TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+"""
+
+INITIAL_QUESTION = ("Conduct a mock trial analysis of {case_name}: assess infringement, validity, "
+                    "damages and the strongest arguments for each side.")
+
+COURTS = ["District Court, N.D. Illinois", "Court of Appeals for the Federal Circuit",
+          "District Court, S.D. California", "District Court, E.D. Texas", "District Court, D. Delaware"]
+JUDGES = ["Rebecca R. Pallmeyer", "Randall R. Rader", "Rudi M. Brewster", "Rodney Gilstrap", "Leonard P. Stark"]
+PARTIES = ["Acme Analytics", "Nimbus Data", "Vertex Systems", "Orion Software", "Helix Labs", "Quantum Logic",
+           "Summit Networks", "Cobalt AI", "Pioneer Devices", "Atlas Robotics"]
+
+def _sample_records(path: str) -> List[Dict]:
+    """Records from a sample export; the shipped files are placeholders without any"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if isinstance(data, dict):
+        data = data.get("results", [])
+    return [record for record in data if isinstance(record, dict)]
+
+def synthetic_reference_cases(count: int, docket_numbers: List[str], seed: int = 0) -> Dict[str, List[Dict]]:
+    """main/docket/cluster rows shaped like the CourtListener exports, covering the reference dockets"""
+    rng = random.Random(seed)
+    main, dockets, clusters = [], [], []
+    for i in range(count):
+        docket_id = str(100000 + i)
+        plaintiff, defendant = rng.sample(PARTIES, 2)
+        case_name = f"{plaintiff} v. {defendant}"
+        court_index = rng.randrange(len(COURTS))
+        filed = f"{rng.randint(1998, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        docket_number = docket_numbers[i] if i < len(docket_numbers) else f"{rng.randint(1, 20):02d}-cv-{rng.randint(1000, 9999)}"
+        main.append({
+            "docket_id": docket_id,
+            "docketNumber": docket_number,
+            "caseName": case_name,
+            "caseNameFull": f"{plaintiff}, Inc. v. {defendant} Corporation",
+            "court": COURTS[court_index],
+            "dateFiled": filed,
+            "judge": JUDGES[court_index],
+            "status": rng.choice(["Published", "Unpublished"]),
+            "suitNature": "830 Patent"
+        })
+        dockets.append({"id": docket_id, "case_name": case_name, "court": COURTS[court_index],
+                        "docket_number": docket_number})
+        clusters.append({"docket_id": docket_id, "case_name_full": main[-1]["caseNameFull"],
+                         "judges": JUDGES[court_index], "precedential_status": main[-1]["status"],
+                         "summary": f"Patent infringement dispute between {plaintiff} and {defendant}."})
+    return {"main_cases": main, "docket_cases": dockets, "cluster_cases": clusters}
+
+def _docx_text(path: str) -> str:
+    import docx
+    return '\n'.join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+def mock_documents() -> Dict[str, List[Dict]]:
+    """mock_docs reports grouped by their docket id (mock_003, ...)"""
+    documents = {}
+    for filename in sorted(os.listdir(MOCK_DOCS_DIR)):
+        match = re.match(r'(mock_\d+)_', filename)
+        if not match or not filename.endswith('.docx'):
+            continue
+        path = os.path.join(MOCK_DOCS_DIR, filename)
+        with open(path, 'rb') as f:
+            content = f.read()
+        documents.setdefault(match.group(1), []).append({
+            "filename": filename,
+            "file_content": content,
+            "extracted_text": _docx_text(path)
+        })
+    return documents
+
+def _field(text: str, pattern: str, default: str) -> str:
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else default
+
+def mock_case_data(docket_id: str, documents: List[Dict], rng: random.Random) -> Dict:
+    """mock_cases.data in the shape CaseInputComponent stores, taken from the case's reports"""
+    text = '\n'.join(document["extracted_text"] for document in documents)
+    case_name = _field(text, r'Case Title:\s*(.+?)(?:Docket ID:|\n)', f"Mock Plaintiff v Mock Defendant ({docket_id})")
+    filed = _field(text, r'Filing Date:\s*(.+?)(?:Prepared By:|\n)', "")
+    try:
+        filing_date = datetime.strptime(filed, "%B %d, %Y").strftime("%Y-%m-%d")
+    except ValueError:
+        filing_date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    patent_number = _field(text, r'Patent No\.\s*([A-Z]{0,2}\d[\d,]*)', f"US{rng.randint(10000000, 99999999)}")
+    return {
+        "court": "district court",
+        "case_name": case_name,
+        "case_type": "Patent Infringement",
+        "case_subject": "Software",
+        "docket_id": docket_id,
+        "details": {
+            "filing_date": filing_date,
+            "representing": "Plaintiff",
+            "patent_number": patent_number,
+            "technology": "Machine Learning/AI",
+            "damages_sought": rng.randint(1, 100) * 1000000,
+            "claims_at_issue": [f"Claim {i}" for i in range(1, rng.randint(2, 6))],
+            "plaintiff": {"business_type": "Startup", "annual_revenue": rng.randint(1, 50) * 1000000,
+                          "tech_usage": "Core product", "licensing_history": "None"},
+            "defendant": {"product_name": "Competing Suite", "product_revenue": rng.randint(1, 500) * 1000000,
+                          "tech_usage": "Core product", "market_share": rng.randint(1, 40)},
+            "technical_evidence": {"source_code": True, "documentation": True, "expert_reports": True}
+        }
+    }
+
+def _run_migrations(db_config: Dict):
+    """alembic upgrade head against the benchmark database (env.py reads DATABASE_URL)"""
+    from alembic import command
+    from alembic.config import Config
+    config = Config(os.path.join(backend_dir, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(backend_dir, 'alembic'))
+    os.environ['DATABASE_URL'] = (f"postgresql://{db_config['user']}:{db_config['password']}@{db_config['host']}:"
+                                  f"{db_config['port']}/{db_config['dbname']}")
+    command.upgrade(config, 'head')
+
+def recreate_database(db_config: Dict):
+    admin = psycopg2.connect(**{**db_config, "dbname": "postgres"})
+    admin.autocommit = True
+    cursor = admin.cursor()
+    cursor.execute(f'DROP DATABASE IF EXISTS "{db_config["dbname"]}"')
+    cursor.execute(f'CREATE DATABASE "{db_config["dbname"]}"')
+    cursor.close()
+    admin.close()
+
+def seed(db_config: Dict = BENCH_DB_CONFIG, reference_cases: int = 200, extra_mock_cases: int = 0,
+         seed_value: int = 0) -> Dict:
+    """Recreate the benchmark database, migrate it and load the sample data. Returns row counts."""
+    from mock_trial_analysis import REFERENCE_DOCKET_NUMBERS
+    rng = random.Random(seed_value)
+    recreate_database(db_config)
+    db = psycopg2.connect(**db_config)
+    cursor = db.cursor()
+    cursor.execute(BASE_SCHEMA)
+    db.commit()
+    _run_migrations(db_config)
+
+    references = {table: _sample_records(path) for table, path in SAMPLE_FILES.items()}
+    if not all(references.values()):
+        references = synthetic_reference_cases(reference_cases, REFERENCE_DOCKET_NUMBERS, seed_value)
+    for table, records in references.items():
+        cursor.executemany(f"INSERT INTO {table} (data) VALUES (%s)", [(json.dumps(record),) for record in records])
+    cursor.executemany(
+        "INSERT INTO case_opinions (case_name, type, snippet) VALUES (%s, 'combined-opinion', %s)",
+        [(record["caseName"], f"Opinion in {record['caseName']}") for record in references["main_cases"][:50]]
+    )
+
+    documents = mock_documents()
+    cases = 0
+    for docket_id in list(documents) + [f"mock_bench_{i:03d}" for i in range(extra_mock_cases)]:
+        case_documents = documents.get(docket_id, [])
+        cursor.execute("INSERT INTO mock_cases (data, analysis_in_progress) VALUES (%s, 0) RETURNING id",
+                       (json.dumps(mock_case_data(docket_id, case_documents, rng)),))
+        case_id = cursor.fetchone()[0]
+        cases += 1
+        for document in case_documents:
+            cursor.execute("""
+                INSERT INTO case_documents (case_id, filename, file_content, file_type, extracted_text, sections)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (case_id, document["filename"], psycopg2.Binary(document["file_content"]),
+                  'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                  document["extracted_text"], json.dumps(extract_sections(document["extracted_text"]))))
+    cursor.execute("INSERT INTO analysis_questions (question_text, question_type) VALUES (%s, 'initial')",
+                   (INITIAL_QUESTION,))
+    db.commit()
+
+    cursor.execute("REFRESH MATERIALIZED VIEW reference_cases_mv")
+    db.commit()
+    db.autocommit = True
+    cursor.execute("ANALYZE")
+    cursor.close()
+    db.close()
+    counts = {table: len(records) for table, records in references.items()}
+    counts.update({"mock_cases": cases, "case_documents": sum(len(docs) for docs in documents.values())})
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and seed the benchmark database (BENCH_DB_* settings)")
+    parser.add_argument("--reference-cases", type=int, default=200,
+                        help="synthetic reference cases when backend/*_cases.json hold no records")
+    parser.add_argument("--extra-mock-cases", type=int, default=0,
+                        help="mock cases without documents, beyond one per mock_docs case")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = seed(BENCH_DB_CONFIG, args.reference_cases, args.extra_mock_cases, args.seed)
+    print(f"Seeded {BENCH_DB_CONFIG['dbname']}: {counts}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,13 +14,16 @@ import json
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 backend_dir = os.path.join(os.path.dirname(current_dir), 'backend')
 sys.path.append(backend_dir)
-from mock_trial_analysis import MockTrialAnalyzer
+from utils.connection import get_analyzer
 import streamlit as st
 import time
 
+# How often a waiting session re-reads its analysis job
+ANALYSIS_POLL_SECONDS = float(os.getenv('ANALYSIS_POLL_SECONDS', 2))
+
 class AnalysisComponent:
     def __init__(self):
-        self.analyzer = MockTrialAnalyzer()
+        self.analyzer = get_analyzer()
         #ADDED (B) FOR ANALYSIS PERSISTENCE
         if 'case_id' not in st.session_state:
             st.session_state.case_id = None
@@ -36,17 +39,18 @@ class AnalysisComponent:
         #ADDED FOR ANALYSIS PERSISTENCE
         if st.session_state.case_id:
             try:
-                cursor = self.analyzer.db.cursor()                
-                cursor.execute("""                        
-                        SELECT analysis, entry_type
-                        FROM trial_analysis
-                        WHERE case_id = %s
-                        AND entry_type = 'analysis'
-                        ORDER BY created_at DESC
-                        LIMIT 1                        
-                """, (st.session_state.case_id,))
-                existing_analysis = cursor.fetchone()
-                cursor.close()
+                with self.analyzer.connection() as db:
+                    cursor = db.cursor()                
+                    cursor.execute("""                        
+                            SELECT analysis, entry_type
+                            FROM trial_analysis
+                            WHERE case_id = %s
+                            AND entry_type = 'analysis'
+                            ORDER BY created_at DESC
+                            LIMIT 1                        
+                    """, (st.session_state.case_id,))
+                    existing_analysis = cursor.fetchone()
+                    cursor.close()
 
                 if existing_analysis:                    
                     print("Debugging analysis content:", existing_analysis[0][:100])
@@ -63,68 +67,84 @@ class AnalysisComponent:
                 st.error(f"Error loading previous analysis: {str(e)}")
                 print(f"Error details: {e}") 
         
+        force_regenerate = st.checkbox(
+            "Force regenerate",
+            help="Ignore any stored analysis for identical inputs and call the model again"
+        )
         if st.button("Start Analysis", type="primary"):
-            progress = st.progress(0)
-            status = st.empty()
-        
-            for i, phase in enumerate([
-                "Processing Documents",
-                "Finding Similar Cases",
-                "Analyzing Patterns",
-                "Generating Recommendations"
-            ]):
-                status.text(f"Phase {i+1}/4: {phase}")
-                progress.progress((i + 1) * 25)
-                time.sleep(1)
+            try:                    
+                patent_number = st.session_state.analysis_params.get('patent_number')
+                filing_date = st.session_state.analysis_params.get('filing_date')
+                case_name = st.session_state.analysis_params.get('case_name')                    
                 
-            with st.spinner("Analyzing case..."):
-                try:                    
-                    patent_number = st.session_state.analysis_params.get('patent_number')
-                    filing_date = st.session_state.analysis_params.get('filing_date')
-                    case_name = st.session_state.analysis_params.get('case_name')                    
-                    
-                    if not all([patent_number, filing_date, case_name]):
-                        raise ValueError("Missing required parameters")
-                    
-                    # NEW CODE ADDED TO TEST INSERTING NEW CASES                     
-                    cursor = self.analyzer.db.cursor()
-                    cursor.execute("""
-                        UPDATE mock_cases 
-                        SET analysis_in_progress = 1 
-                        WHERE data->'details'->>'patent_number' = %s 
-                        AND data->'details'->>'filing_date' = %s 
-                        AND data->>'case_name' = %s
-                    """, (patent_number, filing_date, case_name))
-                    self.analyzer.db.commit()
-                    cursor.close()
-                    # NEW CODE ADDED TO TEST INSERTING NEW CASES
-                   
-                    case_id = self.analyzer._get_case_id(
-                        patent_number=patent_number,
-                        filing_date=filing_date,
-                        case_name=case_name
-                    )
-                    st.session_state.case_id = case_id                    
-                    
-                    results = self.analyzer.generate_trial_scenario(
-                        patent_number=patent_number,
-                        filing_date=filing_date,
-                        case_name=case_name
-                    )                    
-                   
-                    st.session_state.analysis_results = results
-                    st.session_state.analysis_complete = True
-                    
-                    st.subheader("Similar Cases Found:")
-                    for i, case in enumerate(results["top_similar_cases"], 1):
-                        with st.expander(f"Case {i}: {case['case']['case_text']}"):
-                            st.write(f"Court: {case['case']['court_name']}")
-                            st.write(f"Judge: {case['case']['judge']}")
-                            st.write(f"Filed: {case['case']['filing_date']}")
-                            st.write(f"Similarity: {case['similarity_score']:.2f}")
-                    
-                    st.subheader("Analysis Results:")
-                    st.markdown(results["mock_trial_analysis"])
+                if not all([patent_number, filing_date, case_name]):
+                    raise ValueError("Missing required parameters")
+                
+                # NEW CODE ADDED TO TEST INSERTING NEW CASES                     
+                cases = self.analyzer.case_repository()
+                case = cases.mark_in_progress(patent_number, filing_date, case_name)
+                if not case:
+                    raise ValueError(f"No case found for Patent: {patent_number}, Case: {case_name}")
+                # NEW CODE ADDED TO TEST INSERTING NEW CASES
+               
+                case_id = case["id"]
+                st.session_state.case_id = case_id                    
+                
+                # The analysis runs in analysis_worker.py; this session only polls the job
+                st.session_state.analysis_job_id = self.analyzer.job_queue().submit(
+                    case_id, patent_number, filing_date, case_name, force_regenerate=force_regenerate
+                )
+                st.session_state.analysis_complete = False
+
+            except Exception as e:
+                st.error(f"Error during analysis: {str(e)}")
+
+        if st.session_state.get('analysis_job_id'):
+            self.render_job(st.session_state.analysis_job_id)
+
+    def render_job(self, job_id: int):
+        """Show a submitted analysis job, polling until it finishes"""
+        try:
+            job = self.analyzer.job_queue().get(job_id)
+        except Exception as e:
+            st.error(f"Error checking analysis status: {str(e)}")
+            return
+        if not job:
+            st.session_state.analysis_job_id = None
+            return
+
+        if job["status"] in ("queued", "running"):
+            if job["status"] == "queued":
+                retry_note = f" (retry {job['attempts'] + 1} of {job['max_attempts']})" if job["attempts"] else ""
+                st.info(f"Analysis queued{retry_note}. Waiting for an analysis worker (`python analysis_worker.py`)...")
+            else:
+                st.info(f"Analyzing case (attempt {job['attempts']} of {job['max_attempts']})...")
+            if job["partial_analysis"]:
+                st.subheader("Analysis Results:")
+                st.markdown(job["partial_analysis"])
+            time.sleep(ANALYSIS_POLL_SECONDS)
+            st.rerun()
+
+        if job["status"] == "failed":
+            st.error(f"Error during analysis: {job['error']}")
+            st.session_state.analysis_job_id = None
+            return
+
+        results = job["result"]
+        st.subheader("Similar Cases Found:")
+        for i, case in enumerate(results["top_similar_cases"], 1):
+            with st.expander(f"Case {i}: {case['case']['case_text']}"):
+                st.write(f"Court: {case['case']['court_name']}")
+                st.write(f"Judge: {case['case']['judge']}")
+                st.write(f"Filed: {case['case']['filing_date']}")
+                st.write(f"Similarity: {case['similarity_score']:.2f}")
+
+        # The worker saved the analysis to trial_analysis, so it is already shown above
+        if results["cache_hit"]:
+            st.caption("Loaded stored analysis for identical inputs. "
+                       "Tick 'Force regenerate' to run the model again.")
+        elif "llm_first_token" in results["stage_timings"]:
+            st.caption(f"First token after {results['stage_timings']['llm_first_token']:.1f}s")
 
-                except Exception as e:
-                    st.error(f"Error during analysis: {str(e)}")
+        st.session_state.analysis_results = results
+        st.session_state.analysis_complete = True
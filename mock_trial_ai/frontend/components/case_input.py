@@ -12,8 +12,8 @@ import streamlit as st
 from datetime import datetime
 import json
 from utils.connection import get_analyzer
+from document_sections import extract_sections
 from io import BytesIO
-import docx
 
 class CaseInputComponent:
     def __init__(self):
@@ -35,18 +35,24 @@ class CaseInputComponent:
                 file_content = uploaded_file.read()            
                 
                 if uploaded_file.type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 
+                    import docx  # python-docx pulls in lxml, so load it only for .docx uploads
                     doc = docx.Document(BytesIO(file_content))
                     extracted_text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
                 else:                    
                     extracted_text = file_content.decode('utf-8', errors='ignore')
 
-                cursor = self.analyzer.db.cursor()
-                cursor.execute("""
-                    INSERT INTO case_documents 
-                    (case_id, filename, file_content, file_type, extracted_text)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (case_id, uploaded_file.name, file_content, uploaded_file.type, extracted_text))
-                self.analyzer.db.commit()
+                # Split once here so analyses read the sections instead of re-running the regexes
+                sections = extract_sections(extracted_text)
+                with self.analyzer.connection() as db:
+                    cursor = db.cursor()
+                    cursor.execute("""
+                        INSERT INTO case_documents 
+                        (case_id, filename, file_content, file_type, extracted_text, sections)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (case_id, uploaded_file.name, file_content, uploaded_file.type, extracted_text,
+                          json.dumps(sections)))
+                    db.commit()
+                    cursor.close()
                 return True
             except Exception as e:
                 print(f"Error handling document: {e}")
@@ -56,15 +62,17 @@ class CaseInputComponent:
     def verify_document_upload(self, case_id: int) -> dict:
         """Verify document was uploaded"""
         try:
-            cursor = self.analyzer.db.cursor()
-            cursor.execute("""
-                SELECT id, filename, created_at 
-                FROM case_documents 
-                WHERE case_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            """, (case_id,))
-            result = cursor.fetchone()
+            with self.analyzer.connection() as db:
+                cursor = db.cursor()
+                cursor.execute("""
+                    SELECT id, filename, created_at 
+                    FROM case_documents 
+                    WHERE case_id = %s 
+                    ORDER BY created_at DESC 
+                    LIMIT 1
+                """, (case_id,))
+                result = cursor.fetchone()
+                cursor.close()
             if result:
                 return {
                     "success": True,
@@ -110,19 +118,15 @@ class CaseInputComponent:
             st.session_state.upload_clicked = False
 
         try:
-            cursor = self.analyzer.db.cursor()
-            cursor.execute("""
-                SELECT 
-                    data->'details'->>'patent_number' AS patent_number,
-                    data->>'case_name' AS case_name,
-                    data->'details'->>'filing_date' AS filing_date,
-                    id,
-                    analysis_in_progress
-                FROM mock_cases
-                ORDER BY (data->'details'->>'filing_date')::DATE DESC
-            """)
-            existing_cases = cursor.fetchall()
-            cursor.close()
+            with self.analyzer.connection() as db:
+                cursor = db.cursor()
+                cursor.execute("""
+                    SELECT patent_number, case_name, filing_date, id, analysis_in_progress
+                    FROM mock_cases
+                    ORDER BY filing_date DESC
+                """)
+                existing_cases = cursor.fetchall()
+                cursor.close()
 
             if not existing_cases:
                 st.warning("No existing cases found. Please create a new case.")
@@ -182,8 +186,6 @@ class CaseInputComponent:
 
         except Exception as e:
             st.error(f"Error loading/selecting case: {str(e)}")            
-            if hasattr(self.analyzer, 'db'):
-                self.analyzer.db.rollback()
 
     def show_new_case_form(self):
         st.subheader("Enter New Case Details")        
@@ -258,19 +260,14 @@ class CaseInputComponent:
                 return
 
             try:                
-                cursor = self.analyzer.db.cursor()                
-                cursor.execute("""
-                    SELECT 
-                        data->'details'->>'patent_number' as patent_number,
-                        data->>'case_name' as case_name,
-                        data->'details'->>'filing_date' as filing_date,
-                        analysis_in_progress
-                    FROM mock_cases 
-                    WHERE data->'details'->>'patent_number' = %s 
-                    AND data->>'case_name' = %s
-                    AND data->'details'->>'filing_date' = %s
-                """, (patent_number, case_name, filing_date.strftime("%Y-%m-%d")))
-                existing_case = cursor.fetchone()
+                existing = self.analyzer.case_repository().find_by_key(
+                    patent_number, filing_date.strftime("%Y-%m-%d"), case_name
+                )
+                existing_case = None
+                if existing:
+                    details = existing["data"]['details']
+                    existing_case = (details['patent_number'], existing["data"]['case_name'],
+                                     details['filing_date'], existing["analysis_in_progress"])
 
                 if existing_case:                    
                     st.error(f"""
@@ -309,14 +306,16 @@ class CaseInputComponent:
                         defendant_tech, defendant_market, source_code, documentation,
                         expert_reports
                     )                    
-                    cursor = self.analyzer.db.cursor()
-                    cursor.execute("""
-                        INSERT INTO mock_cases (data, analysis_in_progress)
-                        VALUES (%s, 0)
-                        RETURNING id
-                    """, (json.dumps(case_data),))
-                    case_id = cursor.fetchone()[0]
-                    self.analyzer.db.commit()
+                    with self.analyzer.connection() as db:
+                        cursor = db.cursor()
+                        cursor.execute("""
+                            INSERT INTO mock_cases (data, analysis_in_progress)
+                            VALUES (%s, 0)
+                            RETURNING id
+                        """, (json.dumps(case_data),))
+                        case_id = cursor.fetchone()[0]
+                        db.commit()
+                        cursor.close()
                     
                     if uploaded_file:
                         if self.handle_document_upload(case_id, uploaded_file):
@@ -448,12 +447,14 @@ class CaseInputComponent:
     def _insert_new_case(self, case_data):
         """Helper method to insert new case"""
         try:
-            cursor = self.analyzer.db.cursor()
-            cursor.execute("""
-                INSERT INTO mock_cases (data, analysis_in_progress)
-                VALUES (%s, 0)
-            """, (json.dumps(case_data),))
-            self.analyzer.db.commit()
+            with self.analyzer.connection() as db:
+                cursor = db.cursor()
+                cursor.execute("""
+                    INSERT INTO mock_cases (data, analysis_in_progress)
+                    VALUES (%s, 0)
+                """, (json.dumps(case_data),))
+                db.commit()
+                cursor.close()
             
             st.session_state.analysis_params = {
                 'patent_number': case_data['details']['patent_number'],
@@ -10,13 +10,25 @@ See LICENSE and COMMERCIAL_LICENSE for details.
 """
 import os
 import sys
+from typing import Dict
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
-from mock_trial_analysis import MockTrialAnalyzer
+from utils.connection import get_analyzer
+from chat_context import ChatContext
 import streamlit as st
 
 class ChatInterface:
     def __init__(self):
-        self.analyzer = MockTrialAnalyzer()
+        self.analyzer = get_analyzer()
+
+    def get_chat_context(self) -> ChatContext:
+        """Chat context for the current analysis, rebuilt when a new analysis is loaded"""
+        results = st.session_state.get('analysis_results') or {}
+        analysis = results.get('mock_trial_analysis', '') or ''
+        key = (st.session_state.case_id, hash(analysis))
+        if st.session_state.get('chat_context_key') != key:
+            st.session_state.chat_context = ChatContext(analysis, results.get('expert_document', '') or '')
+            st.session_state.chat_context_key = key
+        return st.session_state.chat_context
 
     def render(self):
         st.header("Legal Analysis Chat")
@@ -60,41 +72,44 @@ class ChatInterface:
                         raise ValueError("No case ID found. Please complete analysis first.")
                     # This is using existing mock_trial_analysis.py functionality
                     # ADDED EXPERT DOCUMENT SECTION ON  ********************************************
+                    # The analysis and expert document are trimmed to the sections relevant to
+                    # this question, plus a running summary of the conversation
+                    chat_context = self.get_chat_context()
                     follow_up_prompt = f"""
                     Based on the previous mock trial analysis of {st.session_state.analysis_params['case_name']}:
-                    
-                    Expert Document:
-                    {st.session_state.get('analysis_results', {}).get('expert_document', '')}
 
                     {role} PERSPECTIVE:
                     Question: {prompt.strip()}
 
                     Please respond as appropriate for the {role} role.
-                    Previous Analysis: {st.session_state.get('analysis_results', {}).get('mock_trial_analysis', '')}
+
+                    {chat_context.build(prompt.strip())}
                     """
+
+                    def complete(text: str, metrics: Dict):
+                        self.analyzer._save_analysis(st.session_state.case_id, prompt.strip(), text, 'chat')
+                        chat_context.record_turn(prompt.strip(), text, role, follow_up_prompt,
+                                                 metrics["input_tokens"])
+
                     # enable this when ready for prod testing ************
-                    response = self.analyzer.claude.messages.create(
-                        model="claude-3-opus-20240229",
-                        max_tokens=4000,
-                        temperature=0.5,
-                        system=f"You are an expert {role.lower()} analyzing this mock trial case.",
-                        messages=[{"role": "user", "content": follow_up_prompt}]
-                    )
+                    # Stream the reply into the chat; it is saved once the stream completes
+                    with st.chat_message("assistant"):
+                        ai_response = st.write_stream(self.analyzer.stream_claude(
+                            on_complete=complete,
+                            model="claude-3-opus-20240229",
+                            max_tokens=4000,
+                            temperature=0.5,
+                            system=f"You are an expert {role.lower()} analyzing this mock trial case.",
+                            messages=[{"role": "user", "content": follow_up_prompt}]
+                        ))
 
                     # disable above code block when testing in terminal only ***********
                     # response = self.analyzer.get_chat_response(prompt.strip(), role)
 
-                    ai_response = response.content[0].text  
-                    
-                    analysis_id = self.analyzer._save_analysis(                        
-                        st.session_state.case_id,
-                        prompt.strip(),
-                        ai_response,
-                        'chat'
-                    )   
                     st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                    with st.chat_message("assistant"):
-                        st.markdown(ai_response)
+                    turn = chat_context.turns[-1]
+                    st.caption(f"Context: {turn['estimated_input_tokens']:,} tokens "
+                               f"(full analysis would be {turn['full_context_tokens']:,})")
 
                 except Exception as e:
                     st.error(f"Error getting response: {str(e)}")
@@ -10,12 +10,12 @@ See LICENSE and COMMERCIAL_LICENSE for details.
 """
 import streamlit as st
 import plotly.graph_objects as go
-from mock_trial_analysis import MockTrialAnalyzer
+from utils.connection import get_analyzer
 import re
 
 class StrategyComponent:
     def __init__(self):
-        self.analyzer = MockTrialAnalyzer()
+        self.analyzer = get_analyzer()
 
     def extract_percentages(self, text):
         percentage_pattern = r'(\d+(?:\.\d+)?)\s*%'
@@ -41,17 +41,18 @@ class StrategyComponent:
         analysis_text = None
         if st.session_state.case_id:
             try:
-                cursor = self.analyzer.db.cursor()                
-                cursor.execute("""                        
-                    SELECT analysis 
-                    FROM trial_analysis
-                    WHERE case_id = %s
-                    AND entry_type = 'analysis'
-                    ORDER BY created_at DESC
-                    LIMIT 1                        
-                """, (st.session_state.case_id,))
-                result = cursor.fetchone()
-                cursor.close()
+                with self.analyzer.connection() as db:
+                    cursor = db.cursor()                
+                    cursor.execute("""                        
+                        SELECT analysis 
+                        FROM trial_analysis
+                        WHERE case_id = %s
+                        AND entry_type = 'analysis'
+                        ORDER BY created_at DESC
+                        LIMIT 1                        
+                    """, (st.session_state.case_id,))
+                    result = cursor.fetchone()
+                    cursor.close()
                 if result:
                     analysis_text = result[0]
             except Exception as e: